@@ -0,0 +1,177 @@
+import re
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def split_paragraphs(text):
+    """Split text into non-empty paragraphs on blank lines"""
+    return [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+
+def context_length(model, tokenizer):
+    """Maximum number of tokens (prompt + generation) the model can attend to"""
+    for attr in ("max_position_embeddings", "n_positions"):
+        value = getattr(model.config, attr, None)
+        if value:
+            return value
+    return tokenizer.model_max_length
+
+def window_budget(model, tokenizer, template, parts, reserved=0, limit=None):
+    """Largest text window that fits the context alongside the prompt template
+
+    `parts` is how many window-sized pieces share the context: the writer
+    needs room for the source window and its rewrite (2), the reviewer
+    for the original, the draft and the refined output (3). `reserved`
+    tokens (e.g. overlap context) are set aside before dividing.
+    """
+    overhead = len(tokenizer.encode(template, add_special_tokens=False))
+    budget = (context_length(model, tokenizer) - overhead - reserved) // parts
+    if limit:
+        budget = min(budget, limit)
+    if budget <= 0:
+        raise ValueError("Prompt template leaves no room for chapter text in the model context")
+    return budget
+
+def _split_oversized(paragraph, tokenizer, max_tokens):
+    """Break a paragraph longer than max_tokens at sentence boundaries, then hard token limits"""
+    pieces = []
+    current = []
+    current_len = 0
+    for sentence in SENTENCE_BOUNDARY.split(paragraph):
+        sentence_ids = tokenizer.encode(sentence, add_special_tokens=False)
+        if len(sentence_ids) > max_tokens:
+            for i in range(0, len(sentence_ids), max_tokens):
+                piece_ids = sentence_ids[i:i + max_tokens]
+                pieces.append((tokenizer.decode(piece_ids), piece_ids))
+            continue
+        if current and current_len + len(sentence_ids) > max_tokens:
+            pieces.append((" ".join(current), tokenizer.encode(" ".join(current), add_special_tokens=False)))
+            current, current_len = [], 0
+        current.append(sentence)
+        current_len += len(sentence_ids)
+    if current:
+        pieces.append((" ".join(current), tokenizer.encode(" ".join(current), add_special_tokens=False)))
+    return pieces
+
+def split_into_windows(text, tokenizer, max_tokens, overlap_tokens=0):
+    """Split text into paragraph-aligned windows of at most max_tokens tokens
+
+    Returns a list of dicts with the window "text", the paragraph range
+    "start"/"end" it covers and a "context" string holding the last
+    overlap_tokens tokens of the preceding window. The context is shown
+    to the model for continuity but is not itself rewritten, so stitching
+    the outputs back together never duplicates text.
+    """
+    paragraphs = split_paragraphs(text)
+    if not paragraphs:
+        return []
+
+    # Tokenize every paragraph in one call; this is the only full pass over the text
+    encoded = tokenizer(paragraphs, add_special_tokens=False)["input_ids"]
+    units = []
+    for index, (paragraph, ids) in enumerate(zip(paragraphs, encoded)):
+        if len(ids) > max_tokens:
+            units.extend((index, piece, piece_ids) for piece, piece_ids in _split_oversized(paragraph, tokenizer, max_tokens))
+        else:
+            units.append((index, paragraph, ids))
+
+    windows = []
+    current = []
+    current_len = 0
+    for unit in units:
+        if current and current_len + len(unit[2]) > max_tokens:
+            windows.append(current)
+            current, current_len = [], 0
+        current.append(unit)
+        current_len += len(unit[2])
+    if current:
+        windows.append(current)
+
+    chunks = []
+    previous_ids = []
+    for window in windows:
+        parts = []
+        for i, (index, piece, _) in enumerate(window):
+            if i and index == window[i - 1][0]:
+                parts.append(" ")
+            elif i:
+                parts.append("\n\n")
+            parts.append(piece)
+        chunks.append({
+            "text": "".join(parts),
+            "start": window[0][0],
+            "end": window[-1][0] + 1,
+            "context": tokenizer.decode(previous_ids[-overlap_tokens:]) if overlap_tokens and previous_ids else ""
+        })
+        previous_ids = [token for unit in window for token in unit[2]]
+    return chunks
+
+def split_into_parts(text, count):
+    """Split text into `count` paragraph-aligned parts of roughly equal length"""
+    paragraphs = split_paragraphs(text)
+    if count <= 1 or len(paragraphs) <= 1:
+        return ["\n\n".join(paragraphs)] + [""] * max(0, count - 1)
+
+    total = sum(len(p) for p in paragraphs)
+    parts = [[] for _ in range(count)]
+    consumed = 0
+    for paragraph in paragraphs:
+        # Place each paragraph by the position of its midpoint in the text
+        midpoint = consumed + len(paragraph) / 2
+        parts[min(count - 1, int(midpoint * count / total))].append(paragraph)
+        consumed += len(paragraph)
+    return ["\n\n".join(part) for part in parts]
+
+def stitch_chunks(outputs):
+    """Join per-chunk outputs back into a single chapter"""
+    return "\n\n".join(output.strip() for output in outputs if output.strip())
+
+def stitch_paragraph(outputs):
+    """Join the outputs for the windows of one paragraph back into a single paragraph
+
+    Line breaks inside the outputs are kept, but blank lines become single
+    line breaks so the result still splits back into exactly one paragraph.
+    """
+    text = " ".join(output.strip() for output in outputs if output.strip())
+    return re.sub(r'\n\s*\n', '\n', text)
+
+def _marker_position(text, markers):
+    positions = [position for position in (text.find(marker) for marker in markers) if position != -1]
+    return min(positions) if positions else None
+
+def clean_output(text, markers):
+    """Cut generated text at the first prompt marker the model echoes back"""
+    cut = _marker_position(text, markers)
+    return text[:cut].strip() if cut is not None else text.strip()
+
+def stream_until_marker(pieces, markers):
+    """Yield streamed text up to the first prompt marker the model echoes back
+
+    A marker-length tail is held back until more text arrives so that a
+    partially streamed marker is never shown, and surrounding whitespace
+    is dropped so the joined pieces equal clean_output() of the full text.
+    The source stream is closed as soon as a marker is seen.
+    """
+    hold = max((len(marker) for marker in markers), default=0)
+    text = ""
+    emitted = 0
+    try:
+        for piece in pieces:
+            text += piece
+            if not emitted:
+                text = text.lstrip()
+            cut = _marker_position(text, markers)
+            if cut is not None:
+                text = text[:cut]
+                break
+            safe = len(text) - hold
+            while safe > emitted and text[safe - 1].isspace():
+                safe -= 1
+            if safe > emitted:
+                yield text[emitted:safe]
+                emitted = safe
+    finally:
+        close = getattr(pieces, "close", None)
+        if close:
+            close()
+    text = text.rstrip()
+    if len(text) > emitted:
+        yield text[emitted:]
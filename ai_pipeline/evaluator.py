@@ -1,23 +1,107 @@
 from config import SCORE_WEIGHTS
+from collections import Counter
 import re
+import string
+import numpy as np
+
+CATEGORIES = list(SCORE_WEIGHTS)
+# Counted over the whole text in one pass, so "well-being" or "thing—was" still match
+BE_VERBS = re.compile(r'\b(?:am|is|are|was|were|be|being|been)\b')
+# Overlap tokens: str.strip with a character set is much cheaper than a regex per token
+EDGE_PUNCTUATION = string.punctuation + "“”‘’—–…«»"
+
+def _ngram_overlap(reference, candidate, n):
+    """ROUGE-N style F1 between two normalised token lists"""
+    reference_ngrams = Counter(zip(*(reference[i:] for i in range(n))))
+    candidate_ngrams = Counter(zip(*(candidate[i:] for i in range(n))))
+    overlap = sum((reference_ngrams & candidate_ngrams).values())
+    if not overlap:
+        return 0.0
+    recall = overlap / sum(reference_ngrams.values())
+    precision = overlap / sum(candidate_ngrams.values())
+    return 2 * precision * recall / (precision + recall)
+
+def _features(original, reviewed):
+    """Tokenize each text once and collect every count the scores need"""
+    original_tokens = original.split()
+    reviewed_tokens = reviewed.split()
+    reviewed_words = [token.strip(EDGE_PUNCTUATION) for token in reviewed_tokens]
+    original_words = [token.strip(EDGE_PUNCTUATION).lower() for token in original_tokens]
+
+    be_verbs = len(BE_VERBS.findall(reviewed))
+    reviewed_lower = [word.lower() for word in reviewed_words]
+    return (
+        [
+            be_verbs,
+            len(reviewed),
+            len(original),
+            reviewed.count('\n\n'),
+            len(set(original_tokens) - set(reviewed_tokens)),
+            len(reviewed_tokens),
+            len(original_tokens)
+        ],
+        [_ngram_overlap(original_words, reviewed_lower, 1), _ngram_overlap(original_words, reviewed_lower, 2)]
+    )
+
+def score_categories(originals, revieweds):
+    """Score every chapter pair at once
+
+    Returns (scores, metrics): an (n, len(CATEGORIES)) array of heuristic
+    category scores and an (n, 2) array of ROUGE-1/ROUGE-2 F1 overlaps.
+    """
+    counts, overlaps = zip(*(_features(o, r) for o, r in zip(originals, revieweds))) if originals else ((), ())
+    counts = np.array(counts, dtype=float).reshape(-1, 7)
+    be_verbs, reviewed_chars, original_chars, breaks, missing, reviewed_words, original_words = counts.T
+
+    by_category = {
+        "grammar": 10 - be_verbs / 50,
+        "clarity": reviewed_chars / np.maximum(1, original_chars) * 2,
+        "structure": breaks / 5,
+        "faithfulness": 10 - missing / 100,
+        "fluency": reviewed_words / np.maximum(1, original_words) * 5
+    }
+    scores = np.minimum(10, np.column_stack([by_category[category] for category in CATEGORIES]))
+    return scores, np.array(overlaps, dtype=float).reshape(-1, 2)
+
+def weighted_totals(scores, weights=None):
+    """Total score out of 50 for each row of a score matrix"""
+    weights = weights or SCORE_WEIGHTS
+    return scores @ (np.array([weights[category] for category in CATEGORIES]) * 2)
+
+def evaluate_batch(originals, revieweds, weights=None):
+    """Evaluate many chapters with heuristic scoring, one result dict per chapter"""
+    scores, overlaps = score_categories(originals, revieweds)
+    totals = weighted_totals(scores, weights)
+    return [
+        {
+            "scores": {category: float(value) for category, value in zip(CATEGORIES, row)},
+            "total_score": round(float(total), 2),
+            "metrics": {"rouge1_f": round(float(overlap[0]), 4), "rouge2_f": round(float(overlap[1]), 4)},
+            "notes": "Evaluated using heuristic rules"
+        }
+        for row, total, overlap in zip(scores, totals, overlaps)
+    ]
 
 def evaluate_quality(original, reviewed):
     """Evaluate chapter quality using heuristic scoring"""
-    # Heuristic scoring
-    scores = {
-        "grammar": min(10, 10 - (len(re.findall(r'\b(?:am|is|are|was|were|be|being|been)\b', reviewed)) / 50)),
-        "clarity": min(10, (len(reviewed) / max(1, len(original))) * 2),
-        "structure": min(10, reviewed.count('\n\n') / 5),
-        "faithfulness": min(10, 10 - (len(set(original.split()) - set(reviewed.split())) / 100)),
-        "fluency": min(10, (len(reviewed.split()) / len(original.split())) * 5)
-    }
-    
-    # Calculate total score
-    total = sum(scores[category] * weight * 2 
-               for category, weight in SCORE_WEIGHTS.items())
-    
-    return {
-        "scores": scores,
-        "total_score": round(total, 2),
-        "notes": "Evaluated using heuristic rules"
-    }
\ No newline at end of file
+    return evaluate_batch([original], [reviewed])[0]
+
+def rescore_versions(weights=None):
+    """Rescore every stored version in one pass, e.g. to re-tune SCORE_WEIGHTS"""
+    from storage.version_store import get_version_store
+    records = list(get_version_store().iter_records())
+
+    originals = [record["content"]["original_text"] for record in records]
+    revieweds = [record["content"]["reviewed_text"] for record in records]
+    results = evaluate_batch(originals, revieweds, weights)
+    return [
+        {
+            "id": record["metadata"]["id"],
+            "chapter_id": record["metadata"]["chapter_id"],
+            "version": record["metadata"]["version"],
+            "status": record["metadata"]["status"],
+            "previous_total": record["evaluation"].get("total_score"),
+            **result
+        }
+        for record, result in zip(records, results)
+    ]
@@ -0,0 +1,50 @@
+from config import GATE_SETTINGS
+from ai_pipeline.evaluator import evaluate_quality
+
+def precheck(original, draft, settings=GATE_SETTINGS):
+    """Cheap quality check on a writer draft, run before paying for the reviewer
+
+    Uses the draft's length relative to the original and the faithfulness
+    score from evaluate_quality. Returns a dict with the measurements,
+    whether the draft passed and the reasons it did not.
+    """
+    length_ratio = len(draft) / max(1, len(original))
+    faithfulness = evaluate_quality(original, draft)["scores"]["faithfulness"]
+
+    reasons = []
+    if length_ratio < settings["min_length_ratio"]:
+        reasons.append(f"draft is {length_ratio:.0%} of the original length")
+    elif length_ratio > settings["max_length_ratio"]:
+        reasons.append(f"draft is {length_ratio:.1f}x the original length")
+    if faithfulness < settings["min_faithfulness"]:
+        reasons.append(f"faithfulness {faithfulness:.1f}/10")
+    return {
+        "passed": not reasons,
+        "length_ratio": round(length_ratio, 3),
+        "faithfulness": round(faithfulness, 2),
+        "reasons": reasons
+    }
+
+def gated_rewrite(original, rewrite, settings=GATE_SETTINGS):
+    """Rewrite a chapter, retrying drafts that fail the pre-check
+
+    `rewrite` is called with the attempt number and returns a draft. After
+    `max_retries` failed retries the last draft is kept but marked so the
+    reviewer is skipped; the chapter still goes on to evaluation and human
+    review. Returns (draft, gate) where gate["decision"] is "review" or
+    "skip_review".
+    """
+    attempts = 1 + (settings["max_retries"] if settings["enabled"] else 0)
+    for attempt in range(attempts):
+        draft = rewrite(attempt)
+        if not settings["enabled"]:
+            return draft, {"decision": "review", "attempts": 1}
+        gate = precheck(original, draft, settings)
+        if gate["passed"]:
+            break
+        if attempt + 1 < attempts:
+            print(f"\nDraft failed pre-check ({'; '.join(gate['reasons'])}), retrying writer...")
+
+    gate["attempts"] = attempt + 1
+    gate["decision"] = "review" if gate["passed"] else "skip_review"
+    return draft, gate
@@ -0,0 +1,329 @@
+import threading
+from collections import OrderedDict
+import torch
+from tqdm import tqdm
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from config import LLM_SETTINGS
+from ai_pipeline.chunking import context_length
+from utils.cache import get_cache
+from utils.metrics import get_metrics
+
+def prepare_tokenizer(tokenizer):
+    """Configure a tokenizer for padded batch generation with a decoder-only model"""
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    # Decoder-only models continue from the right edge, so pad on the left
+    tokenizer.padding_side = "left"
+    return tokenizer
+
+class PrefixCache:
+    """KV caches of prompt prefixes shared by many prompts
+
+    A prefix (the writer's instructions, or a window's source text shared
+    by the writer and reviewer prompts) is run through the model once per
+    model; later batches start from a copy of its keys/values instead of
+    recomputing them. The least recently used entries are dropped first.
+    """
+
+    def __init__(self, max_entries=LLM_SETTINGS["prefix_cache_entries"]):
+        self.min_entries = self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fit(self, count):
+        """Hold at least `count` prefixes (never fewer than configured), evicting the oldest beyond that
+
+        Called with the number of distinct prefixes in a generation call,
+        so every window of a chapter stays cached from its writer call until
+        its reviewer call, instead of only the last few.
+        """
+        with self._lock:
+            self.max_entries = max(self.min_entries, count)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _legacy(self, model, tokenizer, prefix):
+        key = (id(model), prefix)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                get_cache().record("prefix_kv", hits=1)
+                return self._entries[key]
+            get_cache().record("prefix_kv", misses=1)
+            ids = tokenizer(prefix, return_tensors="pt", add_special_tokens=False)["input_ids"].to(model.device)
+            with torch.no_grad():
+                past = model(ids, use_cache=True).past_key_values
+            if hasattr(past, "to_legacy_cache"):
+                past = past.to_legacy_cache()
+            self._entries[key] = (ids, past)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return ids, past
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, model, tokenizer, prefixes, pad_token_id):
+        """Return (prefix_ids, prefix_mask, past_key_values) for one batch row per prefix
+
+        Rows whose prefixes differ in length are left-padded inside the
+        cache; the mask hides the padding. A None prefix gives an all-padding row.
+        """
+        if len(set(prefixes)) == 1:
+            ids, past = self._legacy(model, tokenizer, prefixes[0])
+            rows = len(prefixes)
+            # generate() extends the cache it is given, so each call gets fresh tensors
+            layers = tuple(
+                (key.expand(rows, -1, -1, -1).contiguous(), value.expand(rows, -1, -1, -1).contiguous())
+                for key, value in past
+            )
+            return ids.expand(rows, -1), torch.ones_like(ids).expand(rows, -1), self._wrap(layers)
+
+        entries = [self._legacy(model, tokenizer, prefix) if prefix else None for prefix in prefixes]
+        template_ids, template_past = next(entry for entry in entries if entry)
+        length = max(entry[0].shape[1] for entry in entries if entry)
+        ids, mask, rows = [], [], []
+        for entry in entries:
+            row_ids = template_ids.new_full((1, length), pad_token_id)
+            row_mask = torch.zeros_like(row_ids)
+            if entry:
+                size = entry[0].shape[1]
+                row_ids[:, length - size:] = entry[0]
+                row_mask[:, length - size:] = 1
+                row_past = entry[1]
+            else:
+                size = 0
+                row_past = tuple((key[:, :, :0], value[:, :, :0]) for key, value in template_past)
+            ids.append(row_ids)
+            mask.append(row_mask)
+            # Keys/values are (batch, heads, positions, head_dim); pad positions on the left
+            rows.append([tuple(torch.nn.functional.pad(tensor, (0, 0, length - size, 0)) for tensor in layer)
+                         for layer in row_past])
+        layers = tuple(
+            tuple(torch.cat([row[index][part] for row in rows]) for part in (0, 1))
+            for index in range(len(template_past))
+        )
+        return torch.cat(ids), torch.cat(mask), self._wrap(layers)
+
+    @staticmethod
+    def _wrap(layers):
+        try:
+            from transformers import DynamicCache
+            layers = DynamicCache.from_legacy_cache(layers)
+        except (ImportError, AttributeError):
+            pass
+        return layers
+
+PREFIX_CACHE = PrefixCache()
+
+def encode_prompts(model, tokenizer, prompts, prefix=None):
+    """Tokenize prompts for generation, starting from cached prefixes where possible
+
+    `prefix` is text every prompt starts with, or a list with one prefix
+    (or None) per prompt. Returns (model inputs, prompt length). Each row
+    is laid out as [padding][cached prefix][padding][rest of the prompt];
+    the attention mask hides the padding and position IDs follow the mask,
+    so the cached prefix positions stay valid.
+    """
+    prefixes = prefix if isinstance(prefix, list) else [prefix] * len(prompts)
+    prefixes = [p if p and prompt.startswith(p) else None for p, prompt in zip(prefixes, prompts)]
+    if not (LLM_SETTINGS["prefix_cache"] and any(prefixes)):
+        encoded = tokenizer(prompts, return_tensors="pt", padding=True, add_special_tokens=False).to(model.device)
+        return dict(encoded), encoded["input_ids"].shape[1]
+
+    prefix_ids, prefix_mask, past = PREFIX_CACHE.get(model, tokenizer, prefixes, tokenizer.pad_token_id)
+    rest = tokenizer([prompt[len(p or ""):] for p, prompt in zip(prefixes, prompts)], return_tensors="pt",
+                     padding=True, add_special_tokens=False).to(model.device)
+    input_ids = torch.cat([prefix_ids, rest["input_ids"]], dim=1)
+    attention_mask = torch.cat([prefix_mask, rest["attention_mask"]], dim=1)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "past_key_values": past}, input_ids.shape[1]
+
+_assistant_warned = set()
+
+def assistant_for(model):
+    """Draft model for assisted decoding of `model`, or None when it is off or unusable
+
+    The assistant proposes several tokens cheaply and the main model checks
+    them in one forward pass, so the output distribution is unchanged. It
+    must share the main model's tokenizer.
+    """
+    name = LLM_SETTINGS["assistant_model"]
+    if not name or name == model.config.name_or_path:
+        return None
+    from utils.llm_loader import load_model
+    assistant, _ = load_model(name)
+    if assistant.config.vocab_size != model.config.vocab_size:
+        if name not in _assistant_warned:
+            _assistant_warned.add(name)
+            print(f"Assistant model {name} does not share the vocabulary of {model.config.name_or_path}; "
+                  "decoding without it")
+        return None
+    return assistant
+
+def generate_batch(model, tokenizer, prompts, max_new_tokens, temperature, batch_size=4,
+                   context_limit=None, on_batch=None, budgets=None, prefix=None):
+    """Generate continuations for prompts in padded batches
+
+    Returns only the newly generated text for each prompt, in order.
+    Prompts are batched shortest-first to keep padding small, and
+    `max_new_tokens` is capped per batch so the longest prompt plus its
+    generation stays within `context_limit`. `budgets` optionally gives a
+    per-prompt token budget; a batch generates up to the largest budget
+    among its prompts. `prefix` is text every prompt starts with (or a
+    list of per-prompt prefixes) whose KV cache is computed once and
+    reused. With an assistant model configured, prompts are generated one
+    at a time with assisted decoding instead, without prefix caching.
+    `on_batch` is called with the number of prompts completed after each batch.
+    """
+    prepare_tokenizer(tokenizer)
+    assistant = assistant_for(model)
+    extra = {}
+    if assistant is not None:
+        # Assisted decoding verifies a single sequence and keeps its own caches
+        batch_size, prefix = 1, None
+        extra["assistant_model"] = assistant
+    if isinstance(prefix, list):
+        PREFIX_CACHE.fit(len({p for p in prefix if p}))
+    lengths = [len(ids) for ids in tokenizer(prompts, add_special_tokens=False)["input_ids"]] if prompts else []
+    order = sorted(range(len(prompts)), key=lengths.__getitem__)
+    outputs = [""] * len(prompts)
+
+    for i in range(0, len(order), batch_size):
+        indices = order[i:i + batch_size]
+        batch = [prompts[index] for index in indices]
+        batch_prefix = [prefix[index] for index in indices] if isinstance(prefix, list) else prefix
+        encoded, prompt_length = encode_prompts(model, tokenizer, batch, batch_prefix)
+
+        new_tokens = max_new_tokens
+        if budgets:
+            new_tokens = min(new_tokens, max(budgets[index] for index in indices))
+        if context_limit:
+            new_tokens = min(new_tokens, context_limit - prompt_length)
+        if new_tokens > 0:
+            with torch.no_grad(), get_metrics().span("generate", model=model.config.name_or_path):
+                generated = model.generate(
+                    **encoded,
+                    max_new_tokens=new_tokens,
+                    temperature=temperature,
+                    do_sample=True,
+                    pad_token_id=tokenizer.pad_token_id,
+                    **extra
+                )
+            get_metrics().count("generated_tokens", int((generated[:, prompt_length:] != tokenizer.pad_token_id).sum()),
+                                model=model.config.name_or_path)
+            decoded = tokenizer.batch_decode(generated[:, prompt_length:], skip_special_tokens=True)
+            for index, text in zip(indices, decoded):
+                outputs[index] = text
+
+        if on_batch:
+            on_batch(len(batch))
+    return outputs
+
+def token_budget(tokenizer, source_text):
+    """New-token budget for one window, proportional to the length of its source text"""
+    source_tokens = len(tokenizer.encode(source_text, add_special_tokens=False))
+    return max(
+        LLM_SETTINGS["min_new_tokens"],
+        min(LLM_SETTINGS["max_new_tokens"], int(source_tokens * LLM_SETTINGS["length_ratio"]) + 1)
+    )
+
+def local_generator(model, tokenizer, desc=None, prefix=None):
+    """Build a generate(prompts, temperature, budgets=None, prefixes=None) callable that runs batches in this process
+
+    Per-call `prefixes` (one per prompt) take the place of the bound `prefix`.
+    """
+    def generate(prompts, temperature, budgets=None, prefixes=None):
+        with tqdm(total=len(prompts), desc=desc, ncols=100, disable=desc is None) as pbar:
+            return generate_batch(
+                model, tokenizer, prompts,
+                max_new_tokens=LLM_SETTINGS["max_new_tokens"],
+                temperature=temperature,
+                batch_size=LLM_SETTINGS["batch_size"],
+                context_limit=context_length(model, tokenizer),
+                on_batch=pbar.update,
+                budgets=budgets,
+                prefix=prefixes or prefix
+            )
+    return generate
+
+class StopOnEvent(StoppingCriteria):
+    """Stop generation once the consumer of a stream has gone away"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+class StopOnMarkers(StoppingCriteria):
+    """Stop generation once the newly generated text contains an end marker"""
+
+    def __init__(self, tokenizer, markers, prompt_length):
+        self.tokenizer = tokenizer
+        self.markers = markers
+        self.prompt_length = prompt_length
+        # Only the last few tokens need decoding to spot a marker that just completed
+        self.window = max(len(tokenizer.encode(marker, add_special_tokens=False)) for marker in markers) + 2
+
+    def __call__(self, input_ids, scores, **kwargs):
+        start = max(self.prompt_length, input_ids.shape[1] - self.window)
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        done = [any(marker in tail for marker in self.markers) for tail in tails]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+def stream_generate(model, tokenizer, prompt, max_new_tokens, temperature, markers=(), prefix=None):
+    """Yield text for a single prompt as the model generates it
+
+    Generation runs on a background thread feeding a TextIteratorStreamer.
+    It stops early when the output emits one of `markers`, and when the
+    caller stops iterating, so abandoned tokens are not paid for.
+    """
+    prepare_tokenizer(tokenizer)
+    assistant = assistant_for(model)
+    extra = {"assistant_model": assistant} if assistant is not None else {}
+    encoded, prompt_length = encode_prompts(model, tokenizer, [prompt], None if extra else prefix)
+    if max_new_tokens <= 0:
+        return
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    stop = threading.Event()
+    criteria = [StopOnEvent(stop)]
+    if markers:
+        criteria.append(StopOnMarkers(tokenizer, markers, prompt_length))
+    errors = []
+
+    def run():
+        metrics = get_metrics()
+        try:
+            with metrics.span("generate", model=model.config.name_or_path):
+                generated = model.generate(
+                    **encoded,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    do_sample=True,
+                    pad_token_id=tokenizer.pad_token_id,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList(criteria),
+                    **extra
+                )
+            metrics.count("generated_tokens", generated.shape[1] - prompt_length, model=model.config.name_or_path)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        for piece in streamer:
+            yield piece
+    finally:
+        stop.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+def stream_budget(model, tokenizer, prompt, source_text):
+    """New-token budget for streaming one window, also capped by the room left in the context"""
+    prompt_tokens = len(tokenizer.encode(prompt, add_special_tokens=False))
+    return min(token_budget(tokenizer, source_text), context_length(model, tokenizer) - prompt_tokens)
@@ -0,0 +1,55 @@
+import json
+import urllib.error
+import urllib.request
+from config import MODEL_SERVER
+from utils.helpers import print_warning
+
+_server_available = None
+
+def server_url(path):
+    return f"http://{MODEL_SERVER['host']}:{MODEL_SERVER['port']}{path}"
+
+def server_available():
+    """Check once per process whether a model server is listening"""
+    global _server_available
+    if _server_available is None:
+        _server_available = False
+        if MODEL_SERVER["enabled"]:
+            try:
+                with urllib.request.urlopen(server_url("/health"), timeout=0.5) as response:
+                    _server_available = response.status == 200
+            except (OSError, ValueError):
+                pass
+    return _server_available
+
+def _post(path, payload):
+    request = urllib.request.Request(
+        server_url(path),
+        data=json.dumps(payload).encode('utf-8'),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=MODEL_SERVER["timeout"]) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def _call(path, payload):
+    """POST a job to the model server, returning None so callers fall back to local models"""
+    global _server_available
+    if not server_available():
+        return None
+    try:
+        return _post(path, payload)["text"]
+    except (OSError, ValueError, KeyError) as e:
+        if isinstance(e, urllib.error.HTTPError):
+            print_warning(f"Model server rejected the job ({e.code}); running locally")
+        else:
+            print_warning(f"Model server unavailable ({e}); running locally")
+            _server_available = False
+        return None
+
+def remote_rewrite(text):
+    """Rewrite a chapter on the model server, or None if no server is running"""
+    return _call("/rewrite", {"text": text})
+
+def remote_review(original, rewritten):
+    """Review a chapter on the model server, or None if no server is running"""
+    return _call("/review", {"original": original, "rewritten": rewritten})
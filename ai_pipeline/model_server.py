@@ -0,0 +1,163 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import LLM_SETTINGS, MODEL_SERVER
+from utils.llm_loader import load_model, own_tokenizers, MODEL_CACHE
+from utils.metrics import get_metrics
+from ai_pipeline.chunking import context_length
+from ai_pipeline.generation import generate_batch
+from ai_pipeline.writer import rewrite_locally
+from ai_pipeline.reviewer import review_locally
+
+logger = logging.getLogger("ai_pipeline.model_server")
+
+class GenerationBatcher:
+    """Merge generation requests from concurrent jobs into shared model batches
+
+    Jobs arriving within `batch_window` seconds of each other that target
+    the same model and temperature are flattened into one prompt list and
+    run through `generate_batch` together on a single worker thread, which
+    is also the only thread that touches the models and their shared
+    tokenizers (request threads chunk with their own copies).
+    """
+
+    def __init__(self, batch_window=MODEL_SERVER["batch_window"]):
+        self.batch_window = batch_window
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, model_name, prompts, temperature, budgets=None, prefixes=None):
+        """Queue prompts for generation and wait for their outputs"""
+        future = Future()
+        budgets = budgets or [LLM_SETTINGS["max_new_tokens"]] * len(prompts)
+        prefixes = prefixes or [None] * len(prompts)
+        self.jobs.put((model_name, temperature, prompts, future, budgets, prefixes))
+        return future.result()
+
+    def generator(self, model_name):
+        """Build a generate(prompts, temperature, budgets=None, prefixes=None) callable bound to one model"""
+        return lambda prompts, temperature, budgets=None, prefixes=None: self.submit(
+            model_name, prompts, temperature, budgets, prefixes
+        )
+
+    def _run(self):
+        pending = []
+        while True:
+            if not pending:
+                pending.append(self.jobs.get())
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self.jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            group_key = pending[0][:2]
+            group = [job for job in pending if job[:2] == group_key]
+            pending = [job for job in pending if job[:2] != group_key]
+            self._execute(group)
+
+    def _execute(self, group):
+        model_name, temperature = group[0][:2]
+        prompts = [prompt for job in group for prompt in job[2]]
+        budgets = [budget for job in group for budget in job[4]]
+        # Writer and reviewer prompts from different jobs keep their own cached prefixes
+        prefixes = [prefix for job in group for prefix in job[5]]
+        logger.info("Generating %d prompt(s) from %d job(s) with %s", len(prompts), len(group), model_name)
+        try:
+            model, tokenizer = load_model(model_name)
+            outputs = generate_batch(
+                model, tokenizer, prompts,
+                max_new_tokens=LLM_SETTINGS["max_new_tokens"],
+                temperature=temperature,
+                batch_size=LLM_SETTINGS["batch_size"],
+                context_limit=context_length(model, tokenizer),
+                budgets=budgets,
+                prefix=prefixes
+            )
+        except Exception as e:
+            for job in group:
+                job[3].set_exception(e)
+            return
+
+        offset = 0
+        for job in group:
+            job[3].set_result(outputs[offset:offset + len(job[2])])
+            offset += len(job[2])
+
+class ModelRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "models": sorted(MODEL_CACHE)})
+        elif self.path == "/metrics":
+            body = get_metrics().prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        batcher = self.server.batcher
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            # Chunking and prompt budgets tokenize on this thread while the batcher pads with the shared tokenizer
+            with own_tokenizers():
+                if self.path == "/rewrite":
+                    text = rewrite_locally(payload["text"], batcher.generator(LLM_SETTINGS["writer_model"]))
+                elif self.path == "/review":
+                    text = review_locally(payload["original"], payload["rewritten"],
+                                          batcher.generator(LLM_SETTINGS["reviewer_model"]))
+                else:
+                    self._send(404, {"error": f"Unknown path {self.path}"})
+                    return
+        except (ValueError, KeyError) as e:
+            self._send(400, {"error": f"Invalid request: {e}"})
+            return
+        except Exception as e:
+            logger.exception("Generation job failed")
+            self._send(500, {"error": str(e)})
+            return
+        self._send(200, {"text": text})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+def serve(host=MODEL_SERVER["host"], port=MODEL_SERVER["port"]):
+    """Load the writer and reviewer models and serve rewrite/review jobs until interrupted"""
+    for model_name in {LLM_SETTINGS["writer_model"], LLM_SETTINGS["reviewer_model"]}:
+        logger.info("Loading %s", model_name)
+        load_model(model_name)
+
+    server = ThreadingHTTPServer((host, port), ModelRequestHandler)
+    server.daemon_threads = True
+    server.batcher = GenerationBatcher()
+    logger.info("Model server listening on http://%s:%d", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    serve()
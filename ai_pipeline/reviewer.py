@@ -1,17 +1,23 @@
-from transformers import pipeline, AutoTokenizer
 from config import LLM_SETTINGS
-from utils.llm_loader import load_model
+from utils.cache import get_cache, MISSING
+from ai_pipeline.chunking import (
+    split_into_windows,
+    split_into_parts,
+    stitch_chunks,
+    stitch_paragraph,
+    clean_output,
+    stream_until_marker,
+    window_budget
+)
+from ai_pipeline.model_client import remote_review
+from ai_pipeline import writer
 
-def review_chapter(original, rewritten):
-    """Review and refine rewritten chapter"""
-    model, tokenizer = load_model(LLM_SETTINGS["reviewer_model"])
-    generator = pipeline(
-        "text-generation",
-        model=model,
-        tokenizer=tokenizer
-    )
-    
-    prompt = f"""
+PROMPT_MARKERS = ["Original Chapter:", "Rewritten Chapter:", "Provide your refined version:"]
+SHARED_PROMPT_MARKERS = writer.PROMPT_MARKERS + ["[PROOFREAD]", "[REFINED CHAPTER]"]
+
+def format_review_prompt(original, rewritten):
+    """Format the proofreading prompt for one original/rewritten pair"""
+    return f"""
     Original Chapter:
     {original}
     
@@ -27,19 +33,199 @@ def review_chapter(original, rewritten):
     Provide your refined version:
     """
 
-    # Truncate the prompt to fit model's max length
-    max_length = 1024
-    input_ids = tokenizer.encode(prompt, add_special_tokens=False)
-    if len(input_ids) > max_length:
-        print(f"  Review prompt too long for model, truncating to {max_length} tokens.")
-        input_ids = input_ids[:max_length]
-        prompt = tokenizer.decode(input_ids)
-
-    result = generator(
-        prompt,
-        max_new_tokens=LLM_SETTINGS["max_new_tokens"],
-        temperature=LLM_SETTINGS["temperature"] * 0.7,  # Lower temperature for refinement
-        do_sample=True
-    )
+def format_shared_review_prompt(original, context, rewritten):
+    """Format a proofreading prompt that starts with the writer's prompt for the same window
+
+    Used when one model writes and reviews: the instructions, previous
+    passage and source window are then an exact prefix of the writer
+    prompt, so their KV cache is reused instead of recomputed.
+    """
+    return writer.source_prefix(original, context) + f"""    
+    [REWRITTEN CHAPTER]
+    {rewritten}
+    
+    [PROOFREAD]
+    As a professional proofreader, refine the rewritten chapter for grammar and
+    spelling, clarity, consistent tone and faithfulness to the original chapter.
     
-    return result[0]['generated_text'].split("Provide your refined version:")[-1].strip()
\ No newline at end of file
+    [REFINED CHAPTER]
+    """
+
+def review_window(model, tokenizer, shared=False):
+    """Window size for the reviewer, which fits original, draft and output in one context"""
+    template = format_shared_review_prompt("", "-", "") if shared else format_review_prompt("", "")
+    return window_budget(
+        model, tokenizer, template,
+        parts=3, limit=LLM_SETTINGS["chunk_tokens"]
+    )
+
+def review_prompt(original, context, draft, shared):
+    """(prompt, cached prefix) for reviewing one draft piece against its original window"""
+    if shared:
+        return format_shared_review_prompt(original, context, draft), writer.source_prefix(original, context)
+    return format_review_prompt(original, draft), None
+
+def split_for_review(original, rewritten, model, tokenizer):
+    """Original windows and the draft split into one aligned part per window
+
+    When the writer and reviewer share a model these are the writer's own
+    windows, so each review prompt starts with the prefix the writer
+    already cached.
+    """
+    if writer.shares_prefix():
+        chunks = writer.chunk_chapter(original, model, tokenizer)
+    else:
+        chunks = split_into_windows(original, tokenizer, review_window(model, tokenizer))
+    return chunks, split_into_parts(rewritten, len(chunks)) if chunks else []
+
+def draft_pieces(draft, tokenizer, max_tokens):
+    """Split a draft part into pieces that each fit the review prompt next to their original
+
+    Drafts can run longer than their source, and writer windows can be
+    larger than review windows, so a part may not fit. It is then reviewed
+    in several paragraph-aligned pieces against the same original rather
+    than cut off. Returns windows as split_into_windows does.
+    """
+    if len(tokenizer.encode(draft, add_special_tokens=False)) <= max_tokens:
+        return [{"text": draft, "start": 0, "end": 1}]
+    return split_into_windows(draft, tokenizer, max_tokens)
+
+def piece_separator(pieces, index):
+    """Text between reviewed piece `index` and the one before: a space inside a paragraph, else a blank line"""
+    if not index:
+        return ""
+    return " " if pieces[index]["start"] < pieces[index - 1]["end"] else "\n\n"
+
+def join_pieces(outputs, pieces):
+    """Join the reviewed pieces of one draft part"""
+    return "".join(piece_separator(pieces, index) + output.strip() for index, output in enumerate(outputs)).strip()
+
+def review_chunks(original_chunks, rewritten_chunks, model, tokenizer, generate=None, contexts=None):
+    """Review aligned original/rewritten windows, returning one output per window
+
+    With `contexts` (the previous passage of each of the writer's windows)
+    the prompts share the writer's source prefixes; see format_shared_review_prompt.
+    """
+    from ai_pipeline.generation import local_generator, token_budget
+    shared = contexts is not None
+    max_tokens = review_window(model, tokenizer, shared)
+    prompts, budgets, prefixes, pieces_per_chunk = [], [], [], []
+    for index, (original, rewritten) in enumerate(zip(original_chunks, rewritten_chunks)):
+        pieces = draft_pieces(rewritten, tokenizer, max_tokens)
+        pieces_per_chunk.append(pieces)
+        for piece in pieces:
+            prompt, prefix = review_prompt(original, contexts[index] if shared else "", piece["text"], shared)
+            prompts.append(prompt)
+            prefixes.append(prefix)
+            budgets.append(token_budget(tokenizer, piece["text"] or original))
+
+    generate = generate or local_generator(model, tokenizer)
+    # Lower temperature for refinement
+    outputs = generate(prompts, LLM_SETTINGS["temperature"] * 0.7, budgets, prefixes if shared else None)
+    markers = SHARED_PROMPT_MARKERS if shared else PROMPT_MARKERS
+    reviewed, position = [], 0
+    for pieces in pieces_per_chunk:
+        chunk_outputs = outputs[position:position + len(pieces)]
+        position += len(pieces)
+        # A piece the model left empty keeps its draft text
+        reviewed.append(join_pieces([clean_output(output, markers) or piece["text"]
+                                     for output, piece in zip(chunk_outputs, pieces)], pieces))
+    return reviewed
+
+def review_locally(original, rewritten, generate=None):
+    """Review a chapter with the reviewer model loaded in this process (windows as in split_for_review)"""
+    from utils.llm_loader import load_model
+    model, tokenizer = load_model(LLM_SETTINGS["reviewer_model"])
+
+    original_chunks, rewritten_parts = split_for_review(original, rewritten, model, tokenizer)
+    if not original_chunks:
+        return rewritten
+    contexts = [chunk["context"] for chunk in original_chunks] if writer.shares_prefix() else None
+
+    reviewed = review_chunks([chunk["text"] for chunk in original_chunks], rewritten_parts, model, tokenizer,
+                             generate, contexts)
+    return stitch_chunks(reviewed)
+
+def review_paragraphs(originals, drafts):
+    """Review paragraph/draft pairs independently, returning exactly one paragraph per pair"""
+    from utils.llm_loader import load_model
+    model, tokenizer = load_model(LLM_SETTINGS["reviewer_model"])
+    max_tokens = review_window(model, tokenizer)
+
+    original_chunks, draft_chunks, owners = [], [], []
+    for index, (original, draft) in enumerate(zip(originals, drafts)):
+        windows = split_into_windows(original, tokenizer, max_tokens)
+        original_chunks.extend(window["text"] for window in windows)
+        draft_chunks.extend(split_into_parts(draft, len(windows)))
+        owners.extend([index] * len(windows))
+
+    reviewed = [[] for _ in originals]
+    if original_chunks:
+        for index, output in zip(owners, review_chunks(original_chunks, draft_chunks, model, tokenizer)):
+            reviewed[index].append(output)
+    # A paragraph with nothing reviewed keeps its draft
+    return [stitch_paragraph(parts) or draft for parts, draft in zip(reviewed, drafts)]
+
+def review_chapter(original, rewritten):
+    """Review and refine rewritten chapter"""
+    cache = get_cache()
+    cache_key = cache.make_key("review", original, rewritten, model=LLM_SETTINGS["reviewer_model"], settings=LLM_SETTINGS)
+    reviewed = cache.get("review", cache_key)
+    if reviewed is not MISSING:
+        return reviewed
+
+    reviewed = remote_review(original, rewritten)
+    if reviewed is None:
+        reviewed = review_locally(original, rewritten)
+    cache.set("review", cache_key, reviewed)
+    return reviewed
+
+
+def stream_review(original, rewritten):
+    """Review a chapter, yielding the refined text as the model produces it"""
+    from utils.llm_loader import load_model
+    from ai_pipeline.generation import stream_generate, stream_budget
+    cache = get_cache()
+    cache_key = cache.make_key("review", original, rewritten, model=LLM_SETTINGS["reviewer_model"], settings=LLM_SETTINGS)
+    reviewed = cache.get("review", cache_key)
+    if reviewed is not MISSING:
+        yield reviewed
+        return
+
+    model, tokenizer = load_model(LLM_SETTINGS["reviewer_model"])
+    # Same windows and prompts as review_locally, since both fill the same cache entry
+    shared = writer.shares_prefix()
+    max_tokens = review_window(model, tokenizer, shared)
+    markers = SHARED_PROMPT_MARKERS if shared else PROMPT_MARKERS
+    original_chunks, rewritten_parts = split_for_review(original, rewritten, model, tokenizer)
+    if not original_chunks:
+        yield rewritten
+        return
+
+    outputs = []
+    for chunk, draft in zip(original_chunks, rewritten_parts):
+        if outputs:
+            yield "\n\n"
+        pieces = draft_pieces(draft, tokenizer, max_tokens)
+        piece_outputs = []
+        for index, piece in enumerate(pieces):
+            yield piece_separator(pieces, index)
+            prompt, prefix = review_prompt(chunk["text"], chunk["context"], piece["text"], shared)
+            tokens = stream_generate(
+                model, tokenizer, prompt,
+                max_new_tokens=stream_budget(model, tokenizer, prompt, piece["text"] or chunk["text"]),
+                temperature=LLM_SETTINGS["temperature"] * 0.7,
+                markers=markers,
+                prefix=prefix
+            )
+            streamed = []
+            for text in stream_until_marker(tokens, markers):
+                streamed.append(text)
+                yield text
+            if not streamed and piece["text"]:
+                streamed.append(piece["text"])
+                yield piece["text"]
+            piece_outputs.append("".join(streamed))
+        outputs.append(join_pieces(piece_outputs, pieces))
+
+    cache.set("review", cache_key, stitch_chunks(outputs))
\ No newline at end of file
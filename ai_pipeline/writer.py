@@ -1,13 +1,19 @@
-from transformers import pipeline, AutoTokenizer
 from config import LLM_SETTINGS
-from utils.llm_loader import load_model
-from tqdm import tqdm
-import torch
+from utils.cache import get_cache, MISSING
+from ai_pipeline.chunking import (
+    split_into_windows,
+    stitch_chunks,
+    stitch_paragraph,
+    clean_output,
+    stream_until_marker,
+    window_budget
+)
+from ai_pipeline.model_client import remote_rewrite
 import textwrap
 
-def format_prompt(text):
-    """Format the writing prompt with clear instructions"""
-    return f"""
+PROMPT_MARKERS = ["[INSTRUCTIONS]", "[PREVIOUS PASSAGE]", "[ORIGINAL CHAPTER]", "[REWRITTEN CHAPTER]"]
+
+PROMPT_HEADER = """
     [INSTRUCTIONS]
     You are a professional editor rewriting a book chapter in modern English.
     Your task is to:
@@ -15,51 +21,178 @@ def format_prompt(text):
     2. Improve clarity and flow while preserving the author's voice
     3. Fix any grammatical errors
     4. Keep the same length as the original
-    
+"""
+
+def source_prefix(text, context=""):
+    """Instructions, previous passage and source window: the start of every writer prompt"""
+    previous = f"""
+    [PREVIOUS PASSAGE]
+    {textwrap.fill(context, width=80)}
+    """ if context else ""
+    return PROMPT_HEADER + f"""    {previous}
     [ORIGINAL CHAPTER]
     {textwrap.fill(text, width=80)}
-    
+"""
+
+def format_prompt(text, context=""):
+    """Format the writing prompt with clear instructions
+
+    Every prompt starts with PROMPT_HEADER, so its KV cache can be reused.
+    """
+    return source_prefix(text, context) + """    
     [REWRITTEN CHAPTER]
     """
 
-def rewrite_chapter(text):
-    """Enhanced rewriting function with progress feedback"""
+def shares_prefix():
+    """Whether the reviewer reuses the writer's per-window source prefix (one model for both)"""
+    return (LLM_SETTINGS["shared_prefix"] and LLM_SETTINGS["prefix_cache"]
+            and LLM_SETTINGS["writer_model"] == LLM_SETTINGS["reviewer_model"])
+
+def prompt_prefix(chunk):
+    """Cached prefix of a window's writer prompt: its whole source block when it is shared with the reviewer"""
+    return source_prefix(chunk["text"], chunk["context"]) if shares_prefix() else PROMPT_HEADER
+
+def chunk_chapter(text, model, tokenizer):
+    """Split a chapter into paragraph-aligned windows that fit the writer prompt
+
+    When the reviewer shares the writer's prefixes it reviews these same
+    windows, so they are sized for the reviewer prompt (source, draft and
+    refined output) instead.
+    """
+    overlap = LLM_SETTINGS["chunk_overlap_tokens"]
+    if shares_prefix():
+        from ai_pipeline.reviewer import format_shared_review_prompt
+        template, parts = format_shared_review_prompt("", "-", ""), 3
+    else:
+        template, parts = format_prompt("", context="-"), 2
+    max_tokens = window_budget(
+        model, tokenizer, template,
+        parts=parts, reserved=overlap, limit=LLM_SETTINGS["chunk_tokens"]
+    )
+    return split_into_windows(text, tokenizer, max_tokens, overlap)
+
+def rewrite_chunks(chunks, model, tokenizer, generate=None):
+    """Rewrite chapter windows, returning one output per window
+
+    `generate` is a generate(prompts, temperature, budgets, prefixes)
+    callable; by default windows are batched through the model in this
+    process. Each window's token budget follows the length of its source
+    text, and its prompt prefix is cached (see prompt_prefix).
+    """
+    from ai_pipeline.generation import local_generator, token_budget
+    prompts = [format_prompt(chunk["text"], chunk["context"]) for chunk in chunks]
+    budgets = [token_budget(tokenizer, chunk["text"]) for chunk in chunks]
+    generate = generate or local_generator(model, tokenizer, desc="Writing")
+    outputs = generate(prompts, LLM_SETTINGS["temperature"], budgets, [prompt_prefix(chunk) for chunk in chunks])
+    # Fall back to the source window rather than silently dropping text
+    return [clean_output(output, PROMPT_MARKERS) or chunk["text"]
+            for output, chunk in zip(outputs, chunks)]
+
+def rewrite_locally(text, generate=None):
+    """Rewrite a chapter with the writer model loaded in this process"""
+    from utils.llm_loader import load_model
     print("\nInitializing AI writer...")
     model, tokenizer = load_model(LLM_SETTINGS["writer_model"])
-    
-    print("  Preparing text generation pipeline...")
-    generator = pipeline(
-        "text-generation",
-        model=model,
-        tokenizer=tokenizer
-    )
-    
-    prompt = format_prompt(text)
-    
-    # Truncate the prompt to fit model's max length
-    max_length = 1024
-    input_ids = tokenizer.encode(prompt, add_special_tokens=False)
-    if len(input_ids) > max_length:
-        print(f"  Prompt too long for model, truncating to {max_length} tokens.")
-        input_ids = input_ids[:max_length]
-        prompt = tokenizer.decode(input_ids)
+
+    chunks = chunk_chapter(text, model, tokenizer)
+    print(f"  Split chapter into {len(chunks)} chunk(s)")
 
     print("  Generating rewritten content...")
-    with tqdm(total=100, desc="Writing", ncols=100) as pbar:
-        result = generator(
-            prompt,
-            max_new_tokens=LLM_SETTINGS["max_new_tokens"],
-            temperature=LLM_SETTINGS["temperature"],
-            do_sample=True
-        )
-        pbar.update(100)
-    
-    # Extract just the rewritten portion
-    full_output = result[0]['generated_text']
-    rewritten = full_output.split("[REWRITTEN CHAPTER]")[-1].strip()
+    return stitch_chunks(rewrite_chunks(chunks, model, tokenizer, generate))
+
+def rewrite_paragraphs(paragraphs, contexts=None):
+    """Rewrite paragraphs independently, returning exactly one paragraph per input
+
+    Incremental re-processing splices these into an accepted chapter, so
+    each output is kept to a single paragraph. `contexts` holds the text
+    preceding each paragraph, shown to the model as the previous passage.
+    All windows are generated as one batch.
+    """
+    from utils.llm_loader import load_model
+    model, tokenizer = load_model(LLM_SETTINGS["writer_model"])
+    overlap = LLM_SETTINGS["chunk_overlap_tokens"]
+
+    chunks, owners = [], []
+    for index, paragraph in enumerate(paragraphs):
+        windows = chunk_chapter(paragraph, model, tokenizer)
+        if overlap and contexts and contexts[index] and windows:
+            windows[0]["context"] = tokenizer.decode(
+                tokenizer.encode(contexts[index], add_special_tokens=False)[-overlap:]
+            )
+        chunks.extend(windows)
+        owners.extend([index] * len(windows))
+
+    print(f"\nRewriting {len(paragraphs)} changed paragraph(s) in {len(chunks)} window(s)...")
+    rewritten = [[] for _ in paragraphs]
+    for index, output in zip(owners, rewrite_chunks(chunks, model, tokenizer) if chunks else []):
+        rewritten[index].append(output)
+    return [stitch_paragraph(parts) for parts in rewritten]
+
+def rewrite_cache_key(text, attempt=0):
+    """Cache key for a rewrite; retries after a failed pre-check get their own entries"""
+    extra = {"attempt": attempt} if attempt else {}
+    return get_cache().make_key("rewrite", text, model=LLM_SETTINGS["writer_model"], settings=LLM_SETTINGS, **extra)
+
+def rewrite_chapter(text, attempt=0):
+    """Rewrite a chapter of any length by rewriting its windows and stitching them back"""
+    cache = get_cache()
+    cache_key = rewrite_cache_key(text, attempt)
+    rewritten = cache.get("rewrite", cache_key)
+    if rewritten is not MISSING:
+        print("\nUsing cached rewrite (input, model and settings unchanged)")
+        return rewritten
+
+    rewritten = remote_rewrite(text)
+    if rewritten is None:
+        rewritten = rewrite_locally(text)
+    else:
+        print("\nChapter rewritten by model server")
+    cache.set("rewrite", cache_key, rewritten)
     
     print("\nWriting complete!")
-    print(f"Prompt length: {len(prompt)} characters")
+    print(f"Original length: {len(text)} characters")
     print(f"Rewritten length: {len(rewritten)} characters")
     
-    return rewritten
\ No newline at end of file
+    return rewritten
+
+
+def stream_rewrite(text, attempt=0):
+    """Rewrite a chapter, yielding text as the model produces it
+
+    Windows are generated one at a time so tokens can be shown live;
+    each window stops at its length budget or when the model starts
+    echoing the prompt template. Joining the yielded pieces gives the
+    same text rewrite_chapter() would return, and it is cached the same way.
+    """
+    from utils.llm_loader import load_model
+    from ai_pipeline.generation import stream_generate, stream_budget
+    cache = get_cache()
+    cache_key = rewrite_cache_key(text, attempt)
+    rewritten = cache.get("rewrite", cache_key)
+    if rewritten is not MISSING:
+        yield rewritten
+        return
+
+    model, tokenizer = load_model(LLM_SETTINGS["writer_model"])
+    outputs = []
+    for chunk in chunk_chapter(text, model, tokenizer):
+        if outputs:
+            yield "\n\n"
+        prompt = format_prompt(chunk["text"], chunk["context"])
+        tokens = stream_generate(
+            model, tokenizer, prompt,
+            max_new_tokens=stream_budget(model, tokenizer, prompt, chunk["text"]),
+            temperature=LLM_SETTINGS["temperature"],
+            markers=PROMPT_MARKERS,
+            prefix=prompt_prefix(chunk)
+        )
+        pieces = []
+        for piece in stream_until_marker(tokens, PROMPT_MARKERS):
+            pieces.append(piece)
+            yield piece
+        if not pieces:
+            pieces.append(chunk["text"])
+            yield chunk["text"]
+        outputs.append("".join(pieces))
+
+    cache.set("rewrite", cache_key, stitch_chunks(outputs))
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Measure write + review throughput (tokens/sec) with shared prefixes and assisted decoding
+
+Run from the repository root:
+
+    python -m benchmarks.bench_decoding [--modes off int8] [--assistant distilgpt2] [--tokens 64] [--repeat 3]
+
+For each CPU loading mode the writer model rewrites and then reviews the
+first windows of the synthetic wiki fixture, as review_locally does when one
+model plays both roles:
+
+- "separate": writer prompts reuse only the instruction header, reviewer
+  prompts use the standalone proofreading template;
+- "shared": reviewer prompts start with the writer's per-window source
+  prefix, whose KV cache the writer already computed;
+- "assisted": the same shared prompts decoded with --assistant as draft
+  model (skipped without one).
+"""
+import argparse
+import statistics
+import time
+import torch
+from config import LLM_SETTINGS
+from utils.llm_loader import load_model, CPU_MODES
+from ai_pipeline.generation import generate_batch, PREFIX_CACHE
+from ai_pipeline.writer import chunk_chapter, format_prompt, source_prefix, PROMPT_HEADER
+from ai_pipeline.reviewer import format_review_prompt, format_shared_review_prompt
+from benchmarks.bench_inference import fixture_text, generated_tokens
+
+def write_and_review(model, tokenizer, chunks, tokens, shared):
+    """Run the writer then the reviewer over the windows; returns all generated outputs"""
+    generate = lambda prompts, prefixes: generate_batch(
+        model, tokenizer, prompts, max_new_tokens=tokens,
+        temperature=LLM_SETTINGS["temperature"], batch_size=len(prompts), prefix=prefixes
+    )
+    sources = [source_prefix(chunk["text"], chunk["context"]) for chunk in chunks]
+    drafts = generate([format_prompt(chunk["text"], chunk["context"]) for chunk in chunks],
+                      sources if shared else [PROMPT_HEADER] * len(chunks))
+    if shared:
+        reviews = generate([format_shared_review_prompt(chunk["text"], chunk["context"], draft)
+                            for chunk, draft in zip(chunks, drafts)], sources)
+    else:
+        reviews = generate([format_review_prompt(chunk["text"], draft) for chunk, draft in zip(chunks, drafts)], None)
+    return drafts + reviews
+
+def run(model, tokenizer, chunks, tokens, shared, repeat):
+    """Median tokens/sec over `repeat` runs, after one untimed warm-up; each run starts with an empty prefix cache"""
+    write_and_review(model, tokenizer, chunks, 8, shared)
+    rates = []
+    for seed in range(repeat):
+        PREFIX_CACHE.clear()
+        torch.manual_seed(seed)
+        start = time.perf_counter()
+        outputs = write_and_review(model, tokenizer, chunks, tokens, shared)
+        rates.append(generated_tokens(tokenizer, outputs) / (time.perf_counter() - start))
+    return statistics.median(rates)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=LLM_SETTINGS["writer_model"])
+    parser.add_argument("--assistant", default=LLM_SETTINGS["assistant_model"],
+                        help="Draft model sharing the model's tokenizer (e.g. distilgpt2 for gpt2)")
+    parser.add_argument("--modes", nargs="+", choices=CPU_MODES, default=CPU_MODES)
+    parser.add_argument("--tokens", type=int, default=64, help="New tokens per prompt")
+    parser.add_argument("--batch", type=int, default=LLM_SETTINGS["batch_size"], help="Windows per batch")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = fixture_text()
+    LLM_SETTINGS.update(prefix_cache=True, assistant_model=None)
+    print(f"{args.model}, {args.batch} window(s) x {args.tokens} new tokens x 2 passes, "
+          f"{torch.get_num_threads()} thread(s)")
+    print(f"{'MODE':<18} {'SEPARATE TOK/S':>15} {'SHARED TOK/S':>13} {'ASSISTED TOK/S':>15}")
+    for mode in args.modes:
+        model, tokenizer = load_model(args.model, mode)
+        # Shared-prefix windows are sized for the longer review prompt
+        LLM_SETTINGS.update(shared_prefix=True, writer_model=args.model, reviewer_model=args.model)
+        chunks = chunk_chapter(text, model, tokenizer)[:args.batch]
+
+        separate = run(model, tokenizer, chunks, args.tokens, False, args.repeat)
+        shared = run(model, tokenizer, chunks, args.tokens, True, args.repeat)
+        assisted = None
+        if args.assistant:
+            LLM_SETTINGS["assistant_model"] = args.assistant
+            assisted = run(model, tokenizer, chunks, args.tokens, True, args.repeat)
+            LLM_SETTINGS["assistant_model"] = None
+        assisted = f"{assisted:>15.1f}" if assisted is not None else f"{'-':>15}"
+        print(f"{mode:<18} {separate:>15.1f} {shared:>13.1f} {assisted}")
+
+if __name__ == "__main__":
+    main()
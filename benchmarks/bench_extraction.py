@@ -0,0 +1,52 @@
+"""Compare readability + BeautifulSoup extraction with the single-pass lxml engine
+
+Run from the repository root:
+
+    python -m benchmarks.bench_extraction [--repeat 20]
+
+The fixtures are synthetic pages; see benchmarks/fixtures/README.md.
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from pathlib import Path
+from scraper.scraper import extract_main_content, clean_html_content
+from scraper.extraction import extract_text
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+def load_fixtures():
+    """Return (name, url, html) for every saved HTML fixture"""
+    urls = json.loads((FIXTURES_DIR / "fixtures.json").read_text(encoding='utf-8'))
+    return [(name, url, (FIXTURES_DIR / name).read_text(encoding='utf-8')) for name, url in urls.items()]
+
+def legacy_extract(html):
+    # The legacy path prints progress bars; keep them out of the timings output
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return clean_html_content(extract_main_content(html))
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'FIXTURE':<26} {'KB':>6} {'LEGACY ms':>10} {'FAST ms':>9} {'SPEEDUP':>8}  {'METHOD':<12} {'CHARS':>13}")
+    for name, url, html in load_fixtures():
+        legacy_text, legacy_time = time_call(lambda: legacy_extract(html), args.repeat)
+        (fast_text, method), fast_time = time_call(lambda: extract_text(html, url), args.repeat)
+        print(f"{name:<26} {len(html) / 1024:>6.0f} {legacy_time * 1000:>10.2f} {fast_time * 1000:>9.2f} "
+              f"{legacy_time / fast_time:>7.1f}x  {method:<12} {len(legacy_text):>6}/{len(fast_text):<6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Check conditional revalidation against a local stand-in HTTP server
+
+Run from the repository root:
+
+    python -m benchmarks.bench_fetch [--size 200000]
+
+A localhost server plays a chapter site: one page carries an ETag, one
+only a Last-Modified date and one no validators at all. Each page is
+fetched twice with Fetcher, then the ETag page is changed and fetched
+again. Reports the status and bytes of every fetch, and exits with
+status 1 unless unchanged pages with validators come back as a 304 with
+the stored body, changed or unvalidated pages are downloaded again, and
+the conditional headers sent match the validators the server gave.
+"""
+import argparse
+import hashlib
+import sys
+import tempfile
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from config import FETCH_SETTINGS
+
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves server.pages ({path: (body, validators)}), answering 304 when the client's validators match"""
+
+    def do_GET(self):
+        body, validators = self.server.pages[self.path]
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"' if "etag" in validators else None
+        last_modified = LAST_MODIFIED if "last_modified" in validators else None
+        self.server.requests.append((self.path, self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")))
+
+        current = ((etag and self.headers.get("If-None-Match") == etag)
+                   or (not etag and last_modified and self.headers.get("If-Modified-Since") == last_modified))
+        self.send_response(304 if current else 200)
+        if etag:
+            self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        if current:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(pages):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.pages, server.requests = pages, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def page(title, size):
+    paragraph = f"<p>{title}: a paragraph of chapter text standing in for a real page.</p>\n"
+    return f"<html><body><h1>{title}</h1>\n{paragraph * (size // len(paragraph) + 1)}</body></html>".encode('utf-8')
+
+def main():
+    from scraper.fetcher import Fetcher, ValidatorStore
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000, help="Approximate page size in bytes")
+    args = parser.parse_args()
+
+    pages = {
+        "/etag": (page("ETag chapter", args.size), {"etag"}),
+        "/last-modified": (page("Last-Modified chapter", args.size), {"last_modified"}),
+        "/plain": (page("Plain chapter", args.size), set())
+    }
+    server = serve(pages)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+
+    with tempfile.TemporaryDirectory(prefix="bench_fetch_") as workdir:
+        fetcher = Fetcher({**FETCH_SETTINGS, "min_interval": 0, "retries": 0},
+                          validators=ValidatorStore(Path(workdir) / "http_cache.sqlite3"))
+        print(f"{'PAGE':<16} {'FETCH':<10} {'STATUS':>6} {'BYTES':>8} {'SENT':<20}")
+
+        def fetch(path, label):
+            sent = len(server.requests)
+            result = fetcher.fetch(base + path)
+            _, if_none_match, if_modified_since = server.requests[sent]
+            headers = "If-None-Match" if if_none_match else "If-Modified-Since" if if_modified_since else "-"
+            print(f"{path:<16} {label:<10} {result['status']:>6} {result['bytes']:>8} {headers:<20}")
+            return result, if_none_match, if_modified_since
+
+        try:
+            for path, (body, validators) in pages.items():
+                first, if_none_match, if_modified_since = fetch(path, "first")
+                check(first["status"] == 200 and not first["not_modified"] and first["text"] == body.decode(),
+                      f"{path}: first fetch was not a full 200")
+                check(not if_none_match and not if_modified_since, f"{path}: first fetch sent validators")
+
+                again, if_none_match, if_modified_since = fetch(path, "unchanged")
+                if validators:
+                    check(again["status"] == 304 and again["not_modified"] and again["bytes"] == 0,
+                          f"{path}: unchanged page was downloaded again")
+                    check(again["text"] == body.decode(), f"{path}: 304 did not return the stored body")
+                    check(bool(if_none_match) == ("etag" in validators)
+                          and bool(if_modified_since) == ("last_modified" in validators),
+                          f"{path}: conditional headers do not match the page's validators")
+                else:
+                    check(again["status"] == 200 and not again["not_modified"] and not if_none_match
+                          and not if_modified_since, f"{path}: page without validators was revalidated")
+
+            pages["/etag"] = (page("ETag chapter, corrected", args.size), {"etag"})
+            changed, _, _ = fetch("/etag", "changed")
+            check(changed["status"] == 200 and changed["text"] == pages["/etag"][0].decode(),
+                  "/etag: changed page was not downloaded again")
+            again, _, _ = fetch("/etag", "unchanged")
+            check(again["status"] == 304 and again["text"] == pages["/etag"][0].decode(),
+                  "/etag: corrected page was not revalidated against its new ETag")
+        finally:
+            fetcher.close()
+            server.shutdown()
+
+    for message in failures:
+        print(f"  {message}", file=sys.stderr)
+    if failures:
+        print(f"{len(failures)} check(s) failed", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
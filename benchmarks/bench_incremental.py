@@ -0,0 +1,84 @@
+"""Check how much of a re-scraped chapter incremental mode reuses
+
+Run from the repository root:
+
+    python -m benchmarks.bench_incremental [--edits 20]
+
+Each HTML fixture is extracted as the scraper would, stands in for an
+accepted version (its final text being a per-paragraph stand-in rewrite),
+and is then re-extracted after a one-word edit to one paragraph at a time.
+Reports the paragraph count, how many paragraphs each edit marked as
+changed and the planning time. Exits with status 1 unless every edit
+marks exactly the edited paragraph as changed and every fixture has
+more than one paragraph.
+"""
+import argparse
+import itertools
+import random
+import re
+import sys
+import time
+from ai_pipeline.chunking import split_paragraphs
+from pipeline.incremental import reusable_paragraphs, splice
+from scraper.extraction import extract_text
+from benchmarks.bench_extraction import load_fixtures
+
+def edit_paragraph(html, paragraphs, index):
+    """The page with the first word of paragraphs[index] replaced, or None if it cannot be located
+
+    The paragraph is found by its longest leading run of words that starts
+    an element's text in the markup, skipping earlier paragraphs
+    that start the same way (repeated headings such as "PART I.").
+    """
+    words = paragraphs[index].split()
+    for length in range(min(8, len(words)), 0, -1):
+        prefix = " ".join(words[:length])
+        # Source markup may wrap lines or open inline tags between the words
+        pattern = re.compile(">" + r"(?:\s|<[^>]+>)+".join(re.escape(word) for word in words[:length]))
+        skip = sum(paragraph.startswith(prefix) for paragraph in paragraphs[:index])
+        match = next(itertools.islice(pattern.finditer(html), skip, None), None)
+        if match:
+            position = match.start() + 1
+            return html[:position] + words[0] + "x" + html[position + len(words[0]):]
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--edits", type=int, default=20, help="Paragraphs edited per fixture")
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'FIXTURE':<32} {'PARAGRAPHS':>10} {'EDITS':>6} {'CHANGED':>8} {'PLAN ms':>8}")
+    for name, url, html in load_fixtures():
+        source = split_paragraphs(extract_text(html, url)[0])
+        final = [paragraph.upper() for paragraph in source]
+        if len(source) < 2:
+            # Vacuously "one changed paragraph", but every edit would regenerate the whole chapter
+            failures += 1
+            print(f"  {name}: extracted as {len(source)} paragraph(s)", file=sys.stderr)
+        rng = random.Random(0)
+        changed_counts, timings = [], []
+        for index in rng.sample(range(len(source)), min(args.edits, len(source))):
+            edited = edit_paragraph(html, source, index)
+            if edited is None:
+                continue
+            start = time.perf_counter()
+            paragraphs = split_paragraphs(extract_text(edited, url)[0])
+            reused = reusable_paragraphs(paragraphs, source, final)
+            timings.append(time.perf_counter() - start)
+            changed = [i for i, text in enumerate(reused) if text is None]
+            changed_counts.append(len(changed))
+            plan = {"reused": reused, "changed": changed}
+            spliced = split_paragraphs(splice(plan, [paragraphs[i] for i in changed]))
+            if changed != [index] or len(spliced) != len(paragraphs):
+                failures += 1
+                print(f"  {name}: editing paragraph {index} marked {changed[:10]} as changed", file=sys.stderr)
+        print(f"{name:<32} {len(source):>10} {len(changed_counts):>6} "
+              f"{max(changed_counts, default=0):>8} {sum(timings) / max(1, len(timings)) * 1000:>8.2f}")
+
+    if failures:
+        print(f"{failures} check(s) failed", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
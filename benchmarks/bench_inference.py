@@ -0,0 +1,67 @@
+"""Measure writer generation throughput (tokens/sec) for each CPU loading mode
+
+Run from the repository root:
+
+    python -m benchmarks.bench_inference [--modes off int8] [--tokens 64] [--repeat 3]
+
+Each mode loads the model separately and rewrites the first windows of the
+synthetic wiki fixture, with and without the cached instruction-header prefix.
+"""
+import argparse
+import statistics
+import time
+import torch
+from config import LLM_SETTINGS
+from utils.llm_loader import load_model, CPU_MODES
+from ai_pipeline.generation import generate_batch
+from ai_pipeline.writer import chunk_chapter, format_prompt, PROMPT_HEADER
+from scraper.extraction import extract_text
+from benchmarks.bench_extraction import load_fixtures
+
+def fixture_text():
+    name, url, html = next(fixture for fixture in load_fixtures() if "wiki" in fixture[0])
+    return extract_text(html, url)[0]
+
+def generated_tokens(tokenizer, outputs):
+    return sum(len(tokenizer.encode(output, add_special_tokens=False)) for output in outputs)
+
+def run(model, tokenizer, prompts, tokens, prefix, repeat):
+    """Median tokens/sec over `repeat` runs, after one untimed warm-up"""
+    generate = lambda new_tokens: generate_batch(
+        model, tokenizer, prompts, max_new_tokens=new_tokens,
+        temperature=LLM_SETTINGS["temperature"], batch_size=len(prompts), prefix=prefix
+    )
+    generate(8)
+    rates = []
+    for seed in range(repeat):
+        torch.manual_seed(seed)
+        start = time.perf_counter()
+        outputs = generate(tokens)
+        rates.append(generated_tokens(tokenizer, outputs) / (time.perf_counter() - start))
+    return statistics.median(rates)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=LLM_SETTINGS["writer_model"])
+    parser.add_argument("--modes", nargs="+", choices=CPU_MODES, default=CPU_MODES)
+    parser.add_argument("--tokens", type=int, default=64, help="New tokens per prompt")
+    parser.add_argument("--batch", type=int, default=LLM_SETTINGS["batch_size"], help="Windows per batch")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = fixture_text()
+    print(f"{args.model}, {args.batch} window(s) x {args.tokens} new tokens, {torch.get_num_threads()} thread(s)")
+    print(f"{'MODE':<18} {'LOAD s':>7} {'TOK/S':>8} {'PREFIX TOK/S':>13}")
+    for mode in args.modes:
+        start = time.perf_counter()
+        model, tokenizer = load_model(args.model, mode)
+        load_time = time.perf_counter() - start
+
+        chunks = chunk_chapter(text, model, tokenizer)[:args.batch]
+        prompts = [format_prompt(chunk["text"], chunk["context"]) for chunk in chunks]
+        plain = run(model, tokenizer, prompts, args.tokens, None, args.repeat)
+        prefixed = run(model, tokenizer, prompts, args.tokens, PROMPT_HEADER, args.repeat)
+        print(f"{mode:<18} {load_time:>7.1f} {plain:>8.1f} {prefixed:>13.1f}")
+
+if __name__ == "__main__":
+    main()
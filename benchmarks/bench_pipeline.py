@@ -0,0 +1,222 @@
+"""Time every pipeline stage end to end over the offline fixture pages
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline [--chapters 8] [--model sshleifer/tiny-gpt2]
+        [--output benchmarks/results/pipeline.json] [--baseline previous.json]
+
+The fixture pages (synthetic markup around real prose, see
+benchmarks/fixtures/README.md) are served by a local HTTP server and
+processed once each by default; with more --chapters they are processed
+again in turn, so later chapters repeat earlier text. Generation uses a tiny
+model with the stage cache and model server disabled, narration uses a stub
+in place of gTTS, and versions, Chroma passages and HTTP validators go to a
+temporary directory. Scrape (fetch), extract, screenshot, rewrite, review,
+evaluate, version, Chroma ingestion and narration are timed separately for
+each chapter. The JSON report holds per-stage statistics and per-chapter
+timings. With --baseline, stages whose median time regressed by more than
+--tolerance make the run exit with status 1.
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from config import LLM_SETTINGS, MODEL_SERVER, FETCH_SETTINGS, EMBEDDING_SETTINGS
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+STAGES = ["scrape", "extract", "screenshot", "rewrite", "review", "evaluate", "version", "chroma", "narrate"]
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def serve_fixtures():
+    """Serve FIXTURES_DIR on a free localhost port from a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(FIXTURES_DIR)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class StubTTSBackend:
+    """Stands in for gTTS: returns placeholder bytes instead of calling Google"""
+
+    name = "stub"
+    extension = "mp3"
+
+    def synthesize(self, text, lang):
+        return text.encode('utf-8')[:1024]
+
+@contextlib.contextmanager
+def quiet():
+    # Stages print progress and tqdm bars; keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        "count": len(ordered),
+        "total_s": round(sum(ordered), 4),
+        "mean_s": round(statistics.mean(ordered), 4),
+        "median_s": round(statistics.median(ordered), 4),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max_s": round(ordered[-1], 4)
+    }
+
+def compare(report, baseline, tolerance):
+    """Stages whose median time grew by more than `tolerance` (and at least 5 ms)"""
+    regressions = []
+    for stage, stats in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        growth = stats["median_s"] - previous["median_s"]
+        if growth > 0.005 and stats["median_s"] > previous["median_s"] * (1 + tolerance):
+            regressions.append({"stage": stage, "baseline_s": previous["median_s"], "median_s": stats["median_s"]})
+    return regressions
+
+def run(args, workdir):
+    from storage.chroma_db import ChapterDB
+    from storage.embeddings import BACKENDS, CachedEmbeddingFunction
+    from storage.version_store import VersionStore
+    from scraper.fetcher import Fetcher, ValidatorStore
+    from scraper.extraction import extract_text
+    from ai_pipeline.writer import rewrite_chapter
+    from ai_pipeline.reviewer import review_chapter
+    from ai_pipeline.evaluator import evaluate_quality
+    from utils.cache import get_cache
+    from utils.llm_loader import load_model
+    import utils.voice
+    import chromadb
+
+    LLM_SETTINGS.update(writer_model=args.model, reviewer_model=args.model, max_new_tokens=args.max_new_tokens)
+    MODEL_SERVER["enabled"] = False
+    get_cache().enabled = False
+    utils.voice.TTS_BACKENDS["stub"] = StubTTSBackend
+    utils.voice.AUDIO_DIR = workdir
+
+    setup = {}
+    start = time.perf_counter()
+    with quiet():
+        load_model(args.model)
+    setup["model_load_s"] = round(time.perf_counter() - start, 4)
+
+    fetcher = Fetcher({**FETCH_SETTINGS, "min_interval": 0, "conditional": False},
+                      validators=ValidatorStore(workdir / "http_cache.sqlite3"))
+    versions = VersionStore(workdir / "versions")
+    db = ChapterDB(CachedEmbeddingFunction(BACKENDS[args.embedding_backend]()), client=chromadb.EphemeralClient())
+    pool = None
+    if not args.no_screenshot:
+        from scraper.browser_pool import get_browser_pool
+        pool = get_browser_pool()
+
+    server = serve_fixtures()
+    fixtures = json.loads((FIXTURES_DIR / "fixtures.json").read_text(encoding='utf-8'))
+    names = sorted(fixtures)
+    count = args.chapters or len(names)
+    timings = {stage: [] for stage in STAGES}
+    chapters = []
+    try:
+        for index in range(count):
+            name = names[index % len(names)]
+            url = f"http://127.0.0.1:{server.server_address[1]}/{name}?chapter={index}"
+            seconds = {}
+
+            def timed(stage, func):
+                begin = time.perf_counter()
+                with quiet():
+                    result = func()
+                seconds[stage] = round(time.perf_counter() - begin, 4)
+                timings[stage].append(seconds[stage])
+                return result
+
+            html = timed("scrape", lambda: fetcher.fetch(url)["text"])
+            # Extract against the fixture's URL so per-site rules apply as in production
+            text, method = timed("extract", lambda: extract_text(html, fixtures[name]))
+            if pool is not None:
+                timed("screenshot", lambda: pool.screenshot(url, workdir / f"screenshot_{index}.png", html))
+            rewritten = timed("rewrite", lambda: rewrite_chapter(text))
+            reviewed = timed("review", lambda: review_chapter(text, rewritten))
+            evaluation = timed("evaluate", lambda: evaluate_quality(text, reviewed))
+            timed("version", lambda: versions.add_version(url, {
+                "original_text": text,
+                "rewritten_text": rewritten,
+                "reviewed_text": reviewed,
+                "final_text": reviewed,
+                "evaluation": evaluation,
+                "status": "accepted"
+            }))
+            timed("chroma", lambda: db.add_chapter(f"bench_{index}", reviewed, {"url": url}))
+            timed("narrate", lambda: utils.voice.text_to_speech(reviewed, backend="stub"))
+
+            chapters.append({"fixture": name, "url": url, "characters": len(text), "method": method,
+                             "faithfulness": round(evaluation["scores"]["faithfulness"], 2), "seconds": seconds})
+            print(f"[{index + 1}/{count}] {name}: " + ", ".join(f"{stage} {s:.3f}s" for stage, s in seconds.items()),
+                  file=sys.stderr)
+    finally:
+        server.shutdown()
+        fetcher.close()
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "model": args.model,
+        "max_new_tokens": args.max_new_tokens,
+        "embedding_backend": args.embedding_backend,
+        "chapters": count,
+        "setup": setup,
+        "stages": {stage: summarize(values) for stage, values in timings.items() if values},
+        "chapter_timings": chapters
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, help="Chapters to process (default: one per fixture page)")
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2", help="Model used for both writer and reviewer")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--embedding-backend", default=EMBEDDING_SETTINGS["backend"])
+    parser.add_argument("--no-screenshot", action="store_true", help="Skip the browser stage (no Playwright needed)")
+    parser.add_argument("--output", default="benchmarks/results/pipeline.json", help="JSON report path, or - for stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed median slowdown per stage (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as workdir:
+        report = run(args, Path(workdir))
+
+    # Keep stdout clean for the JSON report when it is written there
+    out = sys.stderr if args.output == "-" else sys.stdout
+    print(f"\n{'STAGE':<12} {'MEDIAN s':>9} {'P95 s':>8} {'TOTAL s':>9}", file=out)
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<12} {stats['median_s']:>9.4f} {stats['p95_s']:>8.4f} {stats['total_s']:>9.3f}", file=out)
+    print(f"{'model load':<12} {report['setup']['model_load_s']:>9.4f}", file=out)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['stage']}: median {regression['baseline_s']:.4f}s -> {regression['median_s']:.4f}s",
+                  file=out)
+
+    payload = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(payload, encoding='utf-8')
+        print(f"\nReport written to {output}")
+    if report.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Time keyword, semantic and hybrid chapter search over a synthetic corpus
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search [--chapters 3000] [--queries 200] [--modes lexical hybrid vector]
+
+Builds a corpus of generated chapters in which every chapter names one
+character that appears nowhere else and ingests it through ChapterDB into
+an in-memory Chroma collection (offline hashing embeddings) and a
+temporary lexical index. Reports ingestion time, the cost of re-ingesting
+a few edited chapters, query latency p50/p95 per mode and how often the
+chapter naming a queried character is among the top 5 hits.
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+import chromadb
+from storage.chroma_db import ChapterDB
+from storage.embeddings import CachedEmbeddingFunction, HashingBackend
+from storage.lexical_index import LexicalIndex
+
+WORDS = (
+    "the a and of to in was he she it that his her with as had for on at by but not from they said "
+    "ship sea wind night morning house door road river town letter voice hand eyes face heart time "
+    "old young long dark silent quick cold bright great little strange quiet weary sudden distant "
+    "walked looked turned spoke waited remembered followed answered smiled listened watched carried"
+).split()
+SYLLABLES = ["ar", "bel", "cor", "dra", "en", "fal", "gor", "hal", "is", "jor", "kel", "lum", "mor", "nev", "or", "pel",
+             "quin", "ros", "sil", "tor", "ul", "val", "wen", "xan", "yor", "zel"]
+
+def character_name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+
+def make_corpus(chapters, paragraphs, seed=0):
+    """Generated chapters as dicts, each naming its own unique character"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    names, corpus = set(), []
+    for index in range(chapters):
+        name = character_name(rng)
+        while name in names:
+            name = character_name(rng)
+        names.add(name)
+        text = []
+        for _ in range(paragraphs):
+            words = rng.choices(WORDS, weights, k=rng.randint(60, 120))
+            if rng.random() < 0.3:
+                words.insert(rng.randrange(len(words)), name)
+            text.append(" ".join(words).capitalize() + ".")
+        text[rng.randrange(paragraphs)] += f" {name} said nothing."
+        corpus.append({
+            "chapter_id": f"chapter_{index:05d}",
+            "name": name,
+            "text": "\n\n".join(text),
+            "metadata": {
+                "url": f"https://{rng.choice(['en.wikisource.org', 'gutenberg.org'])}/book/{index}",
+                "status": rng.choice(["accepted", "accepted", "edited", "pending"]),
+                "score": round(rng.uniform(20, 45), 2)
+            }
+        })
+    return corpus
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=3000)
+    parser.add_argument("--paragraphs", type=int, default=12, help="Paragraphs per generated chapter")
+    parser.add_argument("--queries", type=int, default=200, help="Character-name queries per mode")
+    parser.add_argument("--edited", type=int, default=30, help="Chapters edited and re-indexed after the build")
+    parser.add_argument("--modes", nargs="+", choices=["lexical", "vector", "hybrid"], default=["lexical", "vector", "hybrid"])
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.chapters, args.paragraphs)
+    rng = random.Random(1)
+    queries = rng.sample(corpus, min(args.queries, len(corpus)))
+
+    with tempfile.TemporaryDirectory(prefix="bench_search_") as workdir:
+        lexical = LexicalIndex(Path(workdir) / "lexical_index.sqlite3")
+        db = ChapterDB(CachedEmbeddingFunction(HashingBackend()), client=chromadb.EphemeralClient(),
+                       lexical_index=lexical)
+
+        start = time.perf_counter()
+        db.add_chapters(corpus)
+        print(f"Ingested {len(corpus)} chapters ({lexical.count()} passages) in {time.perf_counter() - start:.2f}s")
+
+        edited = rng.sample(corpus, min(args.edited, len(corpus)))
+        for chapter in edited:
+            chapter["text"] = chapter["text"].replace(" said nothing.", " said nothing at all.")
+        start = time.perf_counter()
+        db.add_chapters(edited)
+        print(f"Re-ingested {len(edited)} edited chapters in {time.perf_counter() - start:.3f}s")
+
+        print(f"\n{'MODE':<8} {'P50 ms':>8} {'P95 ms':>8} {'HIT@5':>7}")
+        for mode in args.modes:
+            timings, hits = [], 0
+            for chapter in queries:
+                start = time.perf_counter()
+                if mode == "lexical":
+                    results = lexical.search(chapter["name"], 5)
+                else:
+                    results = db.hybrid_search(chapter["name"], 5, mode=mode)
+                timings.append(time.perf_counter() - start)
+                hits += any(result["id"].startswith(chapter["chapter_id"] + ":") for result in results)
+            print(f"{mode:<8} {percentile(timings, 0.5) * 1000:>8.2f} {percentile(timings, 0.95) * 1000:>8.2f} "
+                  f"{hits / len(queries):>7.1%}")
+
+        filtered = [chapter["name"] for chapter in queries[:20]]
+        start = time.perf_counter()
+        for name in filtered:
+            lexical.search(name, 5, min_score=30, statuses=["accepted", "edited"], domain="wikisource.org")
+        print(f"\nFiltered lexical query: {(time.perf_counter() - start) / len(filtered) * 1000:.2f} ms mean")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Check that the CLI starts quickly and loads no heavy dependency it does not need
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--budget 1.0] [--repeat 3]
+
+Times `python main.py --help`, `versions`, `review --list` and
+`search --lexical` in fresh interpreters and, for each, lists which heavy
+modules got imported. Exits with status 1 if any command takes longer than
+--budget seconds (median) or imports a heavy module, so it can guard
+startup time in CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["torch", "transformers", "chromadb", "playwright", "readability", "bs4", "gtts", "numpy", "httpx"]
+COMMANDS = [["--help"], ["versions"], ["review", "--list"], ["search", "--lexical", "captain"]]
+
+# Runs main.py as __main__ in a fresh interpreter, then reports which heavy modules it pulled in
+PROBE = """
+import json, runpy, sys
+heavy = json.loads(sys.argv[2])
+sys.argv = ["main.py"] + json.loads(sys.argv[1])
+try:
+    runpy.run_path("main.py", run_name="__main__")
+except SystemExit:
+    pass
+sys.stderr.write("\\nHEAVY_MODULES=" + json.dumps([name for name in heavy if name in sys.modules]) + "\\n")
+"""
+
+def run_command(args):
+    """Wall time of one CLI invocation and the heavy modules it imported"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps(args), json.dumps(HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    marker = [line for line in result.stderr.splitlines() if line.startswith("HEAVY_MODULES=")]
+    if not marker:
+        raise RuntimeError(f"main.py {' '.join(args)} failed:\n{result.stderr}")
+    return elapsed, json.loads(marker[-1].split("=", 1)[1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum median seconds per command")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    baseline = time.perf_counter() - start
+    print(f"Bare interpreter: {baseline:.3f}s")
+    print(f"{'COMMAND':<26} {'MEDIAN s':>9}  HEAVY IMPORTS")
+
+    failed = False
+    for command in COMMANDS:
+        timings, heavy = [], []
+        for _ in range(args.repeat):
+            elapsed, heavy = run_command(command)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        slow = median > args.budget
+        failed = failed or slow or bool(heavy)
+        print(f"{' '.join(command):<26} {median:>9.3f}  {', '.join(heavy) or '-'}{'  (over budget)' if slow else ''}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
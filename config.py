@@ -6,17 +6,44 @@ DATA_DIR = BASE_DIR / "data"
 SCREENSHOTS_DIR = DATA_DIR / "screenshots"
 VERSIONS_DIR = DATA_DIR / "versions"
 AUDIO_DIR = DATA_DIR / "audio"
+CACHE_DIR = DATA_DIR / "cache"
+CHECKPOINT_DIR = DATA_DIR / "checkpoints"
+MODELS_DIR = DATA_DIR / "models"
 
 # Create directories if missing
-for d in [SCREENSHOTS_DIR, VERSIONS_DIR, AUDIO_DIR]:
+for d in [SCREENSHOTS_DIR, VERSIONS_DIR, AUDIO_DIR, CACHE_DIR, CHECKPOINT_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
 # LLM Configuration
 LLM_SETTINGS = {
     "writer_model": "distilgpt2",
     "reviewer_model": "distilgpt2",
-    "max_new_tokens": 1024,
-    "temperature": 0.7
+    "max_new_tokens": 1024,       # Upper bound; each window's budget scales with its source length
+    "temperature": 0.7,
+    "chunk_tokens": 384,          # Upper bound on source tokens per generation window
+    "chunk_overlap_tokens": 48,   # Tail of the previous window shown as context
+    "batch_size": 4,              # Windows generated together in one padded batch
+    "length_ratio": 1.2,          # New-token budget per window as a multiple of its source tokens
+    "min_new_tokens": 32,         # Floor for the budget of very short windows
+    "cpu_mode": "off",            # off, int8, compile, int8-compile or bettertransformer (see utils/llm_loader.py)
+    "num_threads": None,          # Torch threads in CPU modes; None uses every core
+    "prefix_cache": True,         # Reuse KV caches of shared prompt prefixes
+    "prefix_cache_entries": 16,   # Cached prefixes kept per process, at least; grows to a chapter's window
+                                  # count in shared-prefix mode (each entry holds a window's keys/values)
+    "shared_prefix": False,       # With one writer/reviewer model, both prompts start with the window's source
+                                  # text, so the reviewer reuses the KV cache the writer computed; unmeasured,
+                                  # compare with benchmarks/bench_decoding.py before turning on
+    "assistant_model": None       # Small draft model with the same tokenizer for assisted decoding
+                                  # (e.g. "distilgpt2" for a gpt2 writer); None decodes normally
+}
+
+# Cheap pre-check on writer drafts before the reviewer runs
+GATE_SETTINGS = {
+    "enabled": True,
+    "min_length_ratio": 0.5,      # Drafts shorter than this fraction of the original fail
+    "max_length_ratio": 2.0,      # Drafts longer than this multiple of the original fail
+    "min_faithfulness": 5.0,      # Faithfulness score (out of 10) from evaluate_quality
+    "max_retries": 1              # Fresh writer attempts before giving up on the reviewer
 }
 
 # Scoring weights
@@ -26,4 +53,136 @@ SCORE_WEIGHTS = {
     "structure": 0.15,
     "faithfulness": 0.25,
     "fluency": 0.15
-}
\ No newline at end of file
+}
+
+# Minimum total score (out of 50) for a chapter to meet quality standards
+QUALITY_THRESHOLD = 30
+
+# Batch mode configuration
+BATCH_SETTINGS = {
+    "scrape_workers": 4,
+    "queue_size": 4
+}
+
+# Worker processes for batch mode (see pipeline/executor.py)
+EXECUTOR_SETTINGS = {
+    "llm_workers": 0,           # Model-owning generation processes, one chapter each; 0 keeps everything in-process
+    "llm_threads": None,        # Torch threads per generation process; None splits the cores evenly between them
+    "cpu_workers": None         # Extraction/evaluation processes; None uses one per core
+}
+
+# Stage cache configuration
+CACHE_SETTINGS = {
+    "enabled": True,
+    "max_bytes": 512 * 1024 * 1024,  # LRU eviction once entries exceed this size
+    "scrape_ttl": 24 * 60 * 60       # Seconds before a cached page is fetched again
+}
+
+# Persistent model server (python main.py serve); the CLI falls back to
+# loading models in-process when no server is listening
+MODEL_SERVER = {
+    "enabled": True,
+    "host": "127.0.0.1",
+    "port": 8765,
+    "timeout": 1800,        # Seconds to wait for a rewrite/review job
+    "batch_window": 0.05    # Seconds to collect concurrent jobs into one batch
+}
+
+# Screenshot browser pool configuration
+SCREENSHOT_SETTINGS = {
+    "max_pages": 4,         # Concurrent pages in the shared Chromium instance
+    "timeout": 30000,       # Page load timeout in milliseconds
+    "reuse_html": True,     # Render already-downloaded HTML instead of fetching the page again
+    "auto_install": True    # Run `playwright install chromium` once if Chromium is missing
+}
+
+# HTTP fetcher configuration
+FETCH_SETTINGS = {
+    "timeout": 30,
+    "retries": 3,
+    "backoff_factor": 0.5,      # Exponential backoff between retries, in seconds
+    "max_per_host": 2,          # Concurrent requests allowed to one host
+    "min_interval": 0.5,        # Seconds between request starts to one host
+    "pool_size": 10,            # Keep-alive connections kept per host
+    "conditional": True         # Send If-None-Match/If-Modified-Since from the validator store
+}
+
+# Site-specific extraction rules, keyed by domain (subdomains match too).
+# "content" selects the chapter body and "remove" lists elements to drop
+# from it; selectors starting with "/" or "(" are XPath, anything else is CSS.
+# Pages on these domains skip readability entirely when the rule matches.
+EXTRACTION_RULES = {
+    "en.wikisource.org": {
+        "content": "#mw-content-text .mw-parser-output",
+        "remove": ["#headertemplate", ".ws-noexport", ".mw-editsection", ".reference", "#toc"]
+    },
+    "gutenberg.org": {
+        "content": "body",
+        "remove": ["#pg-header", "#pg-footer", ".pagenum", "pre"]
+    }
+}
+
+# Chapter database configuration
+CHROMA_SETTINGS = {
+    "collection": "book_chapters",
+    "passage_chars": 1500,      # Chapters are stored as passages of at most this many characters
+    "passage_overlap": 200,     # Characters of the previous passage repeated at the start of the next
+    "batch_size": 64            # Passages embedded and upserted per call
+}
+
+# Embedding backend for ChapterDB: "onnx-minilm" (Chroma's CPU ONNX MiniLM, same
+# vectors as the default collection), "sentence-transformers" or "hashing"
+# (dependency-free and fully offline, lower quality)
+EMBEDDING_SETTINGS = {
+    "backend": "onnx-minilm",
+    "model": "all-MiniLM-L6-v2",
+    "batch_size": 32,
+    "dimensions": 384,          # Only used by the hashing backend
+    # Model files are read from here and never downloaded during a run;
+    # `python main.py setup` downloads them once
+    "model_dir": MODELS_DIR / "embeddings",
+    "cache": True               # Reuse embeddings of previously seen passages and queries
+}
+
+# Hybrid search over stored chapters (BM25 + embeddings, fused by reciprocal rank)
+SEARCH_SETTINGS = {
+    "candidates": 50,           # Hits taken from each retriever before fusion
+    "rrf_k": 60,                # Rank offset in 1 / (k + rank); larger flattens the ranking
+    "lexical_weight": 1.0,
+    "vector_weight": 1.0
+}
+
+# Narration configuration
+TTS_SETTINGS = {
+    "backend": "gtts",          # gtts (online, MP3) or espeak (offline espeak-ng, WAV)
+    "workers": 4,               # Chunks synthesized concurrently
+    "chunk_chars": 400,         # Sentences are packed into chunks of at most this many characters
+    "espeak_rate": 170          # Words per minute for the espeak backend
+}
+
+# Review queue configuration
+REVIEW_SETTINGS = {
+    "claim_timeout": 3600,      # Seconds before an unfinished review returns to the queue
+    "workers": 1                # Threads running versioning/storage behind the editor
+}
+
+# Stage spans and counters (see utils/metrics.py)
+METRICS_SETTINGS = {
+    "jsonl_path": None,                                   # Append every span/counter event here when set
+    "prometheus_path": str(DATA_DIR / "metrics.prom"),    # Snapshot rewritten at the end of each run
+    "reservoir": 1024                                     # Recent durations kept per series for p50/p95
+}
+
+# Near-duplicate detection: chapters re-posted under another URL reuse the accepted version
+DEDUP_SETTINGS = {
+    "enabled": True,
+    "threshold": 0.85,          # Estimated Jaccard similarity of word shingles that counts as a duplicate
+    "shingle_words": 5,         # Words per shingle
+    "num_perm": 128,            # MinHash signature length
+    "bands": 16                 # LSH bands (num_perm must divide evenly); more bands find less similar pairs
+}
+
+# Version store configuration
+VERSION_SETTINGS = {
+    "max_delta_chain": 8        # Store a full text after this many successive deltas
+}
@@ -57,4 +57,4 @@ def get_human_feedback(original, rewritten, evaluation):
                 print(f"{Fore.RED}Invalid choice. Please enter A, E, or R.{Style.RESET_ALL}")
         except KeyboardInterrupt:
             print(f"\n{Fore.RED}Operation cancelled by user.{Style.RESET_ALL}")
-            return {"status": "rejected", "edited_text": ""}
\ No newline at end of file
+            return {"status": "cancelled", "edited_text": ""}
\ No newline at end of file
@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from config import DATA_DIR, REVIEW_SETTINGS
+
+class ReviewQueue:
+    """Persistent queue of evaluated chapters waiting for an editor
+
+    Items move pending -> claimed (an editor has it open) -> decided (the
+    editor's choice is recorded) -> done (versioning and storage finished).
+    Each item carries the completed stage outputs so the post-review stages
+    can run without regenerating anything. Claims older than
+    REVIEW_SETTINGS["claim_timeout"] are returned to the queue, so a crashed
+    review session does not hide chapters.
+    """
+
+    def __init__(self, path=DATA_DIR / "review_queue.sqlite3"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                chapter_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                score REAL,
+                stages BLOB NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                feedback TEXT,
+                error TEXT,
+                enqueued_at REAL NOT NULL,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS reviews_by_status ON reviews (status, enqueued_at);
+        """)
+
+    def enqueue(self, url, chapter_id, stages, options=None):
+        """Queue a chapter for review, replacing any older item for the same chapter"""
+        score = stages.get("evaluate", {}).get("evaluation", {}).get("total_score")
+        payload = zlib.compress(json.dumps(stages, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, 'pending', NULL, NULL, ?, NULL)",
+                (chapter_id, url, score, payload, json.dumps(options or {}), time.time())
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _item(row):
+        return {
+            "chapter_id": row["chapter_id"],
+            "url": row["url"],
+            "score": row["score"],
+            "stages": json.loads(zlib.decompress(row["stages"])),
+            "options": json.loads(row["options"]),
+            "status": row["status"],
+            "feedback": json.loads(row["feedback"]) if row["feedback"] else None,
+            "error": row["error"]
+        }
+
+    def claim(self):
+        """Take the oldest pending chapter for review, or return None if the queue is empty"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reviews SET status = 'pending', claimed_at = NULL WHERE status = 'claimed' AND claimed_at < ?",
+                (time.time() - REVIEW_SETTINGS["claim_timeout"],)
+            )
+            while True:
+                row = self._conn.execute(
+                    "SELECT * FROM reviews WHERE status = 'pending' ORDER BY enqueued_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.commit()
+                    return None
+                # Another review session may have claimed it since the SELECT
+                claimed = self._conn.execute(
+                    "UPDATE reviews SET status = 'claimed', claimed_at = ? WHERE chapter_id = ? AND status = 'pending'",
+                    (time.time(), row["chapter_id"])
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    return {**self._item(row), "status": "claimed"}
+
+    def release(self, chapter_id):
+        """Put a claimed chapter back in the queue undecided"""
+        self._set(chapter_id, status="pending", claimed_at=None)
+
+    def decide(self, chapter_id, feedback):
+        """Record the editor's decision; the chapter is done once complete() is called"""
+        self._set(chapter_id, status="decided", feedback=json.dumps(feedback, ensure_ascii=False), error=None)
+
+    def complete(self, chapter_id):
+        self._set(chapter_id, status="done", error=None)
+
+    def fail(self, chapter_id, error):
+        """Keep a decided chapter decided, noting why its post-review stages failed"""
+        self._set(chapter_id, error=error)
+
+    def _set(self, chapter_id, **fields):
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE reviews SET {assignments} WHERE chapter_id = ?", (*fields.values(), chapter_id))
+            self._conn.commit()
+
+    def items(self, statuses):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM reviews WHERE status IN ({','.join('?' * len(statuses))}) ORDER BY enqueued_at",
+                list(statuses)
+            ).fetchall()
+        return [self._item(row) for row in rows]
+
+    def counts(self):
+        """Number of queue items per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM reviews GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_review_queue():
+    """Process-wide review queue"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ReviewQueue()
+        return _queue
+
+def apply_decision(item, feedback):
+    """Run versioning, storage and narration for a reviewed queue item
+
+    The queued stage outputs are seeded as checkpoints, so if a later stage
+    fails the chapter can also be finished with `main.py --resume`.
+    """
+    from pipeline.stages import run_pipeline
+    completed = {**item["stages"], "human_review": {"human_feedback": feedback}}
+    return run_pipeline(item["url"], {**item["options"], "queued": True}, completed=completed)
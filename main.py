@@ -1,34 +1,24 @@
 import argparse
-from scraper.scraper import scrape_url
-from ai_pipeline.writer import rewrite_chapter
-from ai_pipeline.reviewer import review_chapter
-from ai_pipeline.evaluator import evaluate_quality
-from human_review.feedback import get_human_feedback
-from storage.version_tracker import create_version_record
-from storage.chroma_db import ChapterDB
-from utils.helpers import setup_logging, clean_text, generate_chapter_id
-from tqdm import tqdm
-import time
-import sys
-import httpx
+from pipeline.stages import CheckpointStore, Reporter, StageFailed, resume_pipeline, run_pipeline
+from utils.helpers import (
+    setup_logging, generate_chapter_id, quiet_output,
+    print_step, print_success, print_warning, print_error, print_info
+)
+from utils.cache import print_cache_report
+from utils.metrics import get_metrics, print_metrics_report
+from config import BATCH_SETTINGS, EXECUTOR_SETTINGS, QUALITY_THRESHOLD, MODEL_SERVER, METRICS_SETTINGS
+import logging
 
 logger = setup_logging()
 
-def print_step(step_num, step_name):
-    print(f"\n\033[1mSTEP {step_num}: {step_name.upper()}\033[0m")
-    print("-" * 50)
-
-def print_success(message):
-    print(f"\033[92m✓ {message}\033[0m")
-
-def print_warning(message):
-    print(f"\033[93m⚠ {message}\033[0m")
-
-def print_error(message):
-    print(f"\033[91m✗ {message}\033[0m")
-
-def print_info(message):
-    print(f"\033[94mℹ {message}\033[0m")
+def print_stream(pieces):
+    """Print generated text live as it streams in and return the full text"""
+    text = []
+    for piece in pieces:
+        print(piece, end="", flush=True)
+        text.append(piece)
+    print()
+    return "".join(text)
 
 def get_user_url():
     while True:
@@ -37,131 +27,411 @@ def get_user_url():
             return url
         print_error("Invalid URL. Please enter a valid URL starting with http:// or https://")
 
-def main(enable_voice=False):
+class CLIReporter(Reporter):
+    """Prints the interactive pipeline's per-step progress"""
+
+    def __init__(self, stream=False):
+        self.stream = stream
+        self.step = 0
+
+    def _header(self, stage):
+        self.step += 1
+        print_step(self.step, stage["title"])
+
+    def start(self, stage, state):
+        self._header(stage)
+        name = stage["name"]
+        if name == "rewrite":
+            plan = state.get("update_plan")
+            if plan and not plan["changed"]:
+                print_info("No paragraphs changed; reusing the accepted text")
+            elif plan:
+                print_info(f"Rewriting {len(plan['changed'])} changed paragraph(s) with LLM...")
+            else:
+                print_info("Rewriting chapter with LLM...")
+            if self.stream:
+                print("\n\033[1mRewritten Text:\033[0m")
+        elif name == "review":
+            if state.get("gate", {}).get("decision") == "skip_review":
+                return
+            print_info("Reviewing and refining the chapter...")
+            if self.stream:
+                print("\n\033[1mReviewed Text:\033[0m")
+        elif name == "human_review":
+            print_info("Please review the AI-generated content:")
+        elif name == "narrate":
+            print_info("Generating audio narration...")
+
+    def resumed(self, stage, state):
+        self._header(stage)
+        print_info("Restored from checkpoint")
+        if stage["name"] in ("evaluate", "human_review"):
+            self.done(stage, state)
+
+    def done(self, stage, state):
+        name = stage["name"]
+        if name == "scrape":
+            print_success(f"Successfully scraped {len(state['original_text'])} characters")
+            print_success(f"Screenshot saved to: {state['screenshot_path']}")
+        elif name == "dedup":
+            duplicate = state["duplicate_of"]
+            if duplicate:
+                print_warning(f"Near-duplicate of {duplicate['url']} (similarity {duplicate['similarity']:.0%}); "
+                              f"reusing its accepted version (record #{duplicate['version']})")
+        elif name == "diff":
+            plan = state["update_plan"]
+            if plan["base_version"] is None:
+                print_info(f"Processing all {len(plan['paragraphs'])} paragraph(s): {plan['reason']}")
+            else:
+                print_success(f"{len(plan['changed'])} of {len(plan['paragraphs'])} paragraph(s) changed "
+                              f"since version record #{plan['base_version']}")
+        elif name == "rewrite":
+            print_success("Chapter rewritten successfully!")
+            print(f"\n\033[1mOriginal Text Sample:\033[0m\n{state['original_text'][:200]}...")
+            if not self.stream:
+                print(f"\n\033[1mRewritten Text Sample:\033[0m\n{state['rewritten_text'][:200]}...")
+        elif name == "review":
+            if state.get("review_skipped"):
+                print_warning(f"Draft failed the pre-check ({'; '.join(state['gate']['reasons'])}); "
+                              "review skipped, it goes straight to evaluation")
+            else:
+                print_success("Chapter reviewed and polished!")
+        elif name == "evaluate":
+            evaluation = state["evaluation"]
+            print("\n\033[1mEvaluation Results:\033[0m")
+            print(f"Total Score: \033[1m{evaluation['total_score']}/50\033[0m")
+            for cat, score in evaluation["scores"].items():
+                print(f"{cat.capitalize()}: {score}/10")
+            if evaluation["total_score"] >= QUALITY_THRESHOLD:
+                print_success("Chapter meets quality standards!")
+            else:
+                print_warning("Chapter quality is below optimal threshold")
+        elif name == "human_review":
+            status = state["human_feedback"]["status"]
+            if status == "pending":
+                print_info("Chapter queued for review. Review it with: python main.py review")
+            elif status == "rejected":
+                print_error("Chapter rejected. Process terminated.")
+            elif status == "edited":
+                print_success("Chapter edited and accepted!")
+            else:
+                print_success("Chapter accepted without changes!")
+        elif name == "version":
+            version = state["version"]
+            print_success(f"Version {version['version']} of {version['chapter_id']} saved (record #{version['id']})")
+        elif name == "store":
+            print_success(f"Chapter stored in database with ID: {state['chapter_id']}")
+        elif name == "narrate":
+            print_success(f"Audio narration saved to: {state['audio_path']}")
+
+def print_resume_hint(chapter_id):
+    completed = CheckpointStore(chapter_id).completed()
+    if completed:
+        print_info(f"Completed stages ({', '.join(completed)}) are checkpointed. "
+                   f"Continue with: python main.py --resume {chapter_id}")
+
+def main(enable_voice=None, stream=False, resume=None, queue_review=None, incremental=None):
     print("\033[1m" + "="*50)
     print("AUTOMATED BOOK PUBLICATION PIPELINE")
     print("="*50 + "\033[0m")
-    
-    url = get_user_url()
-    
+
+    options = {
+        "voice": enable_voice,
+        "queue_review": queue_review,
+        "incremental": incremental,
+        "on_text": print_stream if stream else None
+    }
+    reporter = CLIReporter(stream)
+    if resume:
+        chapter_id = resume
+        print_info(f"Resuming chapter {chapter_id}")
+    else:
+        url = get_user_url()
+        chapter_id = generate_chapter_id(url)
+
     try:
-        # Step 1: Scraping
-        print_step(1, "Scraping Content")
-        with tqdm(total=100, desc="Progress", ncols=100) as pbar:
-            scrape_data = scrape_url(url)
-            pbar.update(50)
-            time.sleep(0.5)  # Simulate processing
-            pbar.update(50)
-        
-        if not scrape_data.get("scrape_success"):
-            print_error(f"Scraping failed: {scrape_data.get('error')}")
+        if resume:
+            state = resume_pipeline(chapter_id, options, reporter)
+        else:
+            state = run_pipeline(url, options, reporter)
+    except StageFailed as e:
+        print_error(str(e))
+        if not resume and not CheckpointStore(chapter_id).completed():
             print_info("Please check the URL and try again.")
+        print_resume_hint(chapter_id)
+        return
+    except KeyboardInterrupt:
+        print_error("Interrupted.")
+        print_resume_hint(chapter_id)
+        return
+    except Exception as e:
+        print_error(f"An unexpected error occurred: {str(e)}")
+        logger.exception("Pipeline error")
+        print_resume_hint(chapter_id)
+        return
+
+    if state["human_feedback"]["status"] == "rejected":
+        return
+    print("\n\033[1;92m" + "="*50)
+    print("PROCESSING COMPLETE!")
+    print("="*50 + "\033[0m")
+    print_cache_report()
+    print_metrics_report()
+
+def batch_main(source, workers, queue_size, auto_accept=False, enable_voice=False, quiet=False, incremental=False,
+               llm_workers=None, cpu_workers=None):
+    from scraper.sources import load_chapter_urls
+    from pipeline.batch import run_batch, print_batch_summary
+
+    print("\033[1m" + "="*50)
+    print("AUTOMATED BOOK PUBLICATION PIPELINE - BATCH MODE")
+    print("="*50 + "\033[0m")
+
+    try:
+        urls = load_chapter_urls(source)
+    except Exception as e:
+        print_error(f"Could not load chapter URLs from {source}: {str(e)}")
+        return
+    if not urls:
+        print_error(f"No chapter URLs found in {source}")
+        return
+    print_info(f"Found {len(urls)} chapter URLs")
+    if auto_accept:
+        # Accepted chapters are stored, so the embedding model must be installed before any scraping starts
+        from storage.embeddings import get_embedding_function, ModelNotInstalled
+        try:
+            get_embedding_function()
+        except ModelNotInstalled as e:
+            print_error(str(e))
             return
-        
-        print_success(f"Successfully scraped {len(scrape_data['original_text'])} characters")
-        print_success(f"Screenshot saved to: {scrape_data['screenshot_path']}")
-
-        # Step 2: AI Rewriting
-        print_step(2, "AI Rewriting")
-        print_info("Rewriting chapter with LLM...")
-        with tqdm(total=100, desc="Processing", ncols=100) as pbar:
-            rewritten = rewrite_chapter(scrape_data["original_text"])
-            pbar.update(100)
-        
-        print_success("Chapter rewritten successfully!")
-        print(f"\n\033[1mOriginal Text Sample:\033[0m\n{scrape_data['original_text'][:200]}...")
-        print(f"\n\033[1mRewritten Text Sample:\033[0m\n{rewritten[:200]}...")
-
-        # Step 3: AI Review
-        print_step(3, "AI Review")
-        print_info("Reviewing and refining the chapter...")
-        with tqdm(total=100, desc="Reviewing", ncols=100) as pbar:
-            reviewed = review_chapter(scrape_data["original_text"], rewritten)
-            pbar.update(100)
-        
-        print_success("Chapter reviewed and polished!")
-
-        # Step 4: Evaluation
-        print_step(4, "Quality Evaluation")
-        evaluation = evaluate_quality(scrape_data["original_text"], reviewed)
-        print(f"\n\033[1mEvaluation Results:\033[0m")
-        print(f"Total Score: \033[1m{evaluation['total_score']}/50\033[0m")
-        for cat, score in evaluation["scores"].items():
-            print(f"{cat.capitalize()}: {score}/10")
-        
-        if evaluation["total_score"] >= 30:
-            print_success("Chapter meets quality standards!")
-        else:
-            print_warning("Chapter quality is below optimal threshold")
-
-        # Step 5: Human Review
-        print_step(5, "Human Review")
-        print_info("Please review the AI-generated content:")
-        feedback = get_human_feedback(scrape_data["original_text"], reviewed, evaluation)
-        
-        if feedback["status"] == "rejected":
-            print_error("Chapter rejected. Process terminated.")
+
+    if quiet:
+        # Per-stage progress is replaced by the summary, spans and counters below
+        with quiet_output():
+            results = run_batch(urls, workers, queue_size, auto_accept, enable_voice, incremental,
+                                llm_workers, cpu_workers, quiet=True)
+    else:
+        results = run_batch(urls, workers, queue_size, auto_accept, enable_voice, incremental, llm_workers, cpu_workers)
+    print("\n\033[1mBATCH SUMMARY\033[0m")
+    print_batch_summary(results)
+    print_cache_report()
+    print_metrics_report()
+
+def review_main(list_only=False):
+    from concurrent.futures import ThreadPoolExecutor
+    from human_review.feedback import get_human_feedback
+    from human_review.review_queue import get_review_queue, apply_decision
+    from config import REVIEW_SETTINGS
+
+    queue = get_review_queue()
+    if list_only:
+        items = queue.items(["pending", "claimed", "decided"])
+        if not items:
+            print_info("The review queue is empty")
             return
-        elif feedback["status"] == "edited":
-            print_success("Chapter edited and accepted!")
+        print(f"\033[1m{'CHAPTER':<14} {'STATUS':<9} {'SCORE':>7}  URL\033[0m")
+        for item in items:
+            score = "-" if item["score"] is None else f"{item['score']:.2f}"
+            print(f"{item['chapter_id']:<14} {item['status']:<9} {score:>7}  {item['url']}")
+            if item["error"]:
+                print(f"{'':<14} \033[91m{item['error']}\033[0m")
+        return
+
+    # Versioning and storage run behind the editor, who moves straight on to the next chapter
+    results = []
+    def finish(item, feedback):
+        try:
+            apply_decision(item, feedback)
+            queue.complete(item["chapter_id"])
+            results.append((item, feedback["status"], None))
+        except Exception as e:
+            logger.exception("Post-review stages failed for %s", item["chapter_id"])
+            queue.fail(item["chapter_id"], str(e))
+            results.append((item, feedback["status"], str(e)))
+
+    with ThreadPoolExecutor(max_workers=REVIEW_SETTINGS["workers"]) as workers:
+        # Decisions recorded by an earlier session whose storage never finished
+        futures = [workers.submit(finish, item, item["feedback"]) for item in queue.items(["decided"])]
+
+        reviewed = 0
+        while True:
+            item = queue.claim()
+            if item is None:
+                print_info("No more chapters waiting for review")
+                break
+            reviewed += 1
+            stages = item["stages"]
+            print_step(reviewed, f"Reviewing {item['chapter_id']}")
+            print_info(item["url"])
+            feedback = get_human_feedback(
+                stages["scrape"]["original_text"],
+                stages["review"]["reviewed_text"],
+                stages["evaluate"]["evaluation"]
+            )
+            if feedback["status"] == "cancelled":
+                queue.release(item["chapter_id"])
+                break
+            queue.decide(item["chapter_id"], feedback)
+            futures.append(workers.submit(finish, item, feedback))
+
+        if not all(future.done() for future in futures):
+            print_info("Finishing versioning and storage for reviewed chapters...")
+
+    for item, status, error in results:
+        if error:
+            print_error(f"{item['chapter_id']} ({status}): {error}")
         else:
-            print_success("Chapter accepted without changes!")
-
-        # Step 6: Versioning
-        print_step(6, "Version Control")
-        chapter_data = {
-            **scrape_data,
-            "rewritten_text": rewritten,
-            "reviewed_text": reviewed,
-            "evaluation": evaluation,
-            "human_feedback": feedback,
-            "final_text": feedback["edited_text"],
-            "status": feedback["status"]
-        }
-        
-        record_path = create_version_record(url, chapter_data)
-        print_success(f"Version record saved to: {record_path}")
-
-        # Step 7: Storage
-        print_step(7, "Database Storage")
-        if feedback["status"] in ["accepted", "edited"]:
-            try:
-                db = ChapterDB()
-                chapter_id = generate_chapter_id(url)
-                db.add_chapter(
-                    chapter_id=chapter_id,
-                    text=feedback["edited_text"],
-                    metadata={
-                        "url": url,
-                        "score": evaluation["total_score"],
-                        "status": feedback["status"]
-                    }
-                )
-                print_success(f"Chapter stored in database with ID: {chapter_id}")
-            except httpx.ReadTimeout:
-                print_error("Your connection timed out while downloading the embedding model. Please check your internet and try again.")
-            except Exception as e:
-                print_error(f"An error occurred during database storage: {str(e)}")
-
-        # Step 8: Voice Narration (Optional)
-        if enable_voice and feedback["status"] in ["accepted", "edited"]:
-            print_step(8, "Voice Narration")
-            from utils.voice import text_to_speech
-            print_info("Generating audio narration...")
-            audio_path = text_to_speech(feedback["edited_text"])
-            print_success(f"Audio narration saved to: {audio_path}")
+            print_success(f"{item['chapter_id']}: {status}")
 
-        print("\n\033[1;92m" + "="*50)
-        print("PROCESSING COMPLETE!")
-        print("="*50 + "\033[0m")
+def versions_main(chapter_id=None, statuses=None):
+    from storage.version_tracker import get_chapter_history, list_chapters
 
-    except Exception as e:
-        print_error(f"An unexpected error occurred: {str(e)}")
-        logger.exception("Pipeline error")
+    rows = get_chapter_history(chapter_id) if chapter_id else list_chapters(statuses)
+    if statuses and chapter_id:
+        rows = [row for row in rows if row["status"] in statuses]
+    if not rows:
+        print_info("No matching versions found")
+        return
+    print(f"\033[1m{'ID':>5}  {'VERSION':<16} {'STATUS':<10} {'SCORE':>7}  {'CHAPTER':<41} URL\033[0m")
+    for row in rows:
+        score = "-" if row["total_score"] is None else f"{row['total_score']:.2f}"
+        print(f"{row['id']:>5}  {row['version']:<16} {row['status']:<10} {score:>7}  {row['chapter_id']:<41} {row['url']}")
+
+def search_main(query, limit=5, mode="hybrid", min_score=None, statuses=None, domain=None, reindex=False):
+    from storage.lexical_index import get_lexical_index
+
+    if reindex:
+        from config import CHROMA_SETTINGS
+        from storage.chroma_db import get_client
+        collection = get_client().get_or_create_collection(CHROMA_SETTINGS["collection"], embedding_function=None)
+        print_info(f"Indexed {get_lexical_index().rebuild_from(collection)} stored passage(s)")
+        if not query:
+            return
+    if not query:
+        print_error("Nothing to search for")
+        return
+
+    if mode == "lexical":
+        # Answered from the SQLite index alone; neither Chroma nor an embedding model is loaded
+        hits = get_lexical_index().search(query, limit, min_score, statuses, domain)
+        for hit in hits:
+            hit["score"] = hit["bm25"]
+    else:
+        from storage.chroma_db import ChapterDB
+        from storage.embeddings import ModelNotInstalled
+        try:
+            db = ChapterDB()
+        except ModelNotInstalled as e:
+            print_error(f"{e} `--lexical` searches without it.")
+            return
+        hits = db.hybrid_search(query, limit, min_score, statuses, domain, mode)
+    if not hits:
+        print_info("No matching passages found")
+        return
+
+    for rank, hit in enumerate(hits, start=1):
+        metadata = hit["metadata"] or {}
+        score = "-" if metadata.get("score") is None else f"{metadata['score']:.2f}"
+        print(f"\033[1m{rank}. {metadata.get('chapter_id', hit['id'])}\033[0m  passage {hit['id'].rsplit(':', 1)[-1]}, "
+              f"{metadata.get('status', '-')}, quality {score}, match {hit['score']:.4f}")
+        print(f"   {metadata.get('url', '')}")
+        print(f"   {hit['snippet'] or ' '.join(hit['document'][:200].split())}...")
+
+def setup_main(backend=None):
+    from config import EMBEDDING_SETTINGS
+    from storage.embeddings import install_embedding_model
+    print_info(f"Downloading the {backend or EMBEDDING_SETTINGS['backend']} embedding model "
+               f"to {EMBEDDING_SETTINGS['model_dir']}...")
+    print_success(f"{install_embedding_model(backend)} is installed; runs no longer need network access for it")
+
+def runs_stages(args):
+    """Whether the command processes chapters through pipeline stages (and so has metrics to report)"""
+    if args.command == "review":
+        return not args.list
+    return args.command in (None, "batch")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Automated Book Publication Pipeline")
-    parser.add_argument("--voice", action="store_true", help="Enable voice narration")
+    # Chapter options default to None rather than False so --resume keeps the
+    # values the chapter was started with unless a flag is given again
+    parser.add_argument("--voice", action="store_true", default=None, help="Enable voice narration")
+    parser.add_argument("--stream", action="store_true", help="Print rewritten and reviewed text live as it is generated")
+    parser.add_argument("--resume", metavar="CHAPTER_ID", help="Continue an interrupted chapter from its last completed stage")
+    parser.add_argument("--queue", action="store_true", default=None, help="Queue the chapter for `review` instead of prompting for a decision")
+    parser.add_argument("--incremental", action="store_true", default=None,
+                        help="Only rewrite paragraphs that changed since the chapter's last accepted version")
+    parser.add_argument("--quiet", action="store_true", help="Batch mode: only print the final summary and metrics")
+    parser.add_argument("--metrics-jsonl", metavar="PATH", default=METRICS_SETTINGS["jsonl_path"],
+                        help="Append every stage span and counter to this JSON-lines file")
+    parser.add_argument("--metrics-prom", metavar="PATH", default=METRICS_SETTINGS["prometheus_path"],
+                        help="Write a Prometheus text-format snapshot here when a chapter, batch or review run ends")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="Process a list of chapter URLs without prompts")
+    batch_parser.add_argument("source", help="URL list file, sitemap (file or URL) or table-of-contents page URL")
+    batch_parser.add_argument("--workers", type=int, default=BATCH_SETTINGS["scrape_workers"],
+                              help="Concurrent scrape/screenshot workers")
+    batch_parser.add_argument("--queue-size", type=int, default=BATCH_SETTINGS["queue_size"],
+                              help="Scraped chapters allowed to wait for the LLM stages")
+    batch_parser.add_argument("--auto-accept", action="store_true",
+                              help="Accept and store chapters that meet the quality threshold instead of leaving them pending")
+    batch_parser.add_argument("--llm-workers", type=int, default=EXECUTOR_SETTINGS["llm_workers"],
+                              help="Generate this many chapters at once, each in its own model-owning process "
+                                   "(0 generates in this process)")
+    batch_parser.add_argument("--cpu-workers", type=int, default=EXECUTOR_SETTINGS["cpu_workers"],
+                              help="Processes for extraction and evaluation when --llm-workers is set (default: one per core)")
+
+    serve_parser = subparsers.add_parser("serve", help="Keep writer/reviewer models loaded and serve jobs to other runs")
+    serve_parser.add_argument("--host", default=MODEL_SERVER["host"])
+    serve_parser.add_argument("--port", type=int, default=MODEL_SERVER["port"])
+
+    review_parser = subparsers.add_parser("review", help="Review queued chapters; versioning and storage continue in the background")
+    review_parser.add_argument("--list", action="store_true", help="Show the queue without reviewing")
+
+    search_parser = subparsers.add_parser("search", help="Search stored chapters by keyword and meaning")
+    search_parser.add_argument("query", nargs="?", help='Words to look for; "quoted phrases" match exactly')
+    search_parser.add_argument("-n", "--limit", type=int, default=5)
+    search_parser.add_argument("--lexical", dest="mode", action="store_const", const="lexical", default="hybrid",
+                               help="Keyword (BM25) matches only; fast, no embedding model")
+    search_parser.add_argument("--vector", dest="mode", action="store_const", const="vector",
+                               help="Semantic matches only")
+    search_parser.add_argument("--min-score", type=float, help="Only chapters with at least this quality score")
+    search_parser.add_argument("--status", action="append", help="Only chapters with this status (repeatable)")
+    search_parser.add_argument("--domain", help="Only chapters from this site (subdomains included for --lexical)")
+    search_parser.add_argument("--reindex", action="store_true",
+                               help="Rebuild the keyword index from the chapter database first")
+
+    setup_parser = subparsers.add_parser("setup", help="Download the embedding model once, ahead of any run")
+    setup_parser.add_argument("--backend", help="Embedding backend to install (default: EMBEDDING_SETTINGS['backend'])")
+
+    versions_parser = subparsers.add_parser("versions", help="List chapters, or the version history of one chapter")
+    versions_parser.add_argument("chapter_id", nargs="?", help="Show every version of this chapter")
+    versions_parser.add_argument("--status", action="append", help="Only show versions with this status (repeatable)")
     args = parser.parse_args()
-    
-    main(args.voice)
\ No newline at end of file
+
+    metrics = get_metrics()
+    metrics.set_jsonl_path(args.metrics_jsonl)
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    try:
+        if args.command == "batch":
+            batch_main(args.source, args.workers, args.queue_size, args.auto_accept, bool(args.voice), args.quiet,
+                       bool(args.incremental), args.llm_workers, args.cpu_workers)
+        elif args.command == "review":
+            review_main(args.list)
+        elif args.command == "search":
+            search_main(args.query, args.limit, args.mode, args.min_score, args.status, args.domain, args.reindex)
+        elif args.command == "versions":
+            versions_main(args.chapter_id, args.status)
+        elif args.command == "setup":
+            setup_main(args.backend)
+        elif args.command == "serve":
+            from ai_pipeline.model_server import serve
+            serve(args.host, args.port)
+        else:
+            main(args.voice, args.stream, args.resume, args.queue, args.incremental)
+    finally:
+        # Only runs that went through pipeline stages replace the snapshot; listing
+        # and search would overwrite the last run's numbers with an empty one
+        if runs_stages(args):
+            metrics.write_prometheus(args.metrics_prom)
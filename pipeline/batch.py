@@ -0,0 +1,191 @@
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import BATCH_SETTINGS, EXECUTOR_SETTINGS
+from scraper.extraction import extract_text
+from scraper.scraper import scrape_url
+from pipeline.stages import run_pipeline
+from utils.metrics import get_metrics
+from utils.helpers import generate_chapter_id, print_error, print_info, print_success
+
+_DONE = object()
+PUT_POLL_SECONDS = 0.5
+
+def _put(chapter_queue, item, stop):
+    """Put item on the bounded queue, giving up once `stop` is set; returns whether it was queued"""
+    while not stop.is_set():
+        try:
+            chapter_queue.put(item, timeout=PUT_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _scrape_all(urls, chapter_queue, workers, executor=None, stop=None):
+    """Scrape chapters concurrently, blocking on the bounded queue when the LLM stage falls behind
+
+    Setting `stop` (the consumer failed or was interrupted) makes waiting
+    and not yet started scrapes return, so the worker threads can exit.
+    """
+    extract = functools.partial(executor.run, "cpu", extract_text) if executor else extract_text
+    stop = stop or threading.Event()
+
+    def scrape(index, url):
+        if stop.is_set():
+            return
+        try:
+            scrape_data = scrape_url(url, extract)
+        except Exception as e:
+            scrape_data = {"error": str(e), "scrape_success": False}
+        _put(chapter_queue, (index, url, scrape_data), stop)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index, url in enumerate(urls):
+            pool.submit(scrape, index, url)
+    _put(chapter_queue, _DONE, stop)
+
+def process_scraped_chapter(url, scrape_data, auto_accept=False, db=None, enable_voice=False, incremental=False,
+                            executor=None):
+    """Run the LLM, evaluation, versioning and storage stages for one scraped chapter
+
+    Stage outputs are checkpointed, so a chapter that fails part-way can be
+    finished later with `python main.py --resume <chapter_id>`. With an
+    executor, generation and evaluation run in its worker processes.
+    """
+    summary = {
+        "url": url,
+        "chapter_id": generate_chapter_id(url),
+        "status": "failed",
+        "score": None,
+        "characters": scrape_data.get("content_length", 0),
+        "error": None
+    }
+    if not scrape_data.get("scrape_success"):
+        summary["error"] = f"Scraping failed: {scrape_data.get('error')}"
+        return summary
+
+    state = run_pipeline(url, {
+        "auto_review": True,
+        "auto_accept": auto_accept,
+        "voice": enable_voice,
+        "incremental": incremental,
+        "db": db,
+        "executor": executor
+    }, completed={"scrape": scrape_data})
+    summary["score"] = state["evaluation"]["total_score"]
+    summary["status"] = state["human_feedback"]["status"]
+    return summary
+
+def run_batch(urls, scrape_workers=None, queue_size=None, auto_accept=False, enable_voice=False, incremental=False,
+              llm_workers=None, cpu_workers=None, quiet=False):
+    """Process chapters with scraping running concurrently ahead of the LLM stages
+
+    Scraping and screenshots are network-bound and run on a thread pool. A
+    bounded queue between them and the CPU-bound stages keeps scraping
+    from racing arbitrarily far ahead. By default the rewrite/review/
+    evaluate stages run on the calling thread so models are loaded once;
+    with `llm_workers` > 0, extraction and evaluation go to a process pool
+    and up to `llm_workers` chapters are generated at once, each on its
+    own model-owning worker process (see pipeline/executor.py). Returns
+    one summary dict per URL, in input order.
+    """
+    scrape_workers = scrape_workers or BATCH_SETTINGS["scrape_workers"]
+    queue_size = queue_size or BATCH_SETTINGS["queue_size"]
+    llm_workers = EXECUTOR_SETTINGS["llm_workers"] if llm_workers is None else llm_workers
+
+    # Opened before worker processes and scrape threads start, which nothing would stop if this failed
+    db = None
+    if auto_accept:
+        from storage.chroma_db import ChapterDB
+        db = ChapterDB()
+
+    executor = None
+    if llm_workers:
+        from pipeline.executor import StageExecutor
+        executor = StageExecutor(llm_workers, cpu_workers=cpu_workers, quiet=quiet)
+        print_info(f"Generating on {executor.llm_workers} worker process(es) with "
+                   f"{executor.llm_threads} thread(s) each")
+
+    chapter_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_scrape_all,
+        args=(urls, chapter_queue, scrape_workers, executor, stop),
+        daemon=True
+    )
+    producer.start()
+    results = [None] * len(urls)
+
+    def process(index, url, scrape_data):
+        start = time.perf_counter()
+        try:
+            if executor:
+                with executor.worker():
+                    summary = process_scraped_chapter(url, scrape_data, auto_accept, db, enable_voice, incremental,
+                                                      executor)
+            else:
+                summary = process_scraped_chapter(url, scrape_data, auto_accept, db, enable_voice, incremental)
+        except Exception as e:
+            summary = {
+                "url": url,
+                "chapter_id": generate_chapter_id(url),
+                "status": "failed",
+                "score": None,
+                "characters": scrape_data.get("content_length", 0),
+                "error": str(e)
+            }
+        summary["seconds"] = round(time.perf_counter() - start, 2)
+        results[index] = summary
+        get_metrics().count("chapters", status=summary["status"])
+
+        if summary["status"] == "failed":
+            print_error(f"{url}: {summary['error']}")
+        else:
+            print_success(f"{url}: {summary['status']} (score {summary['score']}/50)")
+
+    # One chapter thread per generation worker; a free slot is waited for before the next chapter is taken
+    chapter_pool = ThreadPoolExecutor(max_workers=executor.llm_workers) if executor else None
+    slots = threading.Semaphore(executor.llm_workers) if executor else None
+    completed = 0
+    try:
+        while True:
+            item = chapter_queue.get()
+            if item is _DONE:
+                break
+            index, url, scrape_data = item
+            if slots is not None:
+                slots.acquire()
+            completed += 1
+            print_info(f"[{completed}/{len(urls)}] Processing {url}")
+            if chapter_pool is None:
+                process(index, url, scrape_data)
+                continue
+            chapter_pool.submit(process, index, url, scrape_data).add_done_callback(lambda future: slots.release())
+    finally:
+        # Releases scrape workers blocked on the full queue when the loop above raised
+        stop.set()
+        if chapter_pool is not None:
+            chapter_pool.shutdown(wait=True)
+        if executor is not None:
+            executor.shutdown()
+    producer.join()
+    return results
+
+def print_batch_summary(results):
+    """Print a per-chapter result table"""
+    print(f"\n\033[1m{'CHAPTER':<14} {'STATUS':<10} {'SCORE':>7} {'CHARS':>8} {'SECS':>7}  URL\033[0m")
+    print("-" * 100)
+    for result in results:
+        score = "-" if result["score"] is None else f"{result['score']:.2f}"
+        print(f"{result['chapter_id']:<14} {result['status']:<10} {score:>7} "
+              f"{result['characters']:>8} {result.get('seconds', 0):>7}  {result['url']}")
+        if result["error"]:
+            print(f"{'':<14} \033[91m{result['error']}\033[0m")
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print("-" * 100)
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from config import EXECUTOR_SETTINGS
+from utils.cache import get_cache
+from utils.metrics import get_metrics
+
+def _silence(quiet):
+    if quiet:
+        sys.stdout = sys.stderr = open(os.devnull, 'w')
+
+def _init_cpu_worker(quiet):
+    # Extraction and scoring are single-threaded; keep numpy from starting a thread pool per process
+    os.environ["OMP_NUM_THREADS"] = "1"
+    _silence(quiet)
+
+def _init_llm_worker(threads, quiet):
+    # Set before torch is first imported in this process, then pinned for good
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _silence(quiet)
+    from utils.llm_loader import pin_threads
+    pin_threads(threads)
+
+def _run_task(fn, args):
+    """Run fn in a worker process, returning its result with the metric events it recorded"""
+    metrics = get_metrics()
+    metrics.start_capture()
+    try:
+        return fn(*args), metrics.stop_capture()
+    except BaseException:
+        metrics.stop_capture()
+        raise
+
+def _merge_events(events):
+    metrics = get_metrics()
+    for event in events:
+        if event["name"] == "cache_requests":
+            # Goes through the stage cache so its hit/miss report includes worker lookups
+            outcome = "hits" if event["result"] == "hit" else "misses"
+            get_cache().record(event["stage"], **{outcome: int(event["value"])})
+        else:
+            metrics.replay([event])
+
+class StageExecutor:
+    """Worker processes for the CPU-bound stages of batch chapters
+
+    Extraction and evaluation run on a pool of single-threaded processes.
+    Generation runs on `llm_workers` processes that each load the writer
+    and reviewer models on first use and keep them, with torch pinned to
+    `llm_threads` threads so the workers split the cores instead of
+    oversubscribing them. A chapter holds one generation worker for as
+    long as it runs (see worker()), so its rewrite and review share that
+    worker's prompt-prefix cache. Processes are spawned rather than
+    forked, and metrics and cache statistics recorded in them are merged
+    into this process after every task.
+    """
+
+    def __init__(self, llm_workers=None, llm_threads=None, cpu_workers=None, quiet=False):
+        cores = os.cpu_count() or 1
+        self.llm_workers = max(1, llm_workers or EXECUTOR_SETTINGS["llm_workers"])
+        self.llm_threads = llm_threads or EXECUTOR_SETTINGS["llm_threads"] or max(1, cores // self.llm_workers)
+        cpu_workers = cpu_workers or EXECUTOR_SETTINGS["cpu_workers"] or cores
+
+        context = multiprocessing.get_context("spawn")
+        self.cpu_pool = ProcessPoolExecutor(cpu_workers, mp_context=context,
+                                            initializer=_init_cpu_worker, initargs=(quiet,))
+        # One single-process pool per worker, so jobs can be routed to the worker that owns a chapter
+        self.llm_pools = [
+            ProcessPoolExecutor(1, mp_context=context, initializer=_init_llm_worker, initargs=(self.llm_threads, quiet))
+            for _ in range(self.llm_workers)
+        ]
+        self._free = queue.Queue()
+        for index in range(self.llm_workers):
+            self._free.put(index)
+        self._local = threading.local()
+
+    @contextmanager
+    def worker(self):
+        """Route this thread's generation jobs to one worker until the block ends, waiting for a free one"""
+        index = self._free.get()
+        self._local.index = index
+        try:
+            yield index
+        finally:
+            self._local.index = None
+            self._free.put(index)
+
+    def run(self, kind, fn, *args):
+        """Call a module-level function on the "cpu" pool or this thread's "llm" worker and return its result"""
+        if kind == "cpu":
+            return self._call(self.cpu_pool, fn, args)
+        index = getattr(self._local, "index", None)
+        if index is None:
+            with self.worker() as index:
+                return self._call(self.llm_pools[index], fn, args)
+        return self._call(self.llm_pools[index], fn, args)
+
+    def _call(self, pool, fn, args):
+        result, events = pool.submit(_run_task, fn, args).result()
+        _merge_events(events)
+        return result
+
+    def shutdown(self):
+        for pool in [self.cpu_pool, *self.llm_pools]:
+            pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
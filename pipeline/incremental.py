@@ -0,0 +1,85 @@
+from difflib import SequenceMatcher
+from ai_pipeline.chunking import split_paragraphs
+from utils.metrics import get_metrics
+
+def _normalize(paragraph):
+    # Re-scrapes often differ only in wrapping and spacing
+    return " ".join(paragraph.split())
+
+def reusable_paragraphs(paragraphs, old_source, old_final):
+    """Final text of the previous version for each new paragraph whose source is unchanged, else None
+
+    `old_source` and `old_final` are the previous version's source and
+    final paragraphs, aligned one to one.
+    """
+    reused = [None] * len(paragraphs)
+    matcher = SequenceMatcher(
+        None, [_normalize(p) for p in old_source], [_normalize(p) for p in paragraphs], autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            reused[j1:j2] = old_final[i1:i2]
+    return reused
+
+def plan_update(url, original_text):
+    """Work out which paragraphs of a re-scraped chapter need the LLM passes again
+
+    The new source is diffed paragraph by paragraph against the source of
+    the chapter's latest accepted (or edited) version. Paragraphs that did
+    not change reuse that version's final text, which must line up with its
+    source one paragraph per paragraph; incremental runs always produce such
+    text. Without a usable base every paragraph counts as changed.
+    Returns a plain dict: the new "paragraphs", the "reused" final text per
+    paragraph (None where it must be regenerated), the "changed" indices,
+    the "base_version" ID and a "reason" when nothing could be reused.
+    """
+    from storage.version_store import chapter_id_for, get_version_store
+    paragraphs = split_paragraphs(original_text)
+    plan = {
+        "base_version": None,
+        "paragraphs": paragraphs,
+        "reused": [None] * len(paragraphs),
+        "changed": list(range(len(paragraphs))),
+        "reason": None
+    }
+
+    previous = get_version_store().latest(chapter_id_for(url), ["accepted", "edited"])
+    if previous is None:
+        plan["reason"] = "no accepted version yet"
+        return plan
+    old_source = split_paragraphs(previous["content"]["original_text"])
+    old_final = split_paragraphs(previous["content"]["final_text"])
+    if len(old_source) != len(old_final):
+        plan["reason"] = "the accepted text is not paragraph-aligned with its source"
+        return plan
+
+    plan["reused"] = reusable_paragraphs(paragraphs, old_source, old_final)
+    plan["changed"] = [index for index, text in enumerate(plan["reused"]) if text is None]
+    plan["base_version"] = previous["metadata"]["id"]
+
+    get_metrics().count("incremental_paragraphs", len(paragraphs) - len(plan["changed"]), outcome="reused")
+    get_metrics().count("incremental_paragraphs", len(plan["changed"]), outcome="changed")
+    return plan
+
+def splice(plan, texts):
+    """Chapter text with the changed paragraphs replaced by `texts`, in plan["changed"] order"""
+    replacements = dict(zip(plan["changed"], texts))
+    return "\n\n".join(replacements.get(index, reused) for index, reused in enumerate(plan["reused"]))
+
+def rewrite_changed(plan):
+    """Writer drafts for the changed paragraphs, one paragraph each"""
+    if not plan["changed"]:
+        return []
+    from ai_pipeline.writer import rewrite_paragraphs
+    paragraphs = plan["paragraphs"]
+    return rewrite_paragraphs(
+        [paragraphs[index] for index in plan["changed"]],
+        [paragraphs[index - 1] if index else "" for index in plan["changed"]]
+    )
+
+def review_changed(plan, drafts):
+    """Reviewed versions of the changed paragraphs' drafts, one paragraph each"""
+    if not plan["changed"]:
+        return []
+    from ai_pipeline.reviewer import review_paragraphs
+    return review_paragraphs([plan["paragraphs"][index] for index in plan["changed"]], drafts)
@@ -0,0 +1,293 @@
+import json
+import os
+import shutil
+from config import CHECKPOINT_DIR, QUALITY_THRESHOLD, DEDUP_SETTINGS
+from utils.helpers import generate_chapter_id
+from utils.metrics import get_metrics
+
+class StageFailed(Exception):
+    """A stage could not produce its output; completed stages stay checkpointed"""
+
+class CheckpointStore:
+    """Per-chapter directory of completed stage outputs, one JSON file per stage"""
+
+    def __init__(self, chapter_id, root=CHECKPOINT_DIR):
+        self.chapter_id = chapter_id
+        self.directory = root / chapter_id
+
+    def _path(self, name):
+        return self.directory / f"{name}.json"
+
+    def start(self, url, options):
+        """Record what is needed to resume this chapter later"""
+        self.save("pipeline", {"url": url, "options": options})
+
+    def load(self, name):
+        try:
+            with open(self._path(name), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, output):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path(name).with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(name))
+
+    def completed(self):
+        return [stage["name"] for stage in STAGES if self._path(stage["name"]).exists()]
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def _accepted(state):
+    return state["human_feedback"]["status"] in ("accepted", "edited")
+
+def _not_duplicate(state, options):
+    return not state.get("duplicate_of")
+
+def _offload(options, kind, fn, *args):
+    """Run a CPU-bound call on the batch executor's worker processes when there is one (see pipeline/executor.py)"""
+    executor = options.get("executor")
+    if executor is None:
+        return fn(*args)
+    return executor.run(kind, fn, *args)
+
+def scrape_stage(state, options):
+    from scraper.scraper import scrape_url
+    scrape_data = scrape_url(state["url"])
+    if not scrape_data.get("scrape_success"):
+        raise StageFailed(f"Scraping failed: {scrape_data.get('error')}")
+    return scrape_data
+
+def dedup_stage(state, options):
+    """Reuse the accepted version of a near-duplicate chapter stored under another URL"""
+    from storage.dedup import get_dedup_index, minhash_signature
+    from storage.version_store import chapter_id_for, get_version_store
+    signature = state.get("signature") or minhash_signature(state["original_text"])
+    for match in get_dedup_index().query(signature, exclude=chapter_id_for(state["url"])):
+        record = get_version_store().latest(match["chapter_id"], ["accepted", "edited"])
+        if record is None:
+            continue
+        get_metrics().count("duplicates")
+        content = record["content"]
+        return {
+            "duplicate_of": {**match, "version": record["metadata"]["id"]},
+            "rewritten_text": content["rewritten_text"],
+            "reviewed_text": content["reviewed_text"],
+            "evaluation": record["evaluation"],
+            "human_feedback": {"status": "duplicate", "edited_text": content["final_text"]}
+        }
+    return {"duplicate_of": None}
+
+def diff_stage(state, options):
+    from pipeline.incremental import plan_update
+    return {"update_plan": plan_update(state["url"], state["original_text"])}
+
+def rewrite_stage(state, options):
+    from ai_pipeline.gating import gated_rewrite
+    original = state["original_text"]
+    plan = state.get("update_plan")
+
+    if plan:
+        from pipeline.incremental import rewrite_changed, splice
+        drafts = []
+
+        def rewrite_paragraphs(attempt):
+            drafts[:] = _offload(options, "llm", rewrite_changed, plan)
+            return splice(plan, drafts)
+
+        rewritten, gate = gated_rewrite(original, rewrite_paragraphs)
+        if options.get("on_text"):
+            options["on_text"]([rewritten])
+        return {"rewritten_text": rewritten, "gate": gate, "paragraph_drafts": drafts}
+
+    def rewrite(attempt):
+        if options.get("on_text"):
+            from ai_pipeline.writer import stream_rewrite
+            return options["on_text"](stream_rewrite(original, attempt))
+        from ai_pipeline.writer import rewrite_chapter
+        return _offload(options, "llm", rewrite_chapter, original, attempt)
+
+    rewritten, gate = gated_rewrite(original, rewrite)
+    return {"rewritten_text": rewritten, "gate": gate}
+
+def review_stage(state, options):
+    if state.get("gate", {}).get("decision") == "skip_review":
+        # A draft that failed the pre-check is not worth a reviewer pass
+        return {"reviewed_text": state["rewritten_text"], "review_skipped": True}
+    plan = state.get("update_plan")
+    if plan:
+        from pipeline.incremental import review_changed, splice
+        reviewed = splice(plan, _offload(options, "llm", review_changed, plan, state["paragraph_drafts"]))
+        if options.get("on_text"):
+            options["on_text"]([reviewed])
+        return {"reviewed_text": reviewed}
+    if options.get("on_text"):
+        from ai_pipeline.reviewer import stream_review
+        reviewed = options["on_text"](stream_review(state["original_text"], state["rewritten_text"]))
+    else:
+        from ai_pipeline.reviewer import review_chapter
+        reviewed = _offload(options, "llm", review_chapter, state["original_text"], state["rewritten_text"])
+    return {"reviewed_text": reviewed}
+
+def evaluate_stage(state, options):
+    from ai_pipeline.evaluator import evaluate_quality
+    return {"evaluation": _offload(options, "cpu", evaluate_quality, state["original_text"], state["reviewed_text"])}
+
+def _queue_for_review(state, options):
+    from human_review.review_queue import get_review_queue
+    checkpoints = CheckpointStore(state["chapter_id"])
+    stages = {name: checkpoints.load(name) for name in ("scrape", "dedup", "diff", "rewrite", "review", "evaluate")}
+    stages = {name: output for name, output in stages.items() if output is not None}
+    get_review_queue().enqueue(state["url"], state["chapter_id"], stages, _checkpointable(options))
+
+def human_review_stage(state, options):
+    if options.get("auto_review") or options.get("queue_review"):
+        # Nobody is at the keyboard: chapters either pass the quality gate
+        # (when auto-accept is on) or wait in the review queue for an editor
+        passed = options.get("auto_accept") and state["evaluation"]["total_score"] >= QUALITY_THRESHOLD
+        if not passed:
+            _queue_for_review(state, options)
+        return {"human_feedback": {"status": "accepted" if passed else "pending", "edited_text": state["reviewed_text"]}}
+
+    from human_review.feedback import get_human_feedback
+    feedback = get_human_feedback(state["original_text"], state["reviewed_text"], state["evaluation"])
+    if feedback["status"] == "cancelled":
+        raise StageFailed("Human review cancelled")
+    return {"human_feedback": feedback}
+
+def version_stage(state, options):
+    from storage.version_tracker import create_version_record
+    feedback = state["human_feedback"]
+    version = create_version_record(state["url"], {
+        **state,
+        "final_text": feedback["edited_text"],
+        "status": feedback["status"]
+    })
+    if DEDUP_SETTINGS["enabled"] and _accepted(state):
+        from storage.dedup import get_dedup_index, minhash_signature
+        get_dedup_index().add(version["chapter_id"], state["url"],
+                              state.get("signature") or minhash_signature(state["original_text"]))
+    return {"version": version}
+
+def store_stage(state, options):
+    db = options.get("db")
+    if db is None:
+        from storage.chroma_db import ChapterDB
+        from storage.embeddings import ModelNotInstalled
+        try:
+            db = ChapterDB()
+        except ModelNotInstalled as e:
+            raise StageFailed(str(e))
+    db.add_chapter(
+        chapter_id=state["chapter_id"],
+        text=state["human_feedback"]["edited_text"],
+        metadata={
+            "url": state["url"],
+            "score": state["evaluation"]["total_score"],
+            "status": state["human_feedback"]["status"]
+        }
+    )
+    return {"stored": True}
+
+def narrate_stage(state, options):
+    from utils.voice import text_to_speech
+    return {"audio_path": str(text_to_speech(state["human_feedback"]["edited_text"]))}
+
+STAGES = [
+    {"name": "scrape", "title": "Scraping Content", "run": scrape_stage},
+    {"name": "dedup", "title": "Duplicate Check", "run": dedup_stage,
+     "when": lambda state, options: DEDUP_SETTINGS["enabled"]},
+    {"name": "diff", "title": "Change Detection", "run": diff_stage,
+     "when": lambda state, options: options.get("incremental") and _not_duplicate(state, options)},
+    # A near-duplicate already carries the accepted texts, evaluation and decision
+    {"name": "rewrite", "title": "AI Rewriting", "run": rewrite_stage, "when": _not_duplicate},
+    {"name": "review", "title": "AI Review", "run": review_stage, "when": _not_duplicate},
+    {"name": "evaluate", "title": "Quality Evaluation", "run": evaluate_stage, "when": _not_duplicate},
+    {"name": "human_review", "title": "Human Review", "run": human_review_stage, "when": _not_duplicate},
+    {"name": "version", "title": "Version Control", "run": version_stage,
+     # Rejections of queued chapters are recorded so their pending version is superseded
+     "when": lambda state, options: state["human_feedback"]["status"] != "rejected" or options.get("queued")},
+    {"name": "store", "title": "Database Storage", "run": store_stage,
+     "when": lambda state, options: _accepted(state)},
+    {"name": "narrate", "title": "Voice Narration", "run": narrate_stage,
+     "when": lambda state, options: options.get("voice") and _accepted(state)}
+]
+
+class Reporter:
+    """Receives stage progress from run_pipeline; the default reports nothing"""
+
+    def start(self, stage, state):
+        pass
+
+    def done(self, stage, state):
+        pass
+
+    def resumed(self, stage, state):
+        pass
+
+    def skipped(self, stage, state):
+        pass
+
+def _checkpointable(options):
+    # Callbacks and shared clients are runtime-only; only plain settings are recorded
+    return {key: value for key, value in options.items() if isinstance(value, (str, int, float, bool, type(None)))}
+
+def run_pipeline(url, options=None, reporter=None, resume=False, completed=None, stages=STAGES):
+    """Run the pipeline stages for one chapter, checkpointing each output
+
+    Every completed stage's output is written under CHECKPOINT_DIR before
+    the next stage starts. With resume=True, stages that already have a
+    checkpoint are reloaded instead of run again. `completed` seeds
+    outputs produced elsewhere (e.g. batch scraping). Checkpoints are
+    removed once the whole pipeline finishes; on any failure they are
+    kept so the run can be resumed. Returns the final state dict.
+    """
+    options = options or {}
+    reporter = reporter or Reporter()
+    chapter_id = generate_chapter_id(url)
+    checkpoints = CheckpointStore(chapter_id)
+    if not resume:
+        checkpoints.clear()
+    checkpoints.start(url, _checkpointable(options))
+    for name, output in (completed or {}).items():
+        checkpoints.save(name, output)
+
+    state = {"url": url, "chapter_id": chapter_id}
+    for stage in stages:
+        if "when" in stage and not stage["when"](state, options):
+            reporter.skipped(stage, state)
+            continue
+        saved = checkpoints.load(stage["name"])
+        if saved is not None:
+            state.update(saved)
+            get_metrics().count("stages_restored", stage=stage["name"])
+            reporter.resumed(stage, state)
+            continue
+
+        reporter.start(stage, state)
+        with get_metrics().span("stage", stage=stage["name"]):
+            output = stage["run"](state, options)
+        checkpoints.save(stage["name"], output)
+        state.update(output)
+        reporter.done(stage, state)
+
+    checkpoints.clear()
+    return state
+
+def resume_pipeline(chapter_id, options=None, reporter=None):
+    """Continue a chapter from its first incomplete stage
+
+    The chapter keeps the options it was started with; only `options`
+    that are not None (e.g. flags given again on the command line)
+    override them.
+    """
+    checkpoints = CheckpointStore(chapter_id)
+    meta = checkpoints.load("pipeline")
+    if meta is None:
+        raise StageFailed(f"No checkpoints found for chapter {chapter_id}")
+    overrides = {key: value for key, value in (options or {}).items() if value is not None}
+    return run_pipeline(meta["url"], {**meta["options"], **overrides}, reporter, resume=True)
@@ -0,0 +1,136 @@
+import asyncio
+import atexit
+import re
+import subprocess
+import sys
+import threading
+from config import SCREENSHOT_SETTINGS
+from utils.helpers import print_info, print_success
+
+HEAD_TAG = re.compile(r'<head[^>]*>', re.IGNORECASE)
+
+def with_base_href(html, url):
+    """Point relative links at the original page so downloaded HTML renders with its assets"""
+    if re.search(r'<base\s', html, re.IGNORECASE):
+        return html
+    base = f'<base href="{url}">'
+    match = HEAD_TAG.search(html)
+    if match:
+        return html[:match.end()] + base + html[match.end():]
+    return base + html
+
+def install_browsers():
+    """Install Playwright's Chromium build"""
+    print_info("Installing required browsers...")
+    result = subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to install browsers automatically: {result.stderr.strip()}")
+    print_success("Browsers installed successfully")
+
+class _AsyncBrowserPool:
+    """A single long-lived Chromium shared by up to `max_pages` concurrent pages
+
+    Each screenshot gets its own browser context, so pages never share
+    cookies or storage, but the browser process is launched only once.
+    Only used from BrowserPool's event loop thread.
+    """
+
+    def __init__(self, max_pages=SCREENSHOT_SETTINGS["max_pages"], timeout=SCREENSHOT_SETTINGS["timeout"],
+                 auto_install=SCREENSHOT_SETTINGS["auto_install"]):
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.auto_install = auto_install
+        self._playwright = None
+        self._browser = None
+        self._semaphore = None
+        self._start_lock = None
+
+    async def start(self):
+        """Launch Chromium if it is not already running"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            try:
+                self._browser = await self._launch()
+            except BaseException:
+                # Otherwise every failed start leaves a Playwright driver process behind
+                await self._playwright.stop()
+                self._playwright = None
+                raise
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+
+    async def _launch(self):
+        """Launch Chromium, installing it first if it is missing and auto_install is set"""
+        try:
+            return await self._playwright.chromium.launch()
+        except Exception:
+            if not self.auto_install:
+                raise RuntimeError("Chromium is not installed; run `playwright install chromium`")
+        await asyncio.to_thread(install_browsers)
+        return await self._playwright.chromium.launch()
+
+    async def screenshot(self, url, path, html=None):
+        """Save a full-page screenshot of url, rendering `html` directly when given"""
+        await self.start()
+        async with self._semaphore:
+            context = await self._browser.new_context()
+            try:
+                page = await context.new_page()
+                if html is not None:
+                    await page.set_content(with_base_href(html, url), timeout=self.timeout)
+                else:
+                    await page.goto(url, timeout=self.timeout)
+                await page.screenshot(path=str(path), full_page=True)
+            finally:
+                await context.close()
+        return str(path)
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+class BrowserPool:
+    """Thread-safe synchronous front end to a shared Chromium
+
+    The pool runs on its own event loop thread, so scrape worker threads
+    can take screenshots concurrently through one Chromium process.
+    """
+
+    def __init__(self, **settings):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._pool = _AsyncBrowserPool(**settings)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def screenshot(self, url, path, html=None):
+        return self._run(self._pool.screenshot(url, path, html))
+
+    def close(self):
+        if self._loop.is_running():
+            self._run(self._pool.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Process-wide browser pool, closed automatically at exit"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,94 @@
+from urllib.parse import urlparse
+import lxml.html
+from config import EXTRACTION_RULES
+
+REMOVED_TAGS = ['script', 'style', 'footer', 'nav', 'aside', 'meta']
+# Elements whose text is a paragraph of its own; extracted text separates them with a blank line
+BLOCK_TAGS = ['p', 'div', 'section', 'article', 'header', 'blockquote', 'pre', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+              'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'table', 'tr', 'figure', 'figcaption', 'center', 'hr']
+# Part of the extract/scrape cache keys: bump when the layout of extracted text changes
+TEXT_LAYOUT = "blocks"
+BLOCK_BREAK = "\ue000"  # Private-use characters: lxml text cannot hold control characters
+LINE_BREAK = "\ue001"
+
+def join_blocks(text):
+    """Turn text marked with BLOCK_BREAK/LINE_BREAK into paragraphs separated by one blank line
+
+    Other whitespace (source indentation and wrapping) is collapsed to
+    single spaces, as a browser renders it.
+    """
+    paragraphs = []
+    for block in text.split(BLOCK_BREAK):
+        lines = [" ".join(line.split()) for line in block.split(LINE_BREAK)]
+        paragraph = "\n".join(line for line in lines if line)
+        if paragraph:
+            paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+def find_rule(url):
+    """Return the extraction rule for url's domain, or None"""
+    if not url:
+        return None
+    host = urlparse(url).netloc.lower().split(':')[0]
+    for domain, rule in EXTRACTION_RULES.items():
+        if host == domain or host.endswith('.' + domain):
+            return rule
+    return None
+
+def select(element, selector):
+    """Select elements with an XPath (leading '/' or '(') or CSS selector"""
+    if selector.startswith(('/', '(')):
+        return element.xpath(selector)
+    return element.cssselect(selector)
+
+def element_text(element):
+    """Plain text of an element with boilerplate tags removed
+
+    Block elements (paragraphs, headings, list items...) are separated by
+    exactly one blank line, which is where the rest of the pipeline splits
+    paragraphs; <br> becomes a single line break.
+    """
+    for tag in list(element.iter(*REMOVED_TAGS)):
+        if tag is not element:
+            tag.drop_tree()
+    for block in element.iter(*BLOCK_TAGS):
+        block.text = BLOCK_BREAK + (block.text or "")
+        block.tail = BLOCK_BREAK + (block.tail or "")
+    for br in element.iter('br'):
+        br.tail = LINE_BREAK + (br.tail or "")
+    return join_blocks(element.text_content())
+
+def apply_rule(tree, rule):
+    """Return the rule's content element with unwanted parts dropped, or None if it doesn't match"""
+    matches = select(tree, rule["content"])
+    if not matches:
+        return None
+    content = matches[0]
+    for selector in rule.get("remove", []):
+        for element in select(content, selector):
+            if element is not content:
+                element.drop_tree()
+    return content
+
+def extract_text(html, url=None):
+    """Extract clean chapter text from a page in a single lxml pass
+
+    Returns (text, method) where method is "rule" when a site-specific
+    rule matched and "readability" otherwise. The page is parsed once;
+    readability works on that tree directly and only its much smaller
+    summary fragment is parsed again for text extraction.
+    """
+    tree = lxml.html.document_fromstring(html)
+
+    rule = find_rule(url)
+    if rule:
+        content = apply_rule(tree, rule)
+        if content is not None:
+            return element_text(content), "rule"
+
+    # Only pages without a site rule need readability, so load it on first use
+    from readability import Document
+    summary = Document(tree).summary(html_partial=True)
+    if not summary.strip():
+        return "", "readability"
+    return element_text(lxml.html.fromstring(summary)), "readability"
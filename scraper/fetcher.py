@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import DATA_DIR, FETCH_SETTINGS
+from utils.metrics import get_metrics
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def _accept_encoding():
+    # urllib3 only decodes brotli when a brotli package is installed
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            return "gzip, deflate, br"
+        except ImportError:
+            return "gzip, deflate"
+
+class ValidatorStore:
+    """SQLite store of ETag/Last-Modified validators and the bodies they validate"""
+
+    def __init__(self, path=DATA_DIR / "http_cache.sqlite3"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB,
+                fetched_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url):
+        """Return (etag, last_modified, body) for url, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], zlib.decompress(row[2]).decode('utf-8')
+
+    def put(self, url, etag, last_modified, body):
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, zlib.compress(body.encode('utf-8')), time.time())
+            )
+            self._conn.commit()
+
+    def conditional_headers(self, url):
+        """Headers that let the server answer 304 if our stored copy is current"""
+        stored = self.get(url)
+        if stored is None:
+            return {}, None
+        etag, last_modified, body = stored
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers, body
+
+class HostLimiter:
+    """Per-host concurrency limit plus a minimum interval between request starts"""
+
+    def __init__(self, max_per_host=FETCH_SETTINGS["max_per_host"], min_interval=FETCH_SETTINGS["min_interval"]):
+        self.min_interval = min_interval
+        self._semaphores = defaultdict(lambda: threading.BoundedSemaphore(max_per_host))
+        self._next_start = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def _reserve_slot(self, host):
+        """Reserve the next start time for host and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.min_interval
+            return start - now
+
+    def acquire(self, host):
+        with self._lock:
+            semaphore = self._semaphores[host]
+        semaphore.acquire()
+        time.sleep(self._reserve_slot(host))
+
+    def release(self, host):
+        self._semaphores[host].release()
+
+def _result(url, status, text, not_modified, size):
+    metrics = get_metrics()
+    host = urlparse(url).netloc
+    metrics.count("http_requests", host=host, status=status)
+    metrics.count("http_bytes", size, host=host)
+    return {"url": url, "status": status, "text": text, "not_modified": not_modified, "bytes": size}
+
+class Fetcher:
+    """Polite HTTP fetcher sharing one keep-alive session across threads
+
+    Requests to the same host are limited in concurrency and spaced out,
+    transient failures are retried with exponential backoff, and pages
+    that carry ETag/Last-Modified validators are revalidated with a
+    conditional GET so unchanged chapters come back as a cheap 304.
+    """
+
+    def __init__(self, settings=FETCH_SETTINGS, validators=None):
+        self.settings = settings
+        self.validators = validators if validators is not None else ValidatorStore()
+        self.limiter = HostLimiter(settings["max_per_host"], settings["min_interval"])
+
+        retry = Retry(
+            total=settings["retries"],
+            backoff_factor=settings["backoff_factor"],
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET", "HEAD"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=settings["pool_size"], pool_maxsize=settings["pool_size"], max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.headers["Accept-Encoding"] = _accept_encoding()
+
+    def fetch(self, url):
+        """GET url, returning a dict with status, decoded text and whether it was a 304"""
+        headers, stored_body = ({}, None)
+        if self.settings["conditional"]:
+            headers, stored_body = self.validators.conditional_headers(url)
+
+        host = urlparse(url).netloc
+        self.limiter.acquire(host)
+        try:
+            with get_metrics().span("http_fetch", host=host):
+                response = self.session.get(url, headers=headers, timeout=self.settings["timeout"])
+        finally:
+            self.limiter.release(host)
+
+        if response.status_code == 304 and stored_body is not None:
+            return _result(url, 304, stored_body, True, 0)
+        response.raise_for_status()
+        text = response.text
+        self.validators.put(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), text)
+        return _result(url, response.status_code, text, False, len(response.content))
+
+    def close(self):
+        self.session.close()
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_fetcher():
+    """Process-wide fetcher so every chapter reuses the same connection pool"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher()
+        return _fetcher
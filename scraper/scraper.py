@@ -1,10 +1,19 @@
-import requests
 from utils.helpers import print_error, print_success, print_warning
-from readability import Document
-from bs4 import BeautifulSoup
-from config import DATA_DIR
+from config import DATA_DIR, CACHE_SETTINGS, SCREENSHOT_SETTINGS, DEDUP_SETTINGS
+from utils.cache import get_cache, text_digest, MISSING
+from .fetcher import get_fetcher
+from .extraction import (
+    extract_text,
+    find_rule,
+    join_blocks,
+    BLOCK_BREAK,
+    BLOCK_TAGS,
+    LINE_BREAK,
+    REMOVED_TAGS,
+    TEXT_LAYOUT
+)
 from .screenshot import capture_screenshot
-import re
+import os
 from urllib.parse import urlparse
 from tqdm import tqdm
 
@@ -17,6 +26,7 @@ def validate_url(url):
 
 def extract_main_content(html):
     """Extract main content with progress feedback"""
+    from readability import Document
     print("  Analyzing page structure...")
     doc = Document(html)
     with tqdm(total=100, desc="Extracting content", leave=False) as pbar:
@@ -26,55 +36,91 @@ def extract_main_content(html):
 
 def clean_html_content(html):
     """Clean HTML content with progress feedback"""
+    from bs4 import BeautifulSoup
     print("  Cleaning extracted content...")
     with tqdm(total=100, desc="Cleaning HTML", leave=False) as pbar:
         soup = BeautifulSoup(html, 'lxml')
         pbar.update(20)
         
-        for tag in soup(['script', 'style', 'footer', 'nav', 'aside', 'meta']):
+        for tag in soup(REMOVED_TAGS):
             tag.decompose()
         pbar.update(30)
         
+        # Same paragraph layout as extract_text
+        for tag in soup(BLOCK_TAGS):
+            tag.insert_before(BLOCK_BREAK)
+            tag.insert_after(BLOCK_BREAK)
+        for tag in soup('br'):
+            tag.replace_with(LINE_BREAK)
         text = soup.get_text()
         pbar.update(20)
         
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        pbar.update(20)
-        
-        text = text.strip()
-        pbar.update(10)
+        text = join_blocks(text)
+        pbar.update(30)
     
     return text
 
-def scrape_url(url):
-    """Main scraping function"""
+def scrape_url(url, extract=extract_text):
+    """Main scraping function
+
+    `extract` is called as extract(html, url); batch mode passes one that
+    runs extraction in a worker process.
+    """
     try:
         print(f"\nScraping URL: {url}")
         validate_url(url)
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        
-        print("  Downloading page content...")
-        with tqdm(total=100, desc="Downloading", leave=False) as pbar:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            pbar.update(100)
-        
-        article_html = extract_main_content(response.text)
-        clean_text = clean_html_content(article_html)
+        cache = get_cache()
+        scrape_key = cache.make_key("scrape", url, layout=TEXT_LAYOUT)
+        clean_text = cache.get("scrape", scrape_key, max_age=CACHE_SETTINGS["scrape_ttl"])
+        page_html = None
+        if clean_text is MISSING:
+            print("  Downloading page content...")
+            with tqdm(total=100, desc="Downloading", leave=False) as pbar:
+                response = get_fetcher().fetch(url)
+                pbar.update(100)
+            if response["not_modified"]:
+                print("  Page not modified since last fetch")
+            
+            # Extraction is keyed on the page body, so a 304 or identical page skips it
+            page_html = response["text"]
+            extract_key = cache.make_key("extract", text_digest(page_html), rule=find_rule(url), layout=TEXT_LAYOUT)
+            clean_text = cache.get("extract", extract_key)
+            if clean_text is MISSING:
+                print("  Extracting chapter content...")
+                clean_text, method = extract(page_html, url)
+                if method == "rule":
+                    print("  Matched site-specific extraction rule")
+                
+                if not clean_text or len(clean_text) < 100:
+                    raise ValueError("Insufficient content extracted - possible scraping issue")
+                cache.set("extract", extract_key, clean_text)
+            cache.set("scrape", scrape_key, clean_text)
+        else:
+            print("  Using cached page content")
         
-        if not clean_text or len(clean_text) < 100:
-            raise ValueError("Insufficient content extracted - possible scraping issue")
+        # Screenshots are keyed on the page content, so an unchanged chapter reuses its image
+        screenshot_key = cache.make_key("screenshot", url, text_digest(clean_text))
+        screenshot_path = cache.get("screenshot", screenshot_key, validate=lambda path: bool(path) and os.path.exists(path))
+        if screenshot_path is MISSING:
+            print("  Capturing page screenshot...")
+            screenshot_path = capture_screenshot(url, page_html if SCREENSHOT_SETTINGS["reuse_html"] else None)
+            if screenshot_path:
+                cache.set("screenshot", screenshot_key, str(screenshot_path))
+        else:
+            print("  Using cached page screenshot")
         
-        print("  Capturing page screenshot...")
-        screenshot_path = capture_screenshot(url)
+        signature = None
+        if DEDUP_SETTINGS["enabled"]:
+            # Taken from the cleaned text, so mirrors with different markup still match
+            from storage.dedup import minhash_signature
+            signature = minhash_signature(clean_text)
         
         return {
             "original_text": clean_text,
             "screenshot_path": str(screenshot_path),
             "content_length": len(clean_text),
+            "signature": signature,
             "scrape_success": True
         }
     except Exception as e:
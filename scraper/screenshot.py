@@ -1,43 +1,25 @@
-from playwright.sync_api import sync_playwright
 from config import SCREENSHOTS_DIR
 import hashlib
 from datetime import datetime
-import subprocess
-from utils.helpers import print_error, print_info, print_success
+from utils.helpers import print_error, print_success
+from .browser_pool import get_browser_pool
 
-def capture_screenshot(url):
-    """Capture full-page screenshot with automatic browser installation"""
-    try:
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"screenshot_{url_hash}_{timestamp}.png"
-        screenshot_path = SCREENSHOTS_DIR / filename
+def screenshot_path_for(url):
+    url_hash = hashlib.md5(url.encode()).hexdigest()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return SCREENSHOTS_DIR / f"screenshot_{url_hash}_{timestamp}.png"
 
-        with sync_playwright() as p:
-            try:
-                browser = p.chromium.launch()
-            except Exception as e:
-                print_info("Installing required browsers...")
-                result = subprocess.run(["playwright", "install"], capture_output=True, text=True)
-                if result.returncode != 0:
-                    print_error("Failed to install browsers automatically")
-                    print_error(result.stderr)
-                    return None
-                print_success("Browsers installed successfully")
-                browser = p.chromium.launch()
+def capture_screenshot(url, html=None):
+    """Capture full-page screenshot using the shared browser pool
 
-            try:
-                page = browser.new_page()
-                page.goto(url)
-                page.screenshot(path=screenshot_path, full_page=True)
-                print_success(f"Screenshot saved to: {screenshot_path}")
-                return str(screenshot_path)
-            except Exception as e:
-                print_error(f"Failed to capture screenshot: {str(e)}")
-                return None
-            finally:
-                browser.close()
-                
+    When `html` is given the already-downloaded page is rendered directly
+    instead of being fetched a second time by the browser.
+    """
+    try:
+        screenshot_path = screenshot_path_for(url)
+        get_browser_pool().screenshot(url, screenshot_path, html)
+        print_success(f"Screenshot saved to: {screenshot_path}")
+        return str(screenshot_path)
     except Exception as e:
-        print_error(f"Screenshot error: {str(e)}")
-        return None
\ No newline at end of file
+        print_error(f"Failed to capture screenshot: {str(e)}")
+        return None
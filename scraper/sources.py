@@ -0,0 +1,71 @@
+import html
+import re
+from pathlib import Path
+from urllib.parse import urljoin, urldefrag, urlparse
+from bs4 import BeautifulSoup
+from .fetcher import get_fetcher
+
+SITEMAP_LOC = re.compile(r'<loc>\s*(.*?)\s*</loc>', re.IGNORECASE | re.DOTALL)
+
+def is_sitemap(content):
+    """Check whether a document looks like an XML sitemap"""
+    head = content.lstrip()[:500].lower()
+    return head.startswith('<?xml') or '<urlset' in head or '<sitemapindex' in head
+
+def parse_url_list(content):
+    """Parse a plain text file with one URL per line, skipping blanks and # comments"""
+    urls = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not line.startswith(('http://', 'https://')):
+            raise ValueError(f"Invalid URL in list: {line}")
+        urls.append(line)
+    return urls
+
+def parse_sitemap(content):
+    """Extract chapter URLs from the <loc> entries of a sitemap"""
+    return [html.unescape(loc) for loc in SITEMAP_LOC.findall(content)]
+
+def parse_toc_page(page_html, base_url):
+    """Extract chapter links from a table-of-contents page
+
+    Links nested under the TOC page's own path are preferred (e.g.
+    /wiki/Book -> /wiki/Book/Chapter_1); otherwise all links in the
+    same directory on the same host are used.
+    """
+    base = urlparse(base_url)
+    toc_prefix = base.path.rstrip('/') + '/'
+    dir_prefix = base.path.rsplit('/', 1)[0] + '/'
+
+    soup = BeautifulSoup(page_html, 'lxml')
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        url = urldefrag(urljoin(base_url, anchor['href']))[0]
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or parsed.netloc != base.netloc:
+            continue
+        if parsed.path.rstrip('/') == base.path.rstrip('/'):
+            continue
+        links.append(url)
+
+    nested = [url for url in links if urlparse(url).path.startswith(toc_prefix)]
+    if nested:
+        return nested
+    return [url for url in links if urlparse(url).path.startswith(dir_prefix)]
+
+def load_chapter_urls(source):
+    """Resolve a URL list file, sitemap (file or URL) or TOC page URL into chapter URLs"""
+    if source.startswith(('http://', 'https://')):
+        content = get_fetcher().fetch(source)["text"]
+        if is_sitemap(content):
+            urls = parse_sitemap(content)
+        else:
+            urls = parse_toc_page(content, source)
+    else:
+        content = Path(source).read_text(encoding='utf-8')
+        urls = parse_sitemap(content) if is_sitemap(content) else parse_url_list(content)
+
+    # Preserve order but drop duplicate links (TOC pages often link chapters twice)
+    return list(dict.fromkeys(urls))
@@ -1,23 +1,225 @@
+import re
+import threading
 import chromadb
-from config import DATA_DIR
+from config import DATA_DIR, CHROMA_SETTINGS, SEARCH_SETTINGS
+from utils.metrics import get_metrics
+from .embeddings import get_embedding_function
+from .lexical_index import get_lexical_index, url_domain
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide persistent Chroma client"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = chromadb.PersistentClient(path=str(DATA_DIR / "chroma_db"))
+        return _client
+
+def _split_long(paragraph, max_chars):
+    """Split a paragraph longer than max_chars at sentence, then word boundaries"""
+    pieces = []
+    current = ""
+    for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_passages(text, max_chars=CHROMA_SETTINGS["passage_chars"], overlap=CHROMA_SETTINGS["passage_overlap"]):
+    """Split chapter text into paragraph-aligned passages for embedding
+
+    Each passage after the first starts with the last `overlap`
+    characters (cut at a word boundary) of the one before, so a hit
+    near a boundary still carries its surrounding context.
+    """
+    paragraphs = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if paragraph:
+            paragraphs.extend(_split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph])
+
+    passages = []
+    current = ""
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+
+    if overlap:
+        for i in range(len(passages) - 1, 0, -1):
+            tail = passages[i - 1][-overlap:]
+            space = tail.find(' ')
+            passages[i] = f"{tail[space + 1:] if space != -1 else tail} {passages[i]}"
+    return passages
+
+def passage_id(chapter_id, index):
+    return f"{chapter_id}:{index}"
+
+def chroma_where(min_score=None, statuses=None, domain=None):
+    """Chroma `where` filter equivalent to the lexical index's metadata filters
+
+    Chroma cannot match subdomains, so the vector side requires the exact domain.
+    """
+    conditions = []
+    if min_score is not None:
+        conditions.append({"score": {"$gte": min_score}})
+    if statuses:
+        conditions.append({"status": {"$in": list(statuses)}})
+    if domain:
+        conditions.append({"domain": domain.lower()})
+    if len(conditions) > 1:
+        return {"$and": conditions}
+    return conditions[0] if conditions else None
+
+def fuse_rankings(rankings, weights, k=SEARCH_SETTINGS["rrf_k"]):
+    """Reciprocal rank fusion: each ranked list of IDs adds weight / (k + rank) per ID"""
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
 
 class ChapterDB:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path=str(DATA_DIR / "chroma_db"))
-        self.collection = self.client.get_or_create_collection("book_chapters")
-    
-    def add_chapter(self, chapter_id, text, metadata):
-        """Add chapter to database"""
-        self.collection.add(
-            documents=[text],
-            metadatas=[metadata],
-            ids=[chapter_id]
+    def __init__(self, embedding_function=None, client=None, lexical_index=None):
+        self.client = client or get_client()
+        self.lexical_index = lexical_index or get_lexical_index()
+        # Embeddings are always computed here and passed explicitly, so the
+        # collection never falls back to Chroma's downloading default
+        self.embedding_function = embedding_function or get_embedding_function()
+        self.collection = self.client.get_or_create_collection(
+            CHROMA_SETTINGS["collection"],
+            embedding_function=None
         )
-    
-    def search_chapters(self, query, n_results=3):
-        """Semantic search for chapters"""
+
+    def add_chapter(self, chapter_id, text, metadata):
+        """Add or replace a chapter in the database"""
+        self.add_chapters([{"chapter_id": chapter_id, "text": text, "metadata": metadata}])
+
+    def add_chapters(self, chapters, batch_size=CHROMA_SETTINGS["batch_size"]):
+        """Upsert many chapters as passages, embedding them in batches
+
+        `chapters` is a list of dicts with "chapter_id", "text" and
+        "metadata". Re-adding a chapter replaces its passages, and any
+        passages left over from a longer previous version are deleted.
+        Passages whose text is already stored under the same ID are not
+        embedded again; only their metadata is updated when it changed.
+        The lexical index is updated alongside.
+        """
+        ids, documents, metadatas = [], [], []
+        for chapter in chapters:
+            base_metadata = {key: value for key, value in chapter["metadata"].items() if value is not None}
+            if "url" in base_metadata:
+                base_metadata["domain"] = url_domain(base_metadata["url"])
+            passages = split_passages(chapter["text"])
+            for index, passage in enumerate(passages):
+                ids.append(passage_id(chapter["chapter_id"], index))
+                documents.append(passage)
+                metadatas.append({
+                    **base_metadata,
+                    "chapter_id": chapter["chapter_id"],
+                    "passage": index,
+                    "passages": len(passages)
+                })
+        self._delete_stale([chapter["chapter_id"] for chapter in chapters], set(ids))
+
+        stored = {}
+        if ids:
+            existing = self.collection.get(ids=ids, include=["documents", "metadatas"])
+            stored = dict(zip(existing["ids"], zip(existing["documents"], existing["metadatas"])))
+        changed, relabelled = [], []
+        for i, id_ in enumerate(ids):
+            document, metadata = stored.get(id_, (None, None))
+            if document != documents[i]:
+                changed.append(i)
+            elif metadata != metadatas[i]:
+                relabelled.append(i)
+
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            batch_documents = [documents[i] for i in batch]
+            self.collection.upsert(
+                ids=[ids[i] for i in batch],
+                documents=batch_documents,
+                metadatas=[metadatas[i] for i in batch],
+                embeddings=self.embedding_function(batch_documents)
+            )
+        if relabelled:
+            self.collection.update(ids=[ids[i] for i in relabelled], metadatas=[metadatas[i] for i in relabelled])
+        self.lexical_index.upsert(ids, documents, metadatas)
+        get_metrics().count("passages", len(changed), outcome="embedded")
+        get_metrics().count("passages", len(ids) - len(changed), outcome="reused")
+        return len(ids)
+
+    def _delete_stale(self, chapter_ids, keep_ids):
+        """Remove passages of these chapters that the new version no longer has"""
+        existing = self.collection.get(where={"chapter_id": {"$in": chapter_ids}}, include=[])["ids"]
+        # Chapters stored before passage ingestion used the bare chapter ID as document ID
+        legacy = self.collection.get(ids=chapter_ids, include=[])["ids"]
+        stale = [id_ for id_ in existing + legacy if id_ not in keep_ids]
+        if stale:
+            self.collection.delete(ids=stale)
+        self.lexical_index.delete_stale(chapter_ids, keep_ids)
+
+    def search_chapters(self, query, n_results=3, where=None):
+        """Semantic search over chapter passages"""
         results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
+            query_embeddings=self.embedding_function([query]),
+            n_results=n_results,
+            where=where
         )
-        return results
\ No newline at end of file
+        return results
+
+    def hybrid_search(self, query, n_results=5, min_score=None, statuses=None, domain=None, mode="hybrid",
+                      candidates=SEARCH_SETTINGS["candidates"]):
+        """Search passages lexically (BM25), semantically, or both fused by reciprocal rank
+
+        `mode` is "hybrid", "lexical" or "vector". Filters apply to both
+        retrievers: a minimum quality score, a list of statuses and a URL
+        domain. Returns up to n_results dicts, best first, with the passage
+        "id", "document", "metadata", fused "score" and each retriever's
+        rank ("lexical_rank"/"vector_rank", None when it missed).
+        """
+        hits = {}
+        rankings, weights = [], []
+        if mode in ("hybrid", "lexical"):
+            with get_metrics().span("search", retriever="lexical"):
+                lexical = self.lexical_index.search(query, candidates, min_score, statuses, domain)
+            for hit in lexical:
+                hits[hit["id"]] = hit
+            rankings.append([hit["id"] for hit in lexical])
+            weights.append(SEARCH_SETTINGS["lexical_weight"])
+        if mode in ("hybrid", "vector"):
+            with get_metrics().span("search", retriever="vector"):
+                results = self.collection.query(
+                    query_embeddings=self.embedding_function([query]),
+                    n_results=candidates,
+                    where=chroma_where(min_score, statuses, domain)
+                )
+            for id_, document, metadata in zip(results["ids"][0], results["documents"][0], results["metadatas"][0]):
+                hits.setdefault(id_, {"id": id_, "document": document, "metadata": metadata, "snippet": None})
+            rankings.append(results["ids"][0])
+            weights.append(SEARCH_SETTINGS["vector_weight"])
+
+        fused = []
+        for id_, score in fuse_rankings(rankings, weights)[:n_results]:
+            ranks = [ranking.index(id_) + 1 if id_ in ranking else None for ranking in rankings]
+            fused.append({
+                **hits[id_],
+                "score": score,
+                "lexical_rank": ranks[0] if mode in ("hybrid", "lexical") else None,
+                "vector_rank": ranks[-1] if mode in ("hybrid", "vector") else None
+            })
+        return fused
\ No newline at end of file
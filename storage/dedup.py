@@ -0,0 +1,138 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import numpy as np
+from config import VERSIONS_DIR, DEDUP_SETTINGS
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def shingles(text, size=DEDUP_SETTINGS["shingle_words"]):
+    """Set of lower-cased word n-grams; punctuation and spacing differences are ignored"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _permutations(num_perm):
+    # Fixed seed: signatures must stay comparable across runs
+    rng = np.random.RandomState(1)
+    return (rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64),
+            rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64))
+
+def minhash_signature(text, num_perm=DEDUP_SETTINGS["num_perm"]):
+    """MinHash signature of the text's word shingles, as a list of ints
+
+    The fraction of positions two signatures share estimates the Jaccard
+    similarity of their shingle sets.
+    """
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+         for shingle in shingles(text)],
+        dtype=np.uint64
+    )
+    a, b = _permutations(num_perm)
+    signature = np.full(num_perm, _MAX_HASH, dtype=np.uint64)
+    # Blocks keep the (shingles x permutations) matrix small for long chapters
+    for start in range(0, len(hashes), 2048):
+        block = hashes[start:start + 2048, None]
+        permuted = ((block * a + b) % _PRIME) & _MAX_HASH
+        signature = np.minimum(signature, permuted.min(axis=0))
+    return signature.astype(np.uint32).tolist()
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return float(np.mean(np.asarray(first) == np.asarray(second)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    chapter_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    chapter_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, chapter_id)
+);
+CREATE INDEX IF NOT EXISTS buckets_by_chapter ON buckets (chapter_id);
+"""
+
+class DedupIndex:
+    """Locality-sensitive hashing index of accepted chapters' MinHash signatures
+
+    Each signature is cut into `bands` bands; chapters sharing any band
+    are candidates, and candidates whose estimated Jaccard similarity
+    reaches the threshold are near-duplicates. Kept in SQLite next to the
+    version store and keyed by version-store chapter ID.
+    """
+
+    def __init__(self, path=VERSIONS_DIR / "dedup.sqlite3", bands=DEDUP_SETTINGS["bands"]):
+        self.bands = bands
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def _band_keys(self, signature):
+        values = np.asarray(signature, dtype=np.uint32)
+        rows = len(values) // self.bands
+        return [(band, values[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, chapter_id, url, signature):
+        """Index (or re-index) a chapter's signature"""
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE chapter_id = ?", (chapter_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+                (chapter_id, url, np.asarray(signature, dtype=np.uint32).tobytes())
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)",
+                [(band, key, chapter_id) for band, key in self._band_keys(signature)]
+            )
+            self._conn.commit()
+
+    def query(self, signature, threshold=DEDUP_SETTINGS["threshold"], exclude=None):
+        """Indexed chapters at least `threshold` similar, most similar first, as dicts"""
+        with self._lock:
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates.update(row[0] for row in self._conn.execute(
+                    "SELECT chapter_id FROM buckets WHERE band = ? AND bucket = ?", (band, key)
+                ))
+            candidates.discard(exclude)
+            rows = [self._conn.execute("SELECT url, signature FROM signatures WHERE chapter_id = ?", (chapter_id,))
+                    .fetchone() + (chapter_id,) for chapter_id in candidates]
+
+        matches = []
+        for url, stored, chapter_id in rows:
+            score = similarity(signature, np.frombuffer(stored, dtype=np.uint32))
+            if score >= threshold:
+                matches.append({"chapter_id": chapter_id, "url": url, "similarity": round(score, 4)})
+        return sorted(matches, key=lambda match: match["similarity"], reverse=True)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def import_accepted_versions(self, store):
+        """Index the latest accepted or edited version of every chapter in a version store"""
+        for summary in store.latest_versions(["accepted", "edited"]):
+            record = store.latest(summary["chapter_id"], ["accepted", "edited"])
+            self.add(summary["chapter_id"], summary["url"], minhash_signature(record["content"]["original_text"]))
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_dedup_index():
+    """Process-wide near-duplicate index; seeded from the version store on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DedupIndex()
+            if _index.count() == 0:
+                from storage.version_store import get_version_store
+                _index.import_accepted_versions(get_version_store())
+        return _index
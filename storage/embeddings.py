@@ -0,0 +1,180 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+from config import DATA_DIR, EMBEDDING_SETTINGS
+from utils.cache import get_cache
+
+class ModelNotInstalled(RuntimeError):
+    """The embedding backend's model files are not in EMBEDDING_SETTINGS["model_dir"]"""
+
+    def __init__(self, backend, path):
+        super().__init__(f"The {backend} embedding model is not installed in {path}. "
+                         f"Run `python main.py setup` once (needs network access), or set "
+                         f"EMBEDDING_SETTINGS[\"backend\"] = \"hashing\" to embed fully offline.")
+
+class OnnxMiniLMBackend:
+    """Chroma's all-MiniLM-L6-v2 running on the CPU ONNX runtime
+
+    The model is loaded from `model_dir`; without `download` a missing
+    model raises ModelNotInstalled instead of being fetched mid-run.
+    """
+
+    def __init__(self, batch_size=EMBEDDING_SETTINGS["batch_size"], model_dir=EMBEDDING_SETTINGS["model_dir"],
+                 download=False):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        self.name = "onnx/all-MiniLM-L6-v2"
+        self.batch_size = batch_size
+        self._model = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+        # Chroma downloads lazily on the first call into DOWNLOAD_PATH; point it at our directory
+        self._model.DOWNLOAD_PATH = Path(model_dir) / "onnx-minilm"
+        if download:
+            self._model._download_model_if_not_exists()
+        elif not (self._model.DOWNLOAD_PATH / self._model.EXTRACTED_FOLDER_NAME / "model.onnx").exists():
+            raise ModelNotInstalled(self.name, self._model.DOWNLOAD_PATH)
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._model(texts[start:start + self.batch_size]))
+        return np.asarray(vectors, dtype=np.float32)
+
+class SentenceTransformerBackend:
+    """Any sentence-transformers model, loaded once and run on the CPU"""
+
+    def __init__(self, model=EMBEDDING_SETTINGS["model"], batch_size=EMBEDDING_SETTINGS["batch_size"],
+                 model_dir=EMBEDDING_SETTINGS["model_dir"], download=False):
+        from sentence_transformers import SentenceTransformer
+        self.name = f"sentence-transformers/{model}"
+        self.batch_size = batch_size
+        cache_folder = Path(model_dir) / "sentence-transformers"
+        try:
+            self._model = SentenceTransformer(model, device="cpu", cache_folder=str(cache_folder),
+                                              local_files_only=not download)
+        except OSError as e:
+            raise ModelNotInstalled(self.name, cache_folder) from e
+
+    def embed(self, texts):
+        return self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32)
+
+class HashingBackend:
+    """Feature-hashing embeddings over word unigrams and bigrams
+
+    Needs no model download or extra dependency, so it always works
+    offline; similarity is lexical rather than semantic.
+    """
+
+    def __init__(self, dimensions=EMBEDDING_SETTINGS["dimensions"]):
+        self.name = f"hashing/{dimensions}"
+        self.dimensions = dimensions
+
+    def _features(self, text):
+        words = re.findall(r'\w+', text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+                vectors[row, digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+BACKENDS = {
+    "onnx-minilm": lambda **options: OnnxMiniLMBackend(**options),
+    "sentence-transformers": lambda **options: SentenceTransformerBackend(**options),
+    "hashing": lambda **options: HashingBackend()
+}
+
+def install_embedding_model(backend=None):
+    """Download the backend's model into EMBEDDING_SETTINGS["model_dir"] (the only step that needs network access)"""
+    return BACKENDS[backend or EMBEDDING_SETTINGS["backend"]](download=True).name
+
+class EmbeddingCache:
+    """SQLite store of embeddings keyed by backend name and text hash"""
+
+    def __init__(self, path=DATA_DIR / "embedding_cache.sqlite3"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT,
+                text_hash TEXT,
+                vector BLOB,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        """Return {text_hash: vector} for the hashes that are cached"""
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]
+                ).fetchall()
+                found.update((text_hash, np.frombuffer(vector, dtype=np.float32)) for text_hash, vector in rows)
+        return found
+
+    def put_many(self, model, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(model, text_hash, np.asarray(vector, dtype=np.float32).tobytes()) for text_hash, vector in items]
+            )
+            self._conn.commit()
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Chroma embedding function that only embeds texts it has not seen before
+
+    Repeated queries and unchanged passages of re-ingested chapters are
+    served from the EmbeddingCache; everything else is embedded by the
+    backend in one batch.
+    """
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache
+
+    def __call__(self, input):
+        texts = list(input)
+        hashes = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+        cached = self.cache.get_many(self.backend.name, sorted(set(hashes))) if self.cache else {}
+
+        missing = list(dict.fromkeys(h for h in hashes if h not in cached))
+        if missing:
+            index = {text_hash: text for text_hash, text in zip(hashes, texts)}
+            vectors = self.backend.embed([index[text_hash] for text_hash in missing])
+            new = list(zip(missing, vectors))
+            if self.cache:
+                self.cache.put_many(self.backend.name, new)
+            cached.update(new)
+
+        get_cache().record("embed", hits=len(texts) - len(missing), misses=len(missing))
+        return [cached[text_hash].tolist() for text_hash in hashes]
+
+_embedding_function = None
+_embedding_lock = threading.Lock()
+
+def get_embedding_function():
+    """Process-wide embedding function for the configured backend, loaded once"""
+    global _embedding_function
+    with _embedding_lock:
+        if _embedding_function is None:
+            backend = BACKENDS[EMBEDDING_SETTINGS["backend"]]()
+            cache = EmbeddingCache() if EMBEDDING_SETTINGS["cache"] else None
+            _embedding_function = CachedEmbeddingFunction(backend, cache)
+        return _embedding_function
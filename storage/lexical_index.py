@@ -0,0 +1,172 @@
+import re
+import sqlite3
+import threading
+from urllib.parse import urlparse
+from config import DATA_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passages (
+    rowid INTEGER PRIMARY KEY,
+    passage_id TEXT UNIQUE NOT NULL,
+    chapter_id TEXT NOT NULL,
+    url TEXT,
+    domain TEXT,
+    status TEXT,
+    score REAL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS passages_by_chapter ON passages (chapter_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(
+    text, content='passages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS passages_ai AFTER INSERT ON passages BEGIN
+    INSERT INTO passages_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_ad AFTER DELETE ON passages BEGIN
+    INSERT INTO passages_fts (passages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS passages_au AFTER UPDATE OF text ON passages BEGIN
+    INSERT INTO passages_fts (passages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    INSERT INTO passages_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+"""
+
+METADATA_FIELDS = ["chapter_id", "url", "domain", "status", "score"]
+
+def url_domain(url):
+    """Host part of a URL without "www." and port, as used by the domain filter"""
+    host = (urlparse(url or "").hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def match_query(query):
+    """Turn free text into an FTS5 query: "quoted phrases" stay phrases, other words are ORed"""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+        text = " ".join(re.findall(r'\w+', phrase or word))
+        if text:
+            terms.append('"' + text + '"')
+    return " OR ".join(terms)
+
+def filter_sql(min_score=None, statuses=None, domain=None):
+    """WHERE fragments and parameters for the metadata filters shared by both retrievers"""
+    clauses, params = [], []
+    if min_score is not None:
+        clauses.append("p.score >= ?")
+        params.append(min_score)
+    if statuses:
+        clauses.append(f"p.status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if domain:
+        clauses.append("(p.domain = ? OR p.domain LIKE ?)")
+        params.extend([domain.lower(), f"%.{domain.lower()}"])
+    return clauses, params
+
+class LexicalIndex:
+    """BM25 full-text index over chapter passages, kept in SQLite FTS5
+
+    Passages are stored with the metadata search can filter on (score,
+    status, URL domain). Indexing is incremental: only passages whose text
+    or metadata changed are rewritten, and queries never load an embedding
+    model, so exact lookups such as character names are answered at once.
+    """
+
+    def __init__(self, path=DATA_DIR / "lexical_index.sqlite3"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def upsert(self, ids, documents, metadatas):
+        """Index passages, skipping those already stored unchanged; returns how many were written"""
+        rows = []
+        for passage_id, text, metadata in zip(ids, documents, metadatas):
+            url = metadata.get("url")
+            rows.append((passage_id, metadata["chapter_id"], url, url_domain(url),
+                         metadata.get("status"), metadata.get("score"), text))
+        written = 0
+        with self._lock:
+            for row in rows:
+                existing = self._conn.execute(
+                    "SELECT chapter_id, url, domain, status, score, text FROM passages WHERE passage_id = ?", (row[0],)
+                ).fetchone()
+                if existing is not None and tuple(existing) == row[1:]:
+                    continue
+                if existing is None:
+                    self._conn.execute(
+                        "INSERT INTO passages (passage_id, chapter_id, url, domain, status, score, text) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", row
+                    )
+                else:
+                    # The update trigger only re-tokenizes when the text itself changed
+                    self._conn.execute(
+                        "UPDATE passages SET chapter_id = ?, url = ?, domain = ?, status = ?, score = ?, text = ? "
+                        "WHERE passage_id = ?", (*row[1:], row[0])
+                    )
+                written += 1
+            self._conn.commit()
+        return written
+
+    def delete_stale(self, chapter_ids, keep_ids):
+        """Remove passages of these chapters that are not in keep_ids"""
+        with self._lock:
+            for chapter_id in chapter_ids:
+                stale = [row[0] for row in self._conn.execute(
+                    "SELECT passage_id FROM passages WHERE chapter_id = ?", (chapter_id,)
+                ) if row[0] not in keep_ids]
+                self._conn.executemany("DELETE FROM passages WHERE passage_id = ?", [(id_,) for id_ in stale])
+            self._conn.commit()
+
+    def search(self, query, limit=10, min_score=None, statuses=None, domain=None):
+        """Passages ranked by BM25, best first, as dicts with a "bm25" score (higher is better)"""
+        match = match_query(query)
+        if not match:
+            return []
+        clauses, params = filter_sql(min_score, statuses, domain)
+        sql = f"""
+            SELECT p.passage_id, p.chapter_id, p.url, p.domain, p.status, p.score, p.text,
+                   -bm25(passages_fts) AS bm25,
+                   snippet(passages_fts, 0, '[', ']', '…', 16) AS snippet
+            FROM passages_fts JOIN passages p ON p.rowid = passages_fts.rowid
+            WHERE passages_fts MATCH ? {''.join(' AND ' + clause for clause in clauses)}
+            ORDER BY bm25(passages_fts) LIMIT ?
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, [match, *params, limit]).fetchall()
+        return [
+            {
+                "id": row["passage_id"],
+                "document": row["text"],
+                "metadata": {field: row[field] for field in METADATA_FIELDS},
+                "bm25": row["bm25"],
+                "snippet": row["snippet"]
+            }
+            for row in rows
+        ]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+
+    def rebuild_from(self, collection, batch_size=1000):
+        """Index every passage already stored in a Chroma collection; returns the passage count"""
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            # Bare chapter IDs from before passage ingestion carry no chapter_id metadata
+            self.upsert(
+                batch["ids"],
+                batch["documents"],
+                [{"chapter_id": id_, **(metadata or {})} for id_, metadata in zip(batch["ids"], batch["metadatas"])]
+            )
+        return total
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_lexical_index():
+    """Process-wide lexical index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LexicalIndex()
+        return _index
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from difflib import SequenceMatcher
+from config import VERSIONS_DIR, VERSION_SETTINGS
+
+TEXT_FIELDS = ["original_text", "rewritten_text", "reviewed_text", "final_text"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    base TEXT,
+    depth INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chapter_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_score REAL,
+    original_hash TEXT,
+    rewritten_hash TEXT,
+    reviewed_hash TEXT,
+    final_hash TEXT,
+    screenshot_path TEXT,
+    evaluation TEXT,
+    human_feedback TEXT
+);
+CREATE INDEX IF NOT EXISTS versions_by_chapter ON versions (chapter_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS versions_by_status ON versions (status, timestamp, id);
+"""
+
+def chapter_id_for(url):
+    """Version-store chapter ID for a URL"""
+    return f"chapter_{hashlib.md5(url.encode()).hexdigest()}"
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def make_delta(base, text):
+    """Line-level delta turning base into text: copy ranges of base lines plus inserted lines"""
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, base_lines, lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(lines[j1:j2]))
+    return ops
+
+def apply_delta(base, ops):
+    base_lines = base.splitlines(keepends=True)
+    return "".join(op if isinstance(op, str) else "".join(base_lines[op[0]:op[1]]) for op in ops)
+
+class VersionStore:
+    """Content-addressed, deduplicated store of chapter versions
+
+    Texts are stored once per distinct content hash as zlib-compressed
+    blobs under `blobs/`. A new text is stored as a line delta against the
+    same field of the chapter's previous version when that is smaller,
+    with delta chains capped at VERSION_SETTINGS["max_delta_chain"]. A
+    SQLite index keyed by chapter_id/timestamp and status makes latest
+    version, chapter history and status queries indexed lookups.
+    """
+
+    def __init__(self, root=VERSIONS_DIR):
+        self.root = root
+        self.blob_dir = root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(root / "index.sqlite3"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._texts = OrderedDict()
+        if self._conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0] == 0:
+            self.import_legacy_records()
+
+    def _blob_path(self, digest):
+        return self.blob_dir / digest[:2] / f"{digest}.z"
+
+    def put_text(self, text, base_hash=None):
+        """Store text if it is new and return its hash"""
+        digest = text_hash(text)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+                return digest
+
+            payload = zlib.compress(json.dumps({"text": text}).encode('utf-8'))
+            base, depth = None, 0
+            if base_hash and base_hash != digest:
+                row = self._conn.execute("SELECT depth FROM blobs WHERE hash = ?", (base_hash,)).fetchone()
+                if row and row["depth"] < VERSION_SETTINGS["max_delta_chain"]:
+                    delta = zlib.compress(json.dumps({"ops": make_delta(self.get_text(base_hash), text)}).encode('utf-8'))
+                    if len(delta) < len(payload):
+                        payload, base, depth = delta, base_hash, row["depth"] + 1
+
+            path = self._blob_path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(payload)
+            self._conn.execute(
+                "INSERT INTO blobs VALUES (?, ?, ?, ?, ?)",
+                (digest, base, depth, len(text.encode('utf-8')), len(payload))
+            )
+            self._conn.commit()
+        return digest
+
+    def get_text(self, digest):
+        """Reconstruct a text from its (possibly delta-encoded) blob"""
+        if digest is None:
+            return ""
+        with self._lock:
+            if digest in self._texts:
+                self._texts.move_to_end(digest)
+                return self._texts[digest]
+            row = self._conn.execute("SELECT base FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown text blob {digest}")
+            blob = json.loads(zlib.decompress(self._blob_path(digest).read_bytes()))
+            text = blob["text"] if row["base"] is None else apply_delta(self.get_text(row["base"]), blob["ops"])
+
+            # Successive versions resolve the same delta bases, so keep recent texts around
+            self._texts[digest] = text
+            if len(self._texts) > 64:
+                self._texts.popitem(last=False)
+            return text
+
+    def add_version(self, url, data, timestamp=None):
+        """Store a version of a chapter and return its index row as a dict"""
+        chapter_id = chapter_id_for(url)
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        evaluation = data.get("evaluation", {})
+        with self._lock:
+            previous = self._latest_row(chapter_id)
+            hashes = {
+                field: self.put_text(data.get(field, "") or "",
+                                     previous[field.replace("_text", "_hash")] if previous else None)
+                for field in TEXT_FIELDS
+            }
+            cursor = self._conn.execute(
+                """INSERT INTO versions (chapter_id, url, timestamp, status, total_score, original_hash,
+                   rewritten_hash, reviewed_hash, final_hash, screenshot_path, evaluation, human_feedback)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    chapter_id, url, timestamp, data.get("status", "pending"), evaluation.get("total_score"),
+                    hashes["original_text"], hashes["rewritten_text"], hashes["reviewed_text"], hashes["final_text"],
+                    data.get("screenshot_path", "") or "",
+                    json.dumps(evaluation, ensure_ascii=False),
+                    json.dumps(data.get("human_feedback", {}), ensure_ascii=False)
+                )
+            )
+            self._conn.commit()
+            return self._summary(self._conn.execute("SELECT * FROM versions WHERE id = ?", (cursor.lastrowid,)).fetchone())
+
+    def _latest_row(self, chapter_id, statuses=None):
+        query = "SELECT * FROM versions WHERE chapter_id = ?"
+        params = [chapter_id]
+        if statuses:
+            query += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        return self._conn.execute(query + " ORDER BY timestamp DESC, id DESC LIMIT 1", params).fetchone()
+
+    @staticmethod
+    def _summary(row):
+        return {
+            "id": row["id"],
+            "chapter_id": row["chapter_id"],
+            "url": row["url"],
+            "version": row["timestamp"],
+            "status": row["status"],
+            "total_score": row["total_score"]
+        }
+
+    def _record(self, row):
+        """Full version record in the original JSON record layout"""
+        return {
+            "metadata": {
+                "url": row["url"],
+                "timestamp": row["timestamp"],
+                "status": row["status"],
+                "chapter_id": row["chapter_id"],
+                "version": row["timestamp"],
+                "id": row["id"]
+            },
+            "content": {
+                **{field: self.get_text(row[field.replace("_text", "_hash")]) for field in TEXT_FIELDS},
+                "screenshot_path": row["screenshot_path"]
+            },
+            "evaluation": json.loads(row["evaluation"] or "{}"),
+            "human_feedback": json.loads(row["human_feedback"] or "{}")
+        }
+
+    def load(self, version_id):
+        """Full record for one version ID, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM versions WHERE id = ?", (version_id,)).fetchone()
+            return self._record(row) if row else None
+
+    def latest(self, chapter_id, statuses=None):
+        """Full record of the chapter's most recent version (optionally with a given status), or None"""
+        with self._lock:
+            row = self._latest_row(chapter_id, statuses)
+            return self._record(row) if row else None
+
+    def history(self, chapter_id):
+        """Summaries of every version of a chapter, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM versions WHERE chapter_id = ? ORDER BY timestamp, id", (chapter_id,)
+            ).fetchall()
+        return [self._summary(row) for row in rows]
+
+    def latest_versions(self, statuses=None):
+        """Summary of the newest version of every chapter, optionally only if it has one of `statuses`"""
+        query = """
+            SELECT * FROM versions v WHERE v.id = (
+                SELECT id FROM versions WHERE chapter_id = v.chapter_id ORDER BY timestamp DESC, id DESC LIMIT 1
+            )
+        """
+        params = []
+        if statuses:
+            query += f" AND v.status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY v.timestamp DESC", params).fetchall()
+        return [self._summary(row) for row in rows]
+
+    def iter_records(self):
+        """Yield every version's full record, oldest first"""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM versions ORDER BY timestamp, id")]
+        for version_id in ids:
+            yield self.load(version_id)
+
+    def stats(self):
+        """Logical vs stored bytes across all blobs"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0), "
+                "COALESCE(SUM(base IS NOT NULL), 0) FROM blobs"
+            ).fetchone()
+            versions = self._conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0]
+        return {"versions": versions, "blobs": row[0], "text_bytes": row[1], "stored_bytes": row[2], "deltas": row[3]}
+
+    def import_legacy_records(self):
+        """Import chapter_<hash>_<timestamp>.json records written before the store existed"""
+        imported = 0
+        for path in sorted(self.root.glob("chapter_*.json")):
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+            metadata = record.get("metadata", {})
+            exists = self._conn.execute(
+                "SELECT 1 FROM versions WHERE chapter_id = ? AND timestamp = ?",
+                (metadata.get("chapter_id"), metadata.get("timestamp"))
+            ).fetchone()
+            if exists or not metadata.get("url"):
+                continue
+            self.add_version(metadata["url"], {
+                **record.get("content", {}),
+                "status": metadata.get("status", "pending"),
+                "evaluation": record.get("evaluation", {}),
+                "human_feedback": record.get("human_feedback", {})
+            }, timestamp=metadata.get("timestamp"))
+            imported += 1
+        return imported
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_version_store():
+    """Process-wide version store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VersionStore()
+        return _store
@@ -1,35 +1,17 @@
-import json
-from datetime import datetime
-from config import VERSIONS_DIR
-import hashlib
+from .version_store import get_version_store
 
 def create_version_record(url, data):
-    """Create versioned JSON record"""
-    url_hash = hashlib.md5(url.encode()).hexdigest()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"chapter_{url_hash}_{timestamp}.json"
-    filepath = VERSIONS_DIR / filename
-    
-    record = {
-        "metadata": {
-            "url": url,
-            "timestamp": timestamp,
-            "status": data.get("status", "pending"),
-            "chapter_id": f"chapter_{url_hash}",
-            "version": timestamp
-        },
-        "content": {
-            "original_text": data.get("original_text", ""),
-            "rewritten_text": data.get("rewritten_text", ""),
-            "reviewed_text": data.get("reviewed_text", ""),
-            "final_text": data.get("final_text", ""),
-            "screenshot_path": data.get("screenshot_path", "")
-        },
-        "evaluation": data.get("evaluation", {}),
-        "human_feedback": data.get("human_feedback", {})
-    }
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(record, f, ensure_ascii=False, indent=2)
-    
-    return filepath
\ No newline at end of file
+    """Store a version of the chapter and return its summary (id, chapter_id, version, ...)"""
+    return get_version_store().add_version(url, data)
+
+def get_latest_version(chapter_id, statuses=None):
+    """Full record of a chapter's latest version in the original JSON layout, or None"""
+    return get_version_store().latest(chapter_id, statuses)
+
+def get_chapter_history(chapter_id):
+    """Summaries of every version of a chapter, oldest first"""
+    return get_version_store().history(chapter_id)
+
+def list_chapters(statuses=None):
+    """Summary of the newest version of every chapter, e.g. statuses=["accepted", "edited"]"""
+    return get_version_store().latest_versions(statuses)
\ No newline at end of file
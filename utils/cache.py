@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from config import CACHE_DIR, CACHE_SETTINGS
+from utils.metrics import get_metrics
+
+MISSING = object()
+
+class StageCache:
+    """Content-addressed on-disk cache for pipeline stage outputs
+
+    Entries are JSON files keyed by a hash of the stage name, its inputs
+    and the settings that affect the output. Reading an entry refreshes
+    its modification time, and once the cache grows past `max_bytes` the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_SETTINGS["max_bytes"],
+                 enabled=CACHE_SETTINGS["enabled"]):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = Counter()
+        self.misses = Counter()
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(stage, *inputs, **settings):
+        """Hash a stage name, its inputs and its settings into a cache key"""
+        payload = json.dumps([stage, inputs, settings], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, stage, key):
+        return self.directory / stage / key[:2] / f"{key}.json"
+
+    def get(self, stage, key, max_age=None, validate=None):
+        """Return the cached value, or MISSING if absent, expired or invalid"""
+        value = MISSING
+        if self.enabled:
+            path = self._path(stage, key)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    entry = json.load(f)
+                fresh = max_age is None or time.time() - entry["created"] <= max_age
+                if fresh and (validate is None or validate(entry["value"])):
+                    value = entry["value"]
+                    os.utime(path)
+            except (OSError, ValueError, KeyError):
+                pass
+
+        self.record(stage, hits=int(value is not MISSING), misses=int(value is MISSING))
+        return value
+
+    def set(self, stage, key, value):
+        """Store a JSON-serialisable value, evicting old entries if over budget"""
+        if not self.enabled:
+            return
+        path = self._path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"created": time.time(), "value": value}, ensure_ascii=False)
+        # Unique per thread and per process: pipeline worker processes share the cache directory
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data.encode('utf-8'))
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def cached(self, stage, key, compute, max_age=None, validate=None):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(stage, key, max_age, validate)
+        if value is MISSING:
+            value = compute()
+            self.set(stage, key, value)
+        return value
+
+    def _entries(self):
+        for path in self.directory.glob("*/*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is at 90% of its budget"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+                self._size -= size
+            except OSError:
+                pass
+
+    def record(self, stage, hits=0, misses=0):
+        """Count hits/misses for a stage cached outside this store (e.g. embeddings)"""
+        with self._lock:
+            self.hits[stage] += hits
+            self.misses[stage] += misses
+        metrics = get_metrics()
+        metrics.count("cache_requests", hits, stage=stage, result="hit")
+        metrics.count("cache_requests", misses, stage=stage, result="miss")
+
+    def stats(self):
+        """Hit/miss counts per stage"""
+        with self._lock:
+            stages = sorted(set(self.hits) | set(self.misses))
+            return {stage: {"hits": self.hits[stage], "misses": self.misses[stage]} for stage in stages}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide stage cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StageCache()
+        return _cache
+
+def text_digest(text):
+    """Short content hash used to key stages on large text inputs"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def print_cache_report():
+    """Print hit/miss counters for every stage that used the cache"""
+    stats = get_cache().stats()
+    if not stats:
+        return
+    print("\n\033[1mCache Report:\033[0m")
+    for stage, counts in stats.items():
+        total = counts["hits"] + counts["misses"]
+        if not total:
+            continue
+        print(f"{stage.capitalize()+':':<12} {counts['hits']} hit(s), {counts['misses']} miss(es) "
+              f"({counts['hits'] / total:.0%} hit rate)")
@@ -1,5 +1,7 @@
 import hashlib
 import logging
+import os
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
 from colorama import Fore, Style, init
 import re
 
@@ -20,6 +22,10 @@ def clean_text(text):
     text = re.sub(r'\n+', '\n', text)
     return text
 
+def print_step(step_num, step_name):
+    print(f"\n{Style.BRIGHT}STEP {step_num}: {step_name.upper()}{Style.RESET_ALL}")
+    print("-" * 50)
+
 def print_error(message):
     print(f"{Fore.RED}✗ {message}{Style.RESET_ALL}")
 
@@ -34,4 +40,10 @@ def print_info(message):
 
 def generate_chapter_id(url):
     """Generate a unique chapter ID from the URL."""
-    return hashlib.md5(url.encode()).hexdigest()[:12]
\ No newline at end of file
+    return hashlib.md5(url.encode()).hexdigest()[:12]
+
+@contextmanager
+def quiet_output():
+    """Silence print-based progress and tqdm bars; logging handlers keep their streams"""
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), redirect_stderr(devnull):
+        yield
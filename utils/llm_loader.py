@@ -1,16 +1,116 @@
 from transformers import AutoModelForCausalLM, AutoTokenizer
+from config import LLM_SETTINGS
+from collections import defaultdict
+from contextlib import contextmanager
+import copy
+import os
+import threading
 import torch
 
 MODEL_CACHE = {}
+_load_lock = threading.Lock()
+_threads_pinned = False
+# Untouched tokenizer per model to copy from, and copies returned by finished own_tokenizers() blocks
+_tokenizer_templates = {}
+_spare_tokenizers = defaultdict(list)
+_borrowed = threading.local()
 
-def load_model(model_name):
-    """Load and cache LLM models"""
-    if model_name not in MODEL_CACHE:
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            device_map="auto",
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-        )
-        MODEL_CACHE[model_name] = (model, tokenizer)
-    return MODEL_CACHE[model_name]
\ No newline at end of file
+CPU_MODES = ["off", "int8", "compile", "int8-compile", "bettertransformer"]
+
+def pin_threads(num_threads=None):
+    """Fix the intra-op thread count once per process (defaults to all cores)"""
+    global _threads_pinned
+    if _threads_pinned:
+        return
+    torch.set_num_threads(num_threads or os.cpu_count() or 1)
+    try:
+        # Generation is one long chain of ops; inter-op parallelism only adds contention
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable before the first parallel op
+    _threads_pinned = True
+
+def conv1d_to_linear(model):
+    """Swap GPT-2 style Conv1D layers for equivalent nn.Linear layers so they can be quantized"""
+    from transformers.pytorch_utils import Conv1D
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+                # Conv1D computes x @ W + b, Linear computes x @ W.T + b
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, name, linear)
+    return model
+
+def optimize_for_cpu(model, mode):
+    """Apply a CPU acceleration mode to a float32 model in eval mode"""
+    if mode in ("int8", "int8-compile"):
+        model = torch.quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == "bettertransformer":
+        try:
+            model = model.to_bettertransformer()
+        except (ImportError, ValueError, NotImplementedError) as e:
+            print(f"BetterTransformer unavailable ({e}); using the default attention")
+    if mode in ("compile", "int8-compile"):
+        if hasattr(torch, "compile"):
+            model.forward = torch.compile(model.forward, dynamic=True)
+        else:
+            print("torch.compile needs PyTorch 2.0 or newer; running uncompiled")
+    return model
+
+def load_model(model_name, cpu_mode=None):
+    """Load and cache LLM models
+
+    `cpu_mode` (default LLM_SETTINGS["cpu_mode"]) selects one of CPU_MODES;
+    anything other than "off" loads the model on the CPU in float32 and
+    applies the matching optimizations. Each mode is cached separately.
+    """
+    cpu_mode = cpu_mode or LLM_SETTINGS["cpu_mode"]
+    if cpu_mode not in CPU_MODES:
+        raise ValueError(f"Unknown cpu_mode {cpu_mode!r}; expected one of {', '.join(CPU_MODES)}")
+    key = model_name if cpu_mode == "off" else f"{model_name}@{cpu_mode}"
+
+    # Server handler threads may ask for the same model at once; load it only once
+    with _load_lock:
+        if key not in MODEL_CACHE:
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            if cpu_mode == "off":
+                model = AutoModelForCausalLM.from_pretrained(
+                    model_name,
+                    device_map="auto",
+                    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+                )
+            else:
+                pin_threads(LLM_SETTINGS["num_threads"])
+                model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+                model.eval()
+                model = optimize_for_cpu(model, cpu_mode)
+            MODEL_CACHE[key] = (model, tokenizer)
+            _tokenizer_templates[key] = copy.deepcopy(tokenizer)
+    borrowed = getattr(_borrowed, "tokenizers", None)
+    if borrowed is None:
+        return MODEL_CACHE[key]
+    if key not in borrowed:
+        with _load_lock:
+            spare = _spare_tokenizers[key]
+            borrowed[key] = spare.pop() if spare else copy.deepcopy(_tokenizer_templates[key])
+    return MODEL_CACHE[key][0], borrowed[key]
+
+@contextmanager
+def own_tokenizers():
+    """Make load_model return tokenizers used by no other thread, for the current thread, inside the block
+
+    Fast tokenizers must not be used from two threads at once ("Already
+    borrowed"), and padding/truncation settings change their state. The
+    model server's request threads tokenize in here while its batcher
+    thread uses the shared tokenizers. Copies are reused by later blocks.
+    """
+    _borrowed.tokenizers = {}
+    try:
+        yield
+    finally:
+        borrowed, _borrowed.tokenizers = _borrowed.tokenizers, None
+        with _load_lock:
+            for key, tokenizer in borrowed.items():
+                _spare_tokenizers[key].append(tokenizer)
@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from config import METRICS_SETTINGS
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+class Metrics:
+    """In-process spans and counters with JSON-lines and Prometheus text export
+
+    Spans time a block of code and record its duration under a name and
+    labels; the most recent `reservoir` durations of each series are kept
+    for p50/p95. Counters only ever increase. When `jsonl_path` is set,
+    every finished span and counter increment is appended to it as one
+    JSON object per line.
+    """
+
+    def __init__(self, jsonl_path=METRICS_SETTINGS["jsonl_path"], reservoir=METRICS_SETTINGS["reservoir"]):
+        self.reservoir = reservoir
+        self.durations = defaultdict(lambda: deque(maxlen=self.reservoir))
+        self.duration_totals = defaultdict(lambda: [0, 0.0])
+        self.counters = defaultdict(float)
+        self._lock = threading.Lock()
+        self._events = None
+        self._captured = None
+        self.set_jsonl_path(jsonl_path)
+
+    def set_jsonl_path(self, path):
+        """Start (or with None, stop) streaming events to a JSON-lines file"""
+        with self._lock:
+            if self._events:
+                self._events.close()
+            self._events = None
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._events = open(path, 'a', encoding='utf-8')
+
+    def _emit(self, event):
+        if self._events:
+            self._events.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._events.flush()
+        if self._captured is not None:
+            self._captured.append(event)
+
+    def start_capture(self):
+        """Also keep every event from now on, to be handed to another process with stop_capture()"""
+        with self._lock:
+            self._captured = []
+
+    def stop_capture(self):
+        """Stop capturing and return the events recorded since start_capture()"""
+        with self._lock:
+            events, self._captured = self._captured or [], None
+        return events
+
+    def replay(self, events):
+        """Record events captured in another process as if they happened here"""
+        for event in events:
+            labels = {key: value for key, value in event.items() if key not in ("time", "type", "name", "seconds", "value")}
+            if event["type"] == "span":
+                self.observe(event["name"], event["seconds"], **labels)
+            else:
+                self.count(event["name"], event["value"], **labels)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block; failures are recorded with status="error" """
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, status=status, **labels)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.durations[key].append(seconds)
+            totals = self.duration_totals[key]
+            totals[0] += 1
+            totals[1] += seconds
+            self._emit({"time": time.time(), "type": "span", "name": name, "seconds": round(seconds, 6), **labels})
+
+    def count(self, name, value=1, **labels):
+        if not value:
+            return
+        with self._lock:
+            self.counters[(name, _label_key(labels))] += value
+            self._emit({"time": time.time(), "type": "counter", "name": name, "value": value, **labels})
+
+    def counter(self, name, **labels):
+        """Sum of a counter across every label set that includes `labels`"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for (counter, key), value in self.counters.items()
+                       if counter == name and wanted <= set(key))
+
+    def summary(self):
+        """Per-series span statistics and counter values as plain dicts"""
+        with self._lock:
+            spans = [
+                {
+                    "name": name,
+                    "labels": dict(key),
+                    "count": self.duration_totals[(name, key)][0],
+                    "sum": self.duration_totals[(name, key)][1],
+                    "p50": _quantile(values, 0.5),
+                    "p95": _quantile(values, 0.95)
+                }
+                for (name, key), values in self.durations.items()
+            ]
+            counters = [{"name": name, "labels": dict(key), "value": value} for (name, key), value in self.counters.items()]
+        return {"spans": spans, "counters": counters}
+
+    def prometheus_text(self, prefix="pipeline"):
+        """Render the current state in the Prometheus text exposition format"""
+        def metric_name(name):
+            return f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+        def label_text(labels, **extra):
+            labels = {**labels, **extra}
+            if not labels:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                       for value in labels.values())
+            return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+        summary = self.summary()
+        lines = []
+        for name in sorted({span["name"] for span in summary["spans"]}):
+            metric = metric_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for span in (span for span in summary["spans"] if span["name"] == name):
+                lines.append(f"{metric}{label_text(span['labels'], quantile='0.5')} {span['p50']:.6f}")
+                lines.append(f"{metric}{label_text(span['labels'], quantile='0.95')} {span['p95']:.6f}")
+                lines.append(f"{metric}_sum{label_text(span['labels'])} {span['sum']:.6f}")
+                lines.append(f"{metric}_count{label_text(span['labels'])} {span['count']}")
+        for name in sorted({counter["name"] for counter in summary["counters"]}):
+            metric = metric_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            for counter in (counter for counter in summary["counters"] if counter["name"] == name):
+                lines.append(f"{metric}{label_text(counter['labels'])} {counter['value']:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=METRICS_SETTINGS["prometheus_path"]):
+        """Atomically replace a Prometheus textfile-collector file with the current metrics"""
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    """Process-wide metrics registry"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+def print_metrics_report():
+    """Print stage latency, generation throughput and HTTP traffic for this run"""
+    metrics = get_metrics()
+    summary = metrics.summary()
+    stages = [span for span in summary["spans"] if span["name"] == "stage" and span["labels"].get("status") == "ok"]
+    if stages:
+        print("\n\033[1mStage Timings:\033[0m")
+        for span in stages:
+            print(f"{span['labels']['stage'].capitalize()+':':<14} p50 {span['p50']:.2f}s, p95 {span['p95']:.2f}s "
+                  f"over {span['count']} run(s)")
+
+    generated = metrics.counter("generated_tokens")
+    generate_seconds = sum(span["sum"] for span in summary["spans"] if span["name"] == "generate")
+    if generated and generate_seconds:
+        print(f"Generation:    {generated:.0f} token(s), {generated / generate_seconds:.1f} tokens/sec")
+    http_bytes = metrics.counter("http_bytes")
+    if http_bytes:
+        print(f"HTTP fetched:  {metrics.counter('http_requests'):.0f} request(s), {http_bytes / 1024:.0f} KB")
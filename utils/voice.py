@@ -1,28 +1,169 @@
-from config import AUDIO_DIR
-from gtts import gTTS
+from config import AUDIO_DIR, TTS_SETTINGS
 import hashlib
-from datetime import datetime
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from utils.cache import get_cache, MISSING
+from utils.metrics import get_metrics
 
-def text_to_speech(text, lang='en'):
-    """Enhanced TTS function with progress feedback"""
+class GTTSBackend:
+    """Google Translate TTS (needs network); produces MP3"""
+
+    name = "gtts"
+    extension = "mp3"
+
+    def synthesize(self, text, lang):
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+
+class EspeakBackend:
+    """Offline speech through the espeak-ng (or espeak) command; produces WAV"""
+
+    name = "espeak"
+    extension = "wav"
+
+    def __init__(self, rate=TTS_SETTINGS["espeak_rate"]):
+        self.rate = rate
+        self.command = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.command is None:
+            raise RuntimeError("espeak-ng is not installed (e.g. `apt install espeak-ng`)")
+
+    def synthesize(self, text, lang):
+        # Write to a file rather than stdout so the WAV header carries real sizes
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            subprocess.run(
+                [self.command, "-v", lang, "-s", str(self.rate), "-w", path, "--stdin"],
+                input=text.encode('utf-8'), check=True, capture_output=True
+            )
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+TTS_BACKENDS = {
+    "gtts": lambda: GTTSBackend(),
+    "espeak": lambda: EspeakBackend()
+}
+
+def split_sentences(text, max_chars=TTS_SETTINGS["chunk_chars"]):
+    """Split text into narration chunks of whole sentences, never crossing a paragraph
+
+    Chunks only depend on their own paragraph, so editing one paragraph
+    leaves the chunks (and cached audio) of every other paragraph intact.
+    """
+    chunks = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        current = ""
+        for sentence in re.split(r'(?<=[.!?…])\s+', " ".join(paragraph.split())):
+            # A single overlong sentence is cut at word boundaries
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+def concatenate_audio(parts, extension):
+    """Join chunk audio into one file's bytes"""
+    if extension == "wav":
+        output = io.BytesIO()
+        with wave.open(output, 'wb') as combined:
+            for index, part in enumerate(parts):
+                with wave.open(io.BytesIO(part), 'rb') as chunk:
+                    if index == 0:
+                        combined.setparams(chunk.getparams())
+                    combined.writeframes(chunk.readframes(chunk.getnframes()))
+        return output.getvalue()
+    # MP3 is a sequence of self-contained frames, so the streams can be joined directly
+    return b"".join(parts)
+
+class NarrationEngine:
+    """Chunked, concurrent narration with per-chunk audio caching
+
+    Text is split into sentence chunks that are synthesized on a thread
+    pool. Each chunk's audio is stored under AUDIO_DIR/chunks keyed by a
+    hash of the backend, language and chunk text, so re-narrating an edited
+    chapter only synthesizes the chunks whose sentences changed.
+    """
+
+    def __init__(self, backend=None, workers=TTS_SETTINGS["workers"]):
+        self.backend = TTS_BACKENDS[backend or TTS_SETTINGS["backend"]]()
+        self.workers = workers
+
+    def _chunk_path(self, text, lang):
+        digest = hashlib.sha256(f"{self.backend.name}\0{lang}\0{text}".encode('utf-8')).hexdigest()
+        return AUDIO_DIR / "chunks" / digest[:2] / f"{digest}.{self.backend.extension}"
+
+    def _synthesize_chunk(self, text, lang):
+        path = self._chunk_path(text, lang)
+        if path.exists():
+            return path.read_bytes(), True
+        with get_metrics().span("tts_chunk", backend=self.backend.name):
+            audio = self.backend.synthesize(text, lang)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(audio)
+        os.replace(tmp_path, path)
+        return audio, False
+
+    def narrate(self, text, lang, output_path):
+        chunks = split_sentences(text)
+        if not chunks:
+            raise ValueError("Nothing to narrate: the text is empty")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+                tqdm(total=len(chunks), desc="Narrating", ncols=100) as pbar:
+            futures = [pool.submit(self._synthesize_chunk, chunk, lang) for chunk in chunks]
+            results = []
+            for future in futures:
+                results.append(future.result())
+                pbar.update(1)
+
+        hits = sum(1 for _, cached in results if cached)
+        get_cache().record("tts_chunk", hits=hits, misses=len(results) - hits)
+        output_path.write_bytes(concatenate_audio([audio for audio, _ in results], self.backend.extension))
+        return hits, len(results)
+
+def text_to_speech(text, lang='en', backend=None):
+    """Narrate a whole chapter into one audio file and return its path"""
     print("\nInitializing text-to-speech engine...")
-    
-    if len(text) > 5000:
-        print("  Text too long, truncating to 5000 characters")
-        text = text[:5000] + " [truncated]"
-    
+    backend = backend or TTS_SETTINGS["backend"]
+
+    cache = get_cache()
+    cache_key = cache.make_key("tts", text, lang=lang, backend=backend)
+    cached_path = cache.get("tts", cache_key, validate=os.path.exists)
+    if cached_path is not MISSING:
+        print("  Using cached narration")
+        return cached_path
+
+    engine = NarrationEngine(backend)
     text_hash = hashlib.md5(text.encode()).hexdigest()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"narration_{text_hash}_{timestamp}.mp3"
-    filepath = AUDIO_DIR / filename
-    
+    filepath = AUDIO_DIR / f"narration_{text_hash}_{backend}.{engine.backend.extension}"
+
     print("  Generating audio...")
-    with tqdm(total=100, desc="Processing", ncols=100) as pbar:
-        tts = gTTS(text=text, lang=lang, slow=False)
-        pbar.update(50)
-        tts.save(str(filepath))
-        pbar.update(50)
-    
+    hits, total = engine.narrate(text, lang, filepath)
+    if hits:
+        print(f"  Reused cached audio for {hits} of {total} chunk(s)")
+
+    cache.set("tts", cache_key, str(filepath))
     print("\nAudio generation complete!")
-    return filepath
\ No newline at end of file
+    return filepath